@@ -7,7 +7,12 @@ from internal_pages.dashboard import (
     subscription_page, recommendations_page
 )
 from internal_pages.chatbot import chatbot_page
-from utils.auth import init_session_state, logout_user, is_authenticated
+from internal_pages.admin import admin_page, is_admin
+from utils.auth import (
+    init_session_state, logout_user, is_authenticated, apply_order_events, restore_session, sync_session_cookie
+)
+from utils.availability import name_availability
+from utils.passwords import password_hasher
 from config import APP_NAME, APP_ICON, PAGE_TITLE
 
 
@@ -101,6 +106,10 @@ def sidebar_navigation():
         if st.button("🎯 Recommendations", key="nav_recommendations", use_container_width=True):
             st.session_state.current_page = "🎯 Recommendations"
 
+        if is_admin(st.session_state.get('user_data')):
+            if st.button("🛠️ Admin", key="nav_admin", use_container_width=True):
+                st.session_state.current_page = "🛠️ Admin"
+
         # Get current page from session state
         page = st.session_state.get('current_page', '🤖 AI Assistant')
 
@@ -116,7 +125,7 @@ def sidebar_navigation():
         """, unsafe_allow_html=True)
 
         # Enhanced User info section
-        user_data = st.session_state.get('user_data', {})
+        user_data = st.session_state.get('user_data')
         st.markdown(f"""
         <div style="
             background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
@@ -130,8 +139,8 @@ def sidebar_navigation():
                 👤 Account Details
             </h4>
             <div style="color: #6c757d; line-height: 1.6;">
-                <p style="margin: 0.5rem 0;"><strong>Name:</strong> {user_data.get('name', 'N/A')}</p>
-                <p style="margin: 0.5rem 0;"><strong>Email:</strong> {user_data.get('email', 'N/A')}</p>
+                <p style="margin: 0.5rem 0;"><strong>Name:</strong> {user_data.name if user_data else 'N/A'}</p>
+                <p style="margin: 0.5rem 0;"><strong>Email:</strong> {user_data.email if user_data else 'N/A'}</p>
                 <p style="margin: 0.5rem 0;"><strong>Plan:</strong> 
                     <span style="
                         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -140,7 +149,7 @@ def sidebar_navigation():
                         border-radius: 15px;
                         font-size: 0.85rem;
                         font-weight: 500;
-                    ">{user_data.get('subscription', 'N/A')}</span>
+                    ">{user_data.subscription if user_data else 'N/A'}</span>
                 </p>
             </div>
         </div>
@@ -170,6 +179,13 @@ def main():
     configure_page()
     load_css()
     init_session_state()
+    # Resume the session of a refreshed page or new tab; sign out expired ones
+    restore_session()
+    sync_session_cookie()
+    # Pick the bcrypt cost for this machine once per process, before the first sign-up needs it
+    password_hasher.calibrate()
+    # Build (and periodically rebuild) the username/email filters for the sign-up form
+    name_availability.refresh()
     
     # Initialize current page if not set
     if 'current_page' not in st.session_state:
@@ -185,11 +201,15 @@ def main():
         """, unsafe_allow_html=True)
         login_page()
     else:
+        # Order status changes pushed by the database since the last run
+        for event in apply_order_events():
+            st.toast(f"📦 Order #{event.order_number} is now {event.status}")
+
         # Get selected page from sidebar
         selected_page = sidebar_navigation()
         
         # Display selected page content
-        user_data = st.session_state.get('user_data', {})
+        user_data = st.session_state.user_data
         
         if selected_page == "🤖 AI Assistant":
             chatbot_page()
@@ -203,6 +223,8 @@ def main():
             subscription_page(user_data)
         elif selected_page == "🎯 Recommendations":
             recommendations_page(user_data)
+        elif selected_page == "🛠️ Admin":
+            admin_page()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""EXPLAIN (ANALYZE, BUFFERS) every DatabaseManager query against a seeded dataset.
+
+Usage:
+    python -m benchmarks.explain_queries --seed --users 2000 --orders-per-user 500
+    python -m benchmarks.explain_queries --verbose
+    python -m benchmarks.explain_queries --cleanup
+
+--seed creates synthetic `bench_user_*` accounts with orders and monthly
+bills spread over the last two years (server-side, so large datasets are
+quick to build). The report shows, per statement, median execution and
+planning time, buffer hits/reads, the indexes used and whether the plan
+needed a sort or a sequential scan.
+"""
+
+import argparse
+import statistics
+
+from config import HISTORY_PAGE_SIZE
+from utils.database import db_manager
+from utils.passwords import password_hasher
+
+BENCH_PREFIX = 'bench_user_'
+
+
+def seed(users, orders_per_user):
+    """Create the synthetic dataset."""
+    password_hash = password_hasher.hash('password')
+    print(f"🌱 Seeding {users} users x {orders_per_user} orders...")
+
+    # Partitioned schemas need partitions for the two years of history first
+    db_manager.execute_query("""
+        DO $$
+        BEGIN
+            IF to_regproc('ensure_partitions') IS NOT NULL THEN
+                PERFORM ensure_partitions('orders', 'month', (current_date - interval '2 years')::date, current_date);
+                PERFORM ensure_partitions('bills', 'year', (current_date - interval '2 years')::date, current_date);
+            END IF;
+        END;
+        $$
+    """)
+    db_manager.execute_query("""
+        INSERT INTO users (username, email, name, password_hash, subscription)
+        SELECT %s || g, %s || g || '@example.com', 'Bench User ' || g, %s,
+               (ARRAY['Basic', 'Standard', 'Premium'])[1 + g %% 3]
+        FROM generate_series(1, %s) g
+        ON CONFLICT DO NOTHING
+    """, (BENCH_PREFIX, BENCH_PREFIX, password_hash, users))
+    # Large seeds run longer than the app's statement timeout
+    db_manager.execute_query("""
+        SET LOCAL statement_timeout = 0;
+        SET LOCAL app.skip_duplicate_order_numbers = on;
+        INSERT INTO orders (user_id, order_number, restaurant, items, total, status, created_at)
+        SELECT u.id,
+               'BENCH-' || u.username || '-' || g,
+               (ARRAY['Pizza Palace', 'Spice Garden', 'Burger Junction', 'Thai Express',
+                      'Chinese Dragon', 'South Indian Corner'])[1 + (g %% 6)],
+               jsonb_build_array('Item ' || (g %% 17), 'Item ' || (g %% 5)),
+               200 + (g * 37) %% 800,
+               (ARRAY['Delivered', 'Delivered', 'Delivered', 'In Transit', 'Preparing', 'Cancelled'])[1 + (g %% 6)],
+               now() - (random() * interval '730 days')
+        FROM users u
+        CROSS JOIN generate_series(1, %s) g
+        WHERE u.username LIKE %s
+        ON CONFLICT DO NOTHING
+    """, (orders_per_user, BENCH_PREFIX + '%'))
+    db_manager.execute_query("""
+        INSERT INTO bills (user_id, month, amount, status, due_date)
+        SELECT u.id,
+               to_char(d, 'FMMonth YYYY'),
+               499,
+               CASE WHEN d < date_trunc('month', now()) THEN 'Paid' ELSE 'Pending' END,
+               (d + interval '24 days')::date
+        FROM users u
+        CROSS JOIN generate_series(date_trunc('month', now()) - interval '23 months',
+                                   date_trunc('month', now()), interval '1 month') d
+        WHERE u.username LIKE %s
+    """, (BENCH_PREFIX + '%',))
+    db_manager.execute_query("ANALYZE users; ANALYZE orders; ANALYZE bills;")
+    print("✅ Seed complete")
+
+
+def cleanup():
+    """Remove the synthetic dataset (orders and bills cascade)."""
+    db_manager.execute_query("DELETE FROM users WHERE username LIKE %s", (BENCH_PREFIX + '%',))
+    print("🧹 Removed bench users")
+
+
+def statement_params(user):
+    """Run each DatabaseManager read once (registering its SQL) and return EXPLAIN parameters."""
+    username, user_id = user['username'], user['id']
+    page = HISTORY_PAGE_SIZE
+
+    db_manager.authenticate_user(username, 'not-the-password')
+    db_manager.get_user_by_username(username)
+    db_manager.get_user_profile(username, page, page)
+    _, orders_cursor = db_manager.get_user_orders_page(user_id, page)
+    _, bills_cursor = db_manager.get_user_bills_page(user_id, page)
+    db_manager.get_user_orders(user_id)
+    db_manager.get_user_bills(user_id)
+    db_manager.check_username_exists(username)
+    db_manager.check_email_exists(user['email'])
+
+    params = {
+        'user_auth_by_username': (username,),
+        'user_by_username': (username,),
+        'user_profile': (page, page, username),
+        'orders_page': (user_id, page + 1),
+        'bills_page': (user_id, page + 1),
+        'orders_by_user': (user_id,),
+        'bills_by_user': (user_id,),
+        'username_exists': (username,),
+        'email_exists': (user['email'],),
+    }
+    if orders_cursor:
+        db_manager.get_user_orders_page(user_id, page, orders_cursor)
+        params['orders_page_after'] = (user_id, orders_cursor[0], *orders_cursor, page + 1)
+    if bills_cursor:
+        db_manager.get_user_bills_page(user_id, page, bills_cursor)
+        params['bills_page_after'] = (user_id, bills_cursor[0], *bills_cursor, page + 1)
+    return params
+
+
+def parent_indexes(names):
+    """Map partition-level index names to the index created on the partitioned parent."""
+    if not names:
+        return {}
+    result = db_manager.execute_query("""
+        WITH RECURSIVE up AS (
+            SELECT c.oid, c.relname AS name FROM pg_class c WHERE c.relname = ANY(%s)
+            UNION ALL
+            SELECT i.inhparent, up.name FROM up JOIN pg_inherits i ON i.inhrelid = up.oid
+        )
+        SELECT DISTINCT ON (up.name) up.name, c.relname AS parent
+        FROM up JOIN pg_class c ON c.oid = up.oid
+        WHERE NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = up.oid)
+    """, (list(names),), fetch=True, read_only=True)
+    return {row['name']: row['parent'] for row in result or []}
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def explain(name, params, runs):
+    """EXPLAIN ANALYZE a registered statement ``runs`` times and summarize the plan."""
+    query = db_manager.statements.query(name)
+    executions, plannings = [], []
+    for _ in range(runs):
+        result = db_manager.execute_query(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params, fetch=True, read_only=True
+        )
+        report = result[0]['QUERY PLAN'][0]
+        executions.append(report['Execution Time'])
+        plannings.append(report['Planning Time'])
+
+    nodes = list(walk(report['Plan']))
+    index_names = {node['Index Name'] for node in nodes if 'Index Name' in node}
+    parents = parent_indexes(index_names)
+    return {
+        'name': name,
+        'execution_ms': statistics.median(executions),
+        'planning_ms': statistics.median(plannings),
+        'hit': report['Plan'].get('Shared Hit Blocks', 0),
+        'read': report['Plan'].get('Shared Read Blocks', 0),
+        'rows': report['Plan'].get('Actual Rows', 0),
+        'indexes': sorted({parents.get(name, name) for name in index_names}),
+        'sort': any(node['Node Type'] == 'Sort' for node in nodes),
+        # Empty partitions are always seq-scanned; only flag scans that read rows
+        'seq_scan': any(node['Node Type'] == 'Seq Scan' and node.get('Actual Rows', 0) > 0
+                        for node in nodes),
+        'plan': report['Plan'],
+    }
+
+
+def print_plan(plan, depth=0):
+    label = plan['Node Type']
+    if 'Index Name' in plan:
+        label += f" using {plan['Index Name']}"
+    elif 'Relation Name' in plan:
+        label += f" on {plan['Relation Name']}"
+    print(f"      {'  ' * depth}-> {label} (rows={plan.get('Actual Rows')}, "
+          f"time={plan.get('Actual Total Time')} ms, hit={plan.get('Shared Hit Blocks', 0)})")
+    for child in plan.get('Plans', []):
+        print_plan(child, depth + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', action='store_true', help="create the synthetic dataset first")
+    parser.add_argument('--cleanup', action='store_true', help="remove the synthetic dataset and exit")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders-per-user', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=5, help="EXPLAIN ANALYZE runs per statement")
+    parser.add_argument('--verbose', action='store_true', help="print every plan tree")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    if args.seed:
+        seed(args.users, args.orders_per_user)
+
+    sample = db_manager.execute_query(
+        "SELECT id, username, email FROM users WHERE username LIKE %s ORDER BY username LIMIT 1",
+        (BENCH_PREFIX + '%',), fetch=True, read_only=True
+    )
+    if not sample:
+        print("❌ No bench users found; run with --seed first")
+        return
+
+    print(f"🔎 EXPLAIN (ANALYZE, BUFFERS) for {sample[0]['username']}, median of {args.runs} runs\n")
+    print(f"  {'statement':<24}{'exec ms':>10}{'plan ms':>10}{'hit':>8}{'read':>7}{'rows':>7}  indexes")
+    for name, params in statement_params(sample[0]).items():
+        stats = explain(name, params, args.runs)
+        flags = (" ⚠️ sort" if stats['sort'] else "") + (" ⚠️ seq scan" if stats['seq_scan'] else "")
+        print(f"  {name:<24}{stats['execution_ms']:>10.3f}{stats['planning_ms']:>10.3f}"
+              f"{stats['hit']:>8}{stats['read']:>7}{stats['rows']:>7}  "
+              f"{', '.join(stats['indexes']) or '-'}{flags}")
+        if args.verbose:
+            print_plan(stats['plan'])
+
+
+if __name__ == "__main__":
+    main()
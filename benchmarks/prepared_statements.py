@@ -0,0 +1,122 @@
+"""Benchmark plain vs prepared execution of the login-path queries.
+
+Usage:
+    python -m benchmarks.prepared_statements --username demo --iterations 500
+
+Runs the queries a login issues (credential lookup + profile load) against
+the configured database, once as plain SQL and once through the prepared
+statement registry, and reports wall-clock latency plus the server-side
+planning time reported by EXPLAIN (ANALYZE).
+"""
+
+import argparse
+import re
+import statistics
+import time
+
+import psycopg2
+
+from config import HISTORY_PAGE_SIZE
+from utils.database import db_manager
+from utils.pool import PooledConnection
+
+LOGIN_PATH = ['user_auth_by_username', 'user_profile']
+
+
+def login_params(username):
+    """Parameters for each login-path statement."""
+    return {
+        'user_auth_by_username': (username,),
+        'user_profile': (HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE, username),
+    }
+
+
+def time_login_path(conn, username, iterations, prepared):
+    """Run the login path ``iterations`` times and return per-iteration latencies in ms."""
+    params = login_params(username)
+    timings = []
+    with conn.cursor() as cursor:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            for name in LOGIN_PATH:
+                query = db_manager.statements.query(name)
+                if prepared:
+                    db_manager.statements.execute(cursor, name, query, params[name])
+                else:
+                    cursor.execute(query, params[name])
+                cursor.fetchall()
+                conn.rollback()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def planning_time(conn, username, prepared):
+    """Sum of server-reported planning time (ms) for one pass over the login path."""
+    params = login_params(username)
+    total = 0.0
+    with conn.cursor() as cursor:
+        for name in LOGIN_PATH:
+            query = db_manager.statements.query(name)
+            if prepared:
+                db_manager.statements.execute(cursor, name, query, params[name])
+                cursor.fetchall()
+                conn.rollback()
+                args = ", ".join(["%s"] * len(params[name]))
+                cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY) EXECUTE {name} ({args})", params[name])
+            else:
+                cursor.execute("EXPLAIN (ANALYZE, SUMMARY) " + query, params[name])
+            for (line,) in cursor.fetchall():
+                match = re.match(r'Planning Time: ([\d.]+) ms', line)
+                if match:
+                    total += float(match.group(1))
+            conn.rollback()
+    return total
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"  {label:<10} mean {statistics.mean(timings):7.3f} ms | "
+          f"p50 {statistics.median(timings):7.3f} ms | p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--username', default='demo')
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    # Make sure every login-path statement is registered with the exact SQL the app uses
+    if not db_manager.get_user_by_username(args.username):
+        print(f"❌ User {args.username!r} not found; run populate_database.py or pick another --username")
+        return
+    db_manager.authenticate_user(args.username, '')
+    db_manager.get_user_profile(args.username, HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE)
+
+    conn = psycopg2.connect(connection_factory=PooledConnection, **db_manager.connection_params)
+    try:
+        print(f"🚀 Login path ({' + '.join(LOGIN_PATH)}), {args.iterations} iterations")
+
+        # Warm-up so both variants run with hot caches; the prepared warm-up also
+        # gets Postgres past its first five custom plans onto the cached generic plan
+        time_login_path(conn, args.username, 10, prepared=False)
+        time_login_path(conn, args.username, 10, prepared=True)
+
+        plain = time_login_path(conn, args.username, args.iterations, prepared=False)
+        prepared = time_login_path(conn, args.username, args.iterations, prepared=True)
+
+        print("\n⏱️  Client-observed latency per login")
+        summarize("plain", plain)
+        summarize("prepared", prepared)
+        saved = statistics.mean(plain) - statistics.mean(prepared)
+        print(f"  saved      {saved:7.3f} ms per login ({saved / statistics.mean(plain):.0%})")
+
+        print("\n🧠 Server planning time per login (EXPLAIN ANALYZE)")
+        print(f"  plain      {planning_time(conn, args.username, prepared=False):7.3f} ms")
+        print(f"  prepared   {planning_time(conn, args.username, prepared=True):7.3f} ms")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
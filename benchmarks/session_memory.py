@@ -0,0 +1,167 @@
+"""Per-session memory of a user's order history: dict rows vs record tuples.
+
+Usage:
+    python -m benchmarks.session_memory --orders 10000
+
+Seeds (once) a `bench_memory_user` with the requested number of orders and
+monthly bills, then loads that user's full profile and full paged order
+history both ways and reports the memory each result keeps alive (what
+would sit in st.session_state) and the peak while building it:
+
+- dicts:   RealDictCursor rows copied into dicts, JSON objects per order
+           (how the app loaded data before the record types)
+- records: tuple cursor rows / JSON arrays turned into Order/Bill/User
+           NamedTuples (utils.models)
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from psycopg2.extras import RealDictCursor
+
+from utils.database import db_manager
+from utils.passwords import password_hasher
+
+BENCH_USER = 'bench_memory_user'
+
+DICT_PROFILE_QUERY = """
+    SELECT u.id, u.username, u.email, u.name, u.subscription, u.created_at,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'id', o.order_number,
+                          'date', COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), ''),
+                          'restaurant', o.restaurant,
+                          'items', o.items,
+                          'total', COALESCE(o.total, 0)::float8,
+                          'status', o.status
+                      ) ORDER BY o.created_at DESC, o.id DESC)
+               FROM orders o WHERE o.user_id = u.id
+           ), '[]'::json) AS orders,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'month', b.month,
+                          'amount', COALESCE(b.amount, 0)::float8,
+                          'status', b.status,
+                          'due_date', COALESCE(to_char(b.due_date, 'YYYY-MM-DD'), '')
+                      ) ORDER BY b.due_date DESC, b.id DESC)
+               FROM bills b WHERE b.user_id = u.id
+           ), '[]'::json) AS bills
+    FROM users u
+    WHERE u.username = %s
+"""
+
+DICT_ORDERS_QUERY = """
+    SELECT o.order_number AS id,
+           COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), '') AS date,
+           o.restaurant, o.items, COALESCE(o.total, 0)::float8 AS total, o.status
+    FROM orders o
+    WHERE o.user_id = %s
+    ORDER BY o.created_at DESC, o.id DESC
+"""
+
+
+def seed(orders):
+    """Create the benchmark user with ``orders`` orders and two years of bills, if missing."""
+    user = db_manager.get_user_by_username(BENCH_USER)
+    if user is None:
+        password_hash = password_hasher.hash('password')
+        db_manager.execute_query(
+            "INSERT INTO users (username, email, name, password_hash) VALUES (%s, %s, %s, %s)",
+            (BENCH_USER, BENCH_USER + '@example.com', 'Memory Bench', password_hash)
+        )
+        user = db_manager.get_user_by_username(BENCH_USER)
+
+    existing = db_manager.execute_query(
+        "SELECT count(*) AS n FROM orders WHERE user_id = %s", (user.id,), fetch=True
+    )[0]['n']
+    if existing < orders:
+        print(f"🌱 Adding {orders - existing} orders for {BENCH_USER}...")
+        db_manager.execute_query("""
+            SET LOCAL statement_timeout = 0;
+            INSERT INTO orders (user_id, order_number, restaurant, items, total, status, created_at)
+            SELECT %s, 'MEM-' || g || '-' || md5(random()::text),
+                   (ARRAY['Pizza Palace', 'Spice Garden', 'Burger Junction', 'Thai Express'])[1 + g %% 4],
+                   jsonb_build_array('Item ' || (g %% 17), 'Item ' || (g %% 5), 'Item ' || (g %% 3)),
+                   200 + (g * 37) %% 800,
+                   (ARRAY['Delivered', 'Delivered', 'In Transit', 'Cancelled'])[1 + g %% 4],
+                   now() - (random() * interval '700 days')
+            FROM generate_series(%s, %s) g
+        """, (user.id, existing + 1, orders))
+        db_manager.execute_query("""
+            INSERT INTO bills (user_id, month, amount, status, due_date)
+            SELECT %s, to_char(d, 'FMMonth YYYY'), 499, 'Paid', (d + interval '24 days')::date
+            FROM generate_series(date_trunc('month', now()) - interval '23 months',
+                                 date_trunc('month', now()), interval '1 month') d
+            WHERE NOT EXISTS (SELECT 1 FROM bills WHERE user_id = %s)
+        """, (user.id, user.id))
+    return user
+
+
+def cleanup():
+    db_manager.execute_query("DELETE FROM users WHERE username = %s", (BENCH_USER,))
+    print(f"🧹 Removed {BENCH_USER}")
+
+
+def measure(load):
+    """Return (result, bytes kept alive by the result, peak bytes while loading)."""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak
+
+
+def load_dicts(query, params):
+    with db_manager.get_connection(read_only=True) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+
+def load_history_records(user_id, page_size=1000):
+    orders, cursor = db_manager.get_user_orders_page(user_id, limit=page_size)
+    while cursor:
+        page, cursor = db_manager.get_user_orders_page(user_id, limit=page_size, cursor=cursor)
+        orders.extend(page)
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--cleanup', action='store_true', help="remove the benchmark user and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    user = seed(args.orders)
+
+    # Warm up connections and prepared statements so they are not counted
+    db_manager.get_user_profile(BENCH_USER)
+    load_history_records(user.id)
+    load_dicts(DICT_PROFILE_QUERY, (BENCH_USER,))
+
+    # Past the profile cache, which would hand back the warm-up result
+    backend = getattr(db_manager, 'backend', db_manager)
+    cases = [
+        ("profile (dicts)", lambda: load_dicts(DICT_PROFILE_QUERY, (BENCH_USER,))[0]),
+        ("profile (records)", lambda: backend.get_user_profile(BENCH_USER)),
+        ("order history (dicts)", lambda: load_dicts(DICT_ORDERS_QUERY, (user.id,))),
+        ("order history (records)", lambda: load_history_records(user.id)),
+    ]
+
+    print(f"🧠 Memory for {BENCH_USER}\n")
+    print(f"  {'case':<26}{'orders':>8}{'kept KiB':>11}{'bytes/order':>13}{'peak KiB':>11}")
+    for label, load in cases:
+        result, retained, peak = measure(load)
+        orders = result['orders'] if isinstance(result, dict) else getattr(result, 'orders', result)
+        print(f"  {label:<26}{len(orders):>8}{retained / 1024:>11.0f}"
+              f"{retained / max(len(orders), 1):>13.0f}{peak / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
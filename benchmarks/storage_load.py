@@ -0,0 +1,150 @@
+"""Concurrent load test of the app's storage calls against the configured backend.
+
+Usage:
+    python -m benchmarks.storage_load --users 20 --orders-per-user 500 --threads 8 --seconds 10
+    DB_BACKEND=sqlite SQLITE_PATH=/tmp/load.db python -m benchmarks.storage_load
+    python -m benchmarks.storage_load --cleanup
+
+Only the StorageBackend interface is used (utils/storage.py), so the same run
+works against PostgreSQL, sharded PostgreSQL and the embedded SQLite backend.
+Seeds (once) `load_user_N` users with the requested number of orders, then
+every thread repeats what a browsing session does: load a profile, page
+through order history, search it and, for --write-ratio of iterations,
+place an order. Reports throughput and latency per call. Profiles are served
+by the process-wide profile cache unless --no-cache is given.
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.database import db_manager
+
+USER_PREFIX = 'load_user_'
+RESTAURANTS = ['Pizza Palace', 'Spice Garden', 'Burger Junction', 'Thai Express', 'Biryani House']
+ITEMS = ['Margherita', 'Paneer Tikka', 'Butter Chicken', 'Garlic Naan', 'Pad Thai', 'Veg Burger', 'Biryani']
+SEARCHES = ['pizza', 'naan', 'paneer', 'thai', 'biryani', 'burger']
+
+
+def seed(users, orders_per_user):
+    """Create the load-test users and their orders, if missing; returns ``[(username, user_id)]``."""
+    accounts = []
+    for n in range(users):
+        username = f"{USER_PREFIX}{n}"
+        if not db_manager.check_username_exists(username):
+            db_manager.create_user(username, f"{username}@example.com", 'password', f"Load User {n}")
+        user = db_manager.get_user_profile(username, orders_limit=0, bills_limit=0)
+        accounts.append((username, user.id))
+
+        missing = orders_per_user - user.order_stats.count
+        if missing > 0:
+            now = datetime.now(timezone.utc)
+            rng = random.Random(n)
+            report = db_manager.create_orders_bulk({
+                'user_id': user.id,
+                'order_number': f"LOAD-{n}-{user.order_stats.count + i}-{rng.getrandbits(32):08x}",
+                'restaurant': rng.choice(RESTAURANTS),
+                'items': rng.sample(ITEMS, 2),
+                'total': rng.randint(150, 1200),
+                'status': rng.choice(['Delivered', 'Delivered', 'In Transit', 'Cancelled']),
+                'created_at': now - timedelta(minutes=rng.randint(0, 700 * 24 * 60)),
+            } for i in range(missing))
+            print(f"🌱 {username}: added {report['inserted']} orders")
+    return accounts
+
+
+def cleanup():
+    """Delete the load-test users; their orders and bills cascade."""
+    for shard in getattr(db_manager, 'shards', [db_manager]):
+        shard.execute_query(f"DELETE FROM users WHERE username LIKE '{USER_PREFIX}%'")
+    if hasattr(db_manager, 'directory'):
+        db_manager.directory.execute_query(f"DELETE FROM user_directory WHERE username LIKE '{USER_PREFIX}%'")
+    print(f"🧹 Removed the {USER_PREFIX}* users")
+
+
+def worker(store, seed_value, accounts, deadline, write_ratio, latencies, errors, lock):
+    """One simulated session after another until ``deadline``."""
+    rng = random.Random(seed_value)
+    local = {name: [] for name in latencies}
+    failed = 0
+
+    def timed(name, call):
+        started = time.perf_counter()
+        result = call()
+        local[name].append(time.perf_counter() - started)
+        return result
+
+    while time.monotonic() < deadline:
+        username, user_id = rng.choice(accounts)
+        try:
+            timed('profile', lambda: store.get_user_profile(username, orders_limit=20, bills_limit=20))
+            _, cursor = timed('orders_page', lambda: store.get_user_orders_page(user_id, 20))
+            if cursor:
+                timed('orders_page_after', lambda: store.get_user_orders_page(user_id, 20, cursor))
+            timed('search', lambda: store.search_orders(user_id, rng.choice(SEARCHES), 20))
+            if rng.random() < write_ratio:
+                order = {'order_number': f"LOAD-W-{rng.getrandbits(64):016x}",
+                         'restaurant': rng.choice(RESTAURANTS), 'items': rng.sample(ITEMS, 2),
+                         'total': rng.randint(150, 1200), 'status': 'Pending'}
+                timed('create_order', lambda: store.create_order(user_id, order))
+        except Exception as e:
+            failed += 1
+            if failed == 1:
+                print(f"Warning: {e}")
+
+    with lock:
+        for name, samples in local.items():
+            latencies[name].extend(samples)
+        errors[0] += failed
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 if samples else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--orders-per-user', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.1, help="share of sessions that place an order")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the profile cache")
+    parser.add_argument('--cleanup', action='store_true', help="remove the load-test users and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    accounts = seed(args.users, args.orders_per_user)
+    store = getattr(db_manager, 'backend', db_manager) if args.no_cache else db_manager
+
+    latencies = {name: [] for name in ['profile', 'orders_page', 'orders_page_after', 'search', 'create_order']}
+    errors, lock = [0], threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(store, n, accounts, deadline, args.write_ratio, latencies, errors, lock))
+        for n in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"\n🏋️ {type(store).__name__}: {args.threads} threads for {elapsed:.1f}s, "
+          f"{args.users} users × {args.orders_per_user} orders, {errors[0]} errors\n")
+    print(f"  {'call':<20}{'count':>8}{'per sec':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, samples in latencies.items():
+        samples.sort()
+        print(f"  {name:<20}{len(samples):>8}{len(samples) / elapsed:>10.0f}{percentile(samples, 0.5):>9.2f}"
+              f"{percentile(samples, 0.95):>9.2f}{percentile(samples, 0.99):>9.2f}")
+    if hasattr(store, 'cache'):
+        print(f"\n🗃️ Profile cache: {store.cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
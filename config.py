@@ -20,6 +20,130 @@ DATABASE_CONFIG = {
     "password": os.getenv("DB_PASSWORD", "Dharani@05")
 }
 
+# Connection Pool Configuration (shared by every Streamlit session in the process)
+DB_POOL_CONFIG = {
+    "minconn": int(os.getenv("DB_POOL_MIN", "1")),
+    "maxconn": int(os.getenv("DB_POOL_MAX", "10")),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),  # seconds to wait for a free connection
+    "validate_after": float(os.getenv("DB_POOL_VALIDATE_AFTER", "30")),  # ping connections idle longer than this
+    "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),  # close surplus connections idle longer than this
+}
+
+def _parse_hosts(value: str) -> list:
+    """Parse a comma-separated ``host[:port]`` list into (host, port) pairs."""
+    hosts = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        host, _, port = entry.rpartition(":")
+        if not host or not port.isdigit():
+            host, port = entry, os.getenv("DB_PORT", "5432")
+        hosts.append((host, port))
+    return hosts
+
+
+# Timeouts and circuit breaker: after DB_CIRCUIT_FAILURES consecutive connection failures or
+# statement timeouts, database calls fail immediately for DB_CIRCUIT_RESET_SECONDS
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))  # seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))  # 0 disables
+DB_CIRCUIT_FAILURES = int(os.getenv("DB_CIRCUIT_FAILURES", "3"))
+DB_CIRCUIT_RESET_SECONDS = float(os.getenv("DB_CIRCUIT_RESET_SECONDS", "15"))
+
+# Read replicas: comma-separated host[:port] list; they share DB_NAME/DB_USER/DB_PASSWORD
+DB_REPLICA_HOSTS = _parse_hosts(os.getenv("DB_REPLICA_HOSTS", ""))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))  # reads pinned to primary after a write
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))  # skip a failed replica this long
+
+def _parse_shards(value: str) -> list:
+    """Parse a comma-separated ``host[:port]/dbname`` list into connection parameter dicts.
+
+    Shards share DB_USER/DB_PASSWORD; a missing host, port or database name
+    falls back to DB_HOST/DB_PORT/DB_NAME. The host may be a Unix socket
+    directory (``/var/run/postgresql/shard1``).
+    """
+    shards = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        address, _, database = entry.rpartition("/") if "/" in entry else (entry, "", "")
+        host, port = (_parse_hosts(address) or [(DATABASE_CONFIG["host"], DATABASE_CONFIG["port"])])[0]
+        shards.append({**DATABASE_CONFIG, "host": host, "port": port,
+                       "database": database or DATABASE_CONFIG["database"]})
+    return shards
+
+
+# Sharding: users are spread over these databases by a hash of their id (empty = one database).
+# The user directory and slot map live on the first shard; each process re-reads the slot map
+# every SHARD_MAP_REFRESH_SECONDS (rebalance_shards.py waits that long between steps)
+DB_SHARDS = _parse_shards(os.getenv("DB_SHARDS", ""))
+SHARD_MAP_REFRESH_SECONDS = float(os.getenv("SHARD_MAP_REFRESH_SECONDS", "10"))
+
+# Storage backend: "postgres" (default), "asyncpg" (PostgreSQL with the app's queries on asyncpg and
+# one shared event loop) or "sqlite" for an embedded single-file database (single-node edge
+# deployments, local load tests); SQLite waits SQLITE_BUSY_TIMEOUT_MS for the write lock
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").strip().lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "quickdeliver.db")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Process-wide cache of user profiles and histories, shared by all sessions (0 disables either).
+# Writes through this process invalidate it; other processes' writes show up within the TTL
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))  # entries
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "30"))
+
+# Run hot queries as server-side prepared statements (disable behind transaction-mode poolers)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+# Queries slower than this (milliseconds) are logged; the last DB_SLOW_QUERY_LOG_SIZE are kept for the admin page
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "100"))
+
+# Push order status changes to open sessions via LISTEN/NOTIFY (needs a session-mode connection,
+# so disable behind transaction-mode poolers); the listener reconnects after this many seconds
+ORDER_EVENTS_ENABLED = os.getenv("ORDER_EVENTS_ENABLED", "true").lower() in ("1", "true", "yes")
+ORDER_EVENTS_RECONNECT_SECONDS = float(os.getenv("ORDER_EVENTS_RECONNECT_SECONDS", "5"))
+
+# bcrypt runs on BCRYPT_WORKERS threads (default: half the cores) so login storms can't starve
+# page rendering; at most BCRYPT_MAX_QUEUE more wait, and callers give up after BCRYPT_WAIT_SECONDS
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "32"))
+BCRYPT_WAIT_SECONDS = float(os.getenv("BCRYPT_WAIT_SECONDS", "5"))
+# bcrypt cost for new hashes. 0 = use the cost stored in app_settings, or calibrate it at startup (the
+# highest cost between the min and max whose hash takes at most BCRYPT_TARGET_MS) and store it there.
+# Logins rehash stored hashes with a lower cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0"))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+
+# Sign-in attempts per client IP and per username: a burst, then this many per minute.
+# The IP is taken from X-Forwarded-For only when LOGIN_TRUST_FORWARDED_FOR is set (behind a proxy)
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "10"))
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "5"))
+LOGIN_TRUST_FORWARDED_FOR = os.getenv("LOGIN_TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+# Live username/email availability checks on the sign-up form per client IP, so they can't be used
+# to enumerate which emails have accounts: a burst, then this many per minute
+AVAILABILITY_IP_BURST = int(os.getenv("AVAILABILITY_IP_BURST", "30"))
+AVAILABILITY_IP_PER_MINUTE = float(os.getenv("AVAILABILITY_IP_PER_MINUTE", "10"))
+
+# Live username/email availability on the sign-up form: Bloom filters of the existing names, rebuilt
+# every NAME_FILTER_REBUILD_SECONDS; only probable matches are checked against the database
+NAME_FILTER_CAPACITY = int(os.getenv("NAME_FILTER_CAPACITY", "100000"))
+NAME_FILTER_ERROR_RATE = float(os.getenv("NAME_FILTER_ERROR_RATE", "0.001"))
+NAME_FILTER_REBUILD_SECONDS = float(os.getenv("NAME_FILTER_REBUILD_SECONDS", "600"))
+
+# Usernames allowed to open the admin page (comma-separated)
+ADMIN_USERNAMES = [name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()]
+
+# Order/bill history is loaded this many rows at a time
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+
+# Maximum number of orders returned by the Past Orders search
+ORDER_SEARCH_LIMIT = int(os.getenv("ORDER_SEARCH_LIMIT", "50"))
+
+# In-app history exports are spooled to a temporary file (in memory up to EXPORT_SPOOL_BYTES)
+# and capped at EXPORT_MAX_ROWS rows, because Streamlit keeps each download in memory;
+# full exports of any size go through `python export_history.py`
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "100000"))
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
 # OpenRouter API Configuration
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 OPENROUTER_MODEL = "anthropic/claude-3.5-sonnet"  # You can change this to your preferred model
@@ -38,7 +162,11 @@ THEME = {
 }
 
 # Session Configuration
-SESSION_TIMEOUT = 3600  # 1 hour in seconds
+SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))  # 1 hour in seconds
+# Signs session tokens; set it so sessions survive restarts and work across app processes
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+# Also keep sessions in PostgreSQL (app_sessions), not just in this process's memory
+SESSION_PERSIST = os.getenv("SESSION_PERSIST", "false").lower() in ("1", "true", "yes")
 
 # Mock Data Configuration
 DEMO_USERNAME = "demo"
@@ -0,0 +1,49 @@
+"""Export order and bill history to CSV or Parquet.
+
+Rows are streamed from a server-side cursor straight into the output file,
+so memory use is the same for a thousand rows or fifty million:
+
+    python export_history.py --all-orders --format parquet --output orders.parquet
+    python export_history.py --user demo --output demo_orders.csv
+    python export_history.py --user demo --bills --output demo_bills.csv
+"""
+
+import argparse
+import sys
+import time
+
+from utils.database import db_manager
+from utils.export import BILL_COLUMNS, EXPORT_FORMATS, ORDER_COLUMNS, export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--all-orders', action='store_true', help="export every order (admin)")
+    source.add_argument('--user', metavar='USERNAME', help="export one user's history")
+    parser.add_argument('--bills', action='store_true', help="with --user, export bills instead of orders")
+    parser.add_argument('--format', choices=[f.lower() for f in EXPORT_FORMATS], default='csv')
+    parser.add_argument('--output', required=True, help="file to write")
+    args = parser.parse_args()
+
+    if args.all_orders:
+        columns, rows = ORDER_COLUMNS, db_manager.stream_all_orders()
+    else:
+        user = db_manager.get_user_by_username(args.user)
+        if not user:
+            print(f"❌ User {args.user!r} not found")
+            return 1
+        if args.bills:
+            columns, rows = BILL_COLUMNS, db_manager.stream_user_bills(user.id)
+        else:
+            columns, rows = ORDER_COLUMNS, db_manager.stream_user_orders(user.id)
+
+    started = time.perf_counter()
+    with open(args.output, 'wb') as out:
+        count = export(out, 'Parquet' if args.format == 'parquet' else 'CSV', columns, rows)
+    print(f"✅ Exported {count} rows to {args.output} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
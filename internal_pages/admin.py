@@ -0,0 +1,103 @@
+"""Admin page with database query statistics."""
+#admin.py
+from typing import Optional
+import pandas as pd
+import streamlit as st
+from utils.database import db_manager
+from utils.models import User
+from utils.order_events import order_events
+from utils.availability import name_availability
+from utils.passwords import login_throttle, password_hasher
+from config import ADMIN_USERNAMES
+
+
+def is_admin(user_data: Optional[User]) -> bool:
+    """Whether the logged-in user may open the admin page."""
+    return user_data is not None and user_data.username in ADMIN_USERNAMES
+
+
+def admin_page():
+    """Query latency, connection acquire times and slow queries for this process."""
+    st.markdown("""
+    <div class="main-header">
+        <h1>🛠️ Admin</h1>
+        <p>Database query statistics for this app process</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    if not is_admin(st.session_state.get('user_data')):
+        st.error("You don't have access to this page.")
+        return
+
+    stats = db_manager.query_stats.snapshot()
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        st.caption(f"Collected since {stats['since']}; slow-query threshold {stats['slow_query_ms']:.0f} ms")
+    with col2:
+        st.download_button(
+            "⬇️ Download JSON", data=db_manager.query_stats.to_json(),
+            file_name="query_stats.json", mime="application/json", use_container_width=True
+        )
+    with col3:
+        if st.button("🔄 Reset", use_container_width=True):
+            db_manager.query_stats.reset()
+            st.rerun()
+
+    st.subheader("⏱️ Queries (slowest p99 first)")
+    if stats['queries']:
+        queries = pd.DataFrame(stats['queries'])
+        st.dataframe(
+            queries[['query', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'mean_ms',
+                     'total_ms', 'rows', 'errors']],
+            hide_index=True, use_container_width=True
+        )
+    else:
+        st.info("No queries recorded yet")
+
+    st.subheader("🔌 Connection Acquire Time")
+    if stats['acquire']:
+        st.dataframe(
+            pd.DataFrame([{'pool': pool, **summary} for pool, summary in stats['acquire'].items()]),
+            hide_index=True, use_container_width=True
+        )
+    pool_stats = db_manager.pool_stats()
+    st.json(pool_stats, expanded=False)
+
+    cache = getattr(db_manager, 'cache', None)
+    if cache is not None:
+        st.subheader("🗃️ Profile Cache")
+        cache_stats = cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+        col2.metric("Entries", f"{cache_stats['size']} / {cache_stats['max_size']}")
+        col3.metric("Evictions", cache_stats['evictions'])
+        col4.metric("Invalidations", cache_stats['invalidations'])
+        st.json(cache_stats, expanded=False)
+
+    st.subheader("🔐 Password Hashing")
+    hasher_stats = password_hasher.stats()
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("bcrypt cost", hasher_stats['rounds'] or "calibrating")
+    col2.metric("Worker utilisation", f"{hasher_stats['utilisation']:.0%}")
+    col3.metric("Queued", f"{hasher_stats['queued']} / {hasher_stats['max_queue']}")
+    col4.metric("Rejected (busy)", hasher_stats['rejected'] + hasher_stats['timed_out'])
+    col5.metric("Throttled logins", login_throttle.stats()['throttled'])
+    st.json({**hasher_stats, 'throttle': login_throttle.stats()}, expanded=False)
+
+    st.subheader("🔎 Name Availability Filters")
+    availability_stats = name_availability.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Checks", availability_stats['checks'])
+    col2.metric("Answered by filter", availability_stats['filtered'])
+    col3.metric("Database lookups", availability_stats['db_lookups'])
+    st.json(availability_stats, expanded=False)
+
+    st.subheader("📣 Order Status Listener")
+    st.json(order_events.stats(), expanded=False)
+
+    st.subheader("🐢 Slow Queries")
+    if stats['slow_queries']:
+        st.dataframe(pd.DataFrame(stats['slow_queries'][::-1]), hide_index=True, use_container_width=True)
+    else:
+        st.info("No slow queries recorded")
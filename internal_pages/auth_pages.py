@@ -1,7 +1,9 @@
 """Authentication pages for login and signup."""
 #auth_pages.py
 import streamlit as st
-from utils.auth import authenticate_user, create_user, login_user
+from utils.auth import authenticate_user, check_name_available, create_user, login_user
+from utils.passwords import LoginRejectedError
+from utils.storage import SIGNUP_CREATED, SIGNUP_EMAIL_TAKEN, SIGNUP_FAILED, SIGNUP_USERNAME_TAKEN
 from config import APP_NAME
 
 
@@ -54,28 +56,46 @@ def signin_form():
         if submit_button:
             if not username or not password:
                 st.error("❌ Please fill in all fields")
-            elif authenticate_user(username, password):
-                login_user(username)
-                st.success("✅ Login successful!")
-                st.rerun()
             else:
-                st.error("❌ Invalid credentials")
+                try:
+                    user_data = authenticate_user(username, password)
+                    if user_data:
+                        login_user(username, user_data)
+                        st.success("✅ Login successful!")
+                        st.rerun()
+                    else:
+                        st.error("❌ Invalid credentials")
+                except LoginRejectedError as e:
+                    st.error(f"⏳ {e}")
 
     st.info("💡 Demo credentials: Username: `demo`, Password: `password`")
 
 
+def availability_caption(label, field, value):
+    """Show under a field whether the username/email typed so far is still free."""
+    available = check_name_available(field, value)
+    if available is None:
+        return
+    st.caption(f"✅ {label} is available" if available else f"❌ {label} is already taken")
+
+
 def signup_form():
     """Display sign up form."""
     st.subheader("Join QuickDeliver")
 
-    with st.form("signup_form"):
+    # Not an st.form: each field reruns the page as it's filled in, for the live availability checks
+    with st.container():
         new_username = st.text_input("Choose Username", key="signup_username")
+        if len(new_username) >= 3:
+            availability_caption("Username", "username", new_username)
         new_name = st.text_input("Full Name", key="signup_name")
         new_email = st.text_input("Email Address", key="signup_email")
+        if "@" in new_email and "." in new_email:
+            availability_caption("Email", "email", new_email)
         new_password = st.text_input("Password", type="password", key="signup_password")
         confirm_password = st.text_input("Confirm Password", type="password", key="confirm_password")
 
-        submit_button = st.form_submit_button("Sign Up")
+        submit_button = st.button("Sign Up")
 
         if submit_button:
             if not all([new_username, new_name, new_email, new_password, confirm_password]):
@@ -90,8 +110,14 @@ def signup_form():
                 st.error("❌ Username must be at least 3 characters")
             elif len(new_name.strip()) < 2:
                 st.error("❌ Please enter your full name")
-            elif create_user(new_username, new_email, new_password, new_name):
-                st.success("✅ Account created successfully! Please sign in with your new credentials.")
-                st.balloons()
             else:
-                st.error("❌ Username or email already exists. Please try different credentials.")
\ No newline at end of file
+                outcome = create_user(new_username, new_email, new_password, new_name)
+                if outcome == SIGNUP_CREATED:
+                    st.success("✅ Account created successfully! Please sign in with your new credentials.")
+                    st.balloons()
+                elif outcome == SIGNUP_USERNAME_TAKEN:
+                    st.error("❌ That username is already taken. Please choose another.")
+                elif outcome == SIGNUP_EMAIL_TAKEN:
+                    st.error("❌ An account with this email already exists. Try signing in instead.")
+                elif outcome == SIGNUP_FAILED:
+                    st.error("❌ Could not create your account. Please try again.")
\ No newline at end of file
@@ -9,7 +9,7 @@ def chatbot_page():
     """AI Assistant chatbot page."""
     st.header("🤖 AI Customer Service Assistant")
     
-    user_data = st.session_state.get('user_data', {})
+    user_data = st.session_state.get('user_data')
 
     # Main layout with chat on left and actions on right
     col_chat, col_actions = st.columns([3, 1])
@@ -42,7 +42,7 @@ def chatbot_page():
                 border-left: 4px solid #4caf50;
                 color: #2e7d32;
             ">
-                🤖 <strong>Assistant:</strong> Hello {user_data.get('name', 'there')}! I'm your QuickDeliver assistant. 
+                🤖 <strong>Assistant:</strong> Hello {user_data.name if user_data else 'there'}! I'm your QuickDeliver assistant. 
                 How can I help you today? I can assist with orders, billing, recommendations, and more!
             </div>
             """, unsafe_allow_html=True)
@@ -1,5 +1,7 @@
 """Dashboard and related pages for the delivery app."""
 
+import itertools
+import tempfile
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
@@ -9,6 +11,98 @@ from utils.data import (
     SUBSCRIPTION_PLANS, RESTAURANT_RECOMMENDATIONS, 
     SPECIAL_OFFERS, TRENDING_ITEMS, get_all_orders
 )
+from utils.auth import get_order_stats, get_recent_orders
+from utils.database import db_manager
+from utils.circuit_breaker import CircuitOpenError
+from utils.export import BILL_COLUMNS, EXPORT_FORMATS, ORDER_COLUMNS, export
+from config import EXPORT_MAX_ROWS, EXPORT_SPOOL_BYTES, HISTORY_PAGE_SIZE, ORDER_SEARCH_LIMIT
+
+
+def load_history(state_key, user_data, fetch_page, fallback_key):
+    """Get the paged order/bill history kept in session state, loading the first page if needed."""
+    history = st.session_state.get(state_key)
+    if history is None:
+        # Mock users keep their (small) full history in memory
+        items, cursor = list(getattr(user_data, fallback_key)), None
+        if user_data.id:
+            try:
+                items, cursor = fetch_page(user_data.id, limit=HISTORY_PAGE_SIZE)
+            except CircuitOpenError:
+                # Database is down: show whatever history is in memory, and retry next time
+                st.warning("Live history is temporarily unavailable; showing your most recent items.")
+                return {'items': items, 'cursor': None}
+        history = {'items': items, 'cursor': cursor}
+        st.session_state[state_key] = history
+    return history
+
+
+def load_more_button(state_key, user_data, fetch_page, label):
+    """Show a "load more" button that appends the next history page when clicked."""
+    history = st.session_state[state_key]
+    if history['cursor'] and st.button(label, key=f"load_more_{state_key}", use_container_width=True):
+        try:
+            items, cursor = fetch_page(user_data.id, limit=HISTORY_PAGE_SIZE, cursor=history['cursor'])
+        except CircuitOpenError:
+            st.warning("Older history is temporarily unavailable. Please try again in a moment.")
+            return
+        history['items'].extend(items)
+        history['cursor'] = cursor
+        st.rerun()
+
+
+def search_orders(user_data, text):
+    """Search the user's whole order history by restaurant or item name."""
+    if not user_data.id:
+        # Mock users: substring match over the in-memory history
+        text = text.lower()
+        return [
+            order for order in user_data.orders
+            if text in order.restaurant.lower() or any(text in item.lower() for item in order.items)
+        ]
+    try:
+        return db_manager.search_orders(user_data.id, text, limit=ORDER_SEARCH_LIMIT)
+    except CircuitOpenError:
+        st.warning("Search is temporarily unavailable. Please try again in a moment.")
+        return []
+
+
+def export_section(state_key, user_data, stream, columns, filename):
+    """Offer the user's history as a CSV/Parquet download, streamed from the database.
+
+    Rows go from the server-side cursor into a temporary file, up to
+    ``EXPORT_MAX_ROWS``; Streamlit holds the finished download in memory, so
+    longer histories are exported with ``export_history.py``.
+    """
+    with st.expander("📥 Export full history"):
+        if not user_data.id:
+            st.info("Export is available for registered accounts.")
+            return
+        export_format = st.radio("Format", EXPORT_FORMATS, horizontal=True, key=f"export_format_{state_key}")
+        if st.button("Prepare export", key=f"export_{state_key}"):
+            with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as out:
+                try:
+                    rows = stream(user_data.id)
+                    try:
+                        count = export(out, export_format, columns, itertools.islice(rows, EXPORT_MAX_ROWS))
+                        truncated = count == EXPORT_MAX_ROWS and next(rows, None) is not None
+                    finally:
+                        rows.close()
+                except CircuitOpenError:
+                    st.warning("Export is temporarily unavailable. Please try again in a moment.")
+                    return
+                out.seek(0)
+                data = out.read()
+            if truncated:
+                st.warning(f"Your history is longer than {EXPORT_MAX_ROWS:,} rows; this download holds "
+                           "the most recent ones. Contact support for a complete export.")
+            extension = export_format.lower()
+            st.download_button(
+                f"⬇️ Download {count} rows ({extension})",
+                data=data,
+                file_name=f"{filename}.{extension}",
+                mime='text/csv' if extension == 'csv' else 'application/octet-stream',
+                key=f"download_{state_key}",
+            )
 
 
 def dashboard_page():
@@ -20,17 +114,17 @@ def dashboard_page():
     </div>
     """, unsafe_allow_html=True)
 
-    # Get user data
-    user_data = st.session_state.get('user_data', {})
-    orders = user_data.get('orders', [])
+    # Get user data (loaded on first visit)
+    orders = get_recent_orders()
+    order_stats = get_order_stats()
     
-    # Calculate metrics
-    total_orders = len(orders)
-    total_spent = sum(order.get('total', 0) for order in orders)
+    # Calculate metrics (orders only holds the most recent page; stats cover the full history)
+    total_orders = order_stats.count
+    total_spent = order_stats.total_spent
     avg_order_value = total_spent / total_orders if total_orders > 0 else 0
     
     # Recent orders (last 7 days)
-    recent_orders = [order for order in orders if order.get('status') in ['Delivered', 'In Transit', 'Preparing']]
+    recent_orders = [order for order in orders if order.status in ['Delivered', 'In Transit', 'Preparing']]
     recent_count = len(recent_orders[:5])  # Last 5 orders
 
     # Display metrics
@@ -87,7 +181,7 @@ def dashboard_page():
                     'In Transit': '#ffc107', 
                     'Preparing': '#17a2b8',
                     'Cancelled': '#dc3545'
-                }.get(order.get('status', 'Pending'), '#6c757d')
+                }.get(order.status, '#6c757d')
                 
                 st.markdown(f"""
                 <div style="
@@ -99,12 +193,12 @@ def dashboard_page():
                 ">
                     <div style="display: flex; justify-content: space-between; align-items: center;">
                         <div>
-                            <strong>{order.get('restaurant', 'Unknown')}</strong><br>
-                            <small>{order.get('date', 'Unknown date')}</small>
+                            <strong>{order.restaurant}</strong><br>
+                            <small>{order.date or 'Unknown date'}</small>
                         </div>
                         <div style="text-align: right;">
-                            <strong>₹{order.get('total', 0)}</strong><br>
-                            <span style="color: {status_color}; font-weight: 500;">{order.get('status', 'Pending')}</span>
+                            <strong>₹{order.total}</strong><br>
+                            <span style="color: {status_color}; font-weight: 500;">{order.status}</span>
                         </div>
                     </div>
                 </div>
@@ -117,7 +211,7 @@ def dashboard_page():
         
     #     # Billing information
     #     bills = user_data.get('bills', [])
-    #     subscription = user_data.get('subscription', 'Basic')
+    #     subscription = user_data.subscription
         
     #     if bills:
     #         # Sort bills by due date (most recent first) and show last 3
@@ -198,9 +292,9 @@ def dashboard_page():
         restaurant_totals = {}
         
         for order in orders:
-            restaurant = order.get('restaurant', 'Unknown')
+            restaurant = order.restaurant
             restaurant_counts[restaurant] = restaurant_counts.get(restaurant, 0) + 1
-            restaurant_totals[restaurant] = restaurant_totals.get(restaurant, 0) + order.get('total', 0)
+            restaurant_totals[restaurant] = restaurant_totals.get(restaurant, 0) + order.total
         
         if restaurant_counts:
             # Create DataFrame for plotting
@@ -260,7 +354,7 @@ def bill_tracker_page(user_data):
     """, unsafe_allow_html=True)
 
     # Current subscription info
-    subscription = user_data.get('subscription', 'Basic')
+    subscription = user_data.subscription
     plan_info = SUBSCRIPTION_PLANS.get(subscription, SUBSCRIPTION_PLANS['Basic'])
     
     st.subheader("📋 Current Subscription")
@@ -290,12 +384,12 @@ def bill_tracker_page(user_data):
 
     # Bills history
     st.subheader("📊 Billing History")
-    bills = user_data.get('bills', [])
+    bills = load_history('bills_history', user_data, db_manager.get_user_bills_page, 'bills')['items']
     
     if bills:
         for bill in bills:
-            status_color = '#28a745' if bill['status'] == 'Paid' else '#ffc107'
-            status_bg = '#d4edda' if bill['status'] == 'Paid' else '#fff3cd'
+            status_color = '#28a745' if bill.status == 'Paid' else '#ffc107'
+            status_bg = '#d4edda' if bill.status == 'Paid' else '#fff3cd'
             
             st.markdown(f"""
             <div style="
@@ -309,11 +403,11 @@ def bill_tracker_page(user_data):
                 align-items: center;
             ">
                 <div>
-                    <h4 style="margin: 0; color: #333;">{bill['month']}</h4>
-                    <p style="margin: 0.5rem 0 0 0; color: #666;">Due: {bill['due_date']}</p>
+                    <h4 style="margin: 0; color: #333;">{bill.month}</h4>
+                    <p style="margin: 0.5rem 0 0 0; color: #666;">Due: {bill.due_date}</p>
                 </div>
                 <div style="text-align: right;">
-                    <h3 style="margin: 0; color: #333;">₹{bill['amount']}</h3>
+                    <h3 style="margin: 0; color: #333;">₹{bill.amount}</h3>
                     <span style="
                         background: {status_color};
                         color: white;
@@ -321,10 +415,13 @@ def bill_tracker_page(user_data):
                         border-radius: 15px;
                         font-size: 0.85rem;
                         font-weight: 500;
-                    ">{bill['status']}</span>
+                    ">{bill.status}</span>
                 </div>
             </div>
             """, unsafe_allow_html=True)
+
+        load_more_button('bills_history', user_data, db_manager.get_user_bills_page, "⬇️ Load older bills")
+        export_section('bills', user_data, db_manager.stream_user_bills, BILL_COLUMNS, "bills")
     else:
         st.info("No billing history available")
 
@@ -369,12 +466,20 @@ def past_orders_page(user_data):
     </div>
     """, unsafe_allow_html=True)
 
-    orders = user_data.get('orders', [])
+    orders = load_history('orders_history', user_data, db_manager.get_user_orders_page, 'orders')['items']
     
     if not orders:
         st.info("No orders found. Place your first order to see it here!")
         return
 
+    search_text = st.text_input(
+        "🔍 Search orders",
+        placeholder="Restaurant or dish, e.g. Butter Chicken",
+        key="orders_search"
+    ).strip()
+    if search_text:
+        orders = search_orders(user_data, search_text)
+
     # Filter options
     col1, col2, col3 = st.columns(3)
     
@@ -386,7 +491,7 @@ def past_orders_page(user_data):
     
     with col2:
         # Get unique restaurants
-        restaurants = list(set(order.get('restaurant', 'Unknown') for order in orders))
+        restaurants = list(set(order.restaurant for order in orders))
         restaurant_filter = st.selectbox(
             "Filter by Restaurant", 
             ["All"] + restaurants
@@ -402,20 +507,20 @@ def past_orders_page(user_data):
     filtered_orders = orders.copy()
     
     if status_filter != "All":
-        filtered_orders = [order for order in filtered_orders if order.get('status') == status_filter]
+        filtered_orders = [order for order in filtered_orders if order.status == status_filter]
     
     if restaurant_filter != "All":
-        filtered_orders = [order for order in filtered_orders if order.get('restaurant') == restaurant_filter]
+        filtered_orders = [order for order in filtered_orders if order.restaurant == restaurant_filter]
     
     # Apply sorting
     if sort_order == "Newest First":
-        filtered_orders.sort(key=lambda x: x.get('date', ''), reverse=True)
+        filtered_orders.sort(key=lambda x: x.date, reverse=True)
     elif sort_order == "Oldest First":
-        filtered_orders.sort(key=lambda x: x.get('date', ''))
+        filtered_orders.sort(key=lambda x: x.date)
     elif sort_order == "Amount High to Low":
-        filtered_orders.sort(key=lambda x: x.get('total', 0), reverse=True)
+        filtered_orders.sort(key=lambda x: x.total, reverse=True)
     elif sort_order == "Amount Low to High":
-        filtered_orders.sort(key=lambda x: x.get('total', 0))
+        filtered_orders.sort(key=lambda x: x.total)
 
     # Display orders
     st.subheader(f"📋 Orders ({len(filtered_orders)} found)")
@@ -428,7 +533,7 @@ def past_orders_page(user_data):
             'Cancelled': '#dc3545'
         }
         
-        status_color = status_colors.get(order.get('status', 'Pending'), '#6c757d')
+        status_color = status_colors.get(order.status, '#6c757d')
         
         with st.container():
             st.markdown(f"""
@@ -442,11 +547,11 @@ def past_orders_page(user_data):
             ">
                 <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 1rem;">
                     <div>
-                        <h3 style="margin: 0; color: #333;">{order.get('restaurant', 'Unknown Restaurant')}</h3>
-                        <p style="margin: 0.5rem 0; color: #666;">Order #{order.get('id', 'Unknown')} • {order.get('date', 'Unknown date')}</p>
+                        <h3 style="margin: 0; color: #333;">{order.restaurant}</h3>
+                        <p style="margin: 0.5rem 0; color: #666;">Order #{order.id} • {order.date or 'Unknown date'}</p>
                     </div>
                     <div style="text-align: right;">
-                        <h3 style="margin: 0; color: #333;">₹{order.get('total', 0)}</h3>
+                        <h3 style="margin: 0; color: #333;">₹{order.total}</h3>
                         <span style="
                             background: {status_color};
                             color: white;
@@ -454,14 +559,14 @@ def past_orders_page(user_data):
                             border-radius: 15px;
                             font-size: 0.85rem;
                             font-weight: 500;
-                        ">{order.get('status', 'Pending')}</span>
+                        ">{order.status}</span>
                     </div>
                 </div>
                 
                 <div style="margin-top: 1rem;">
                     <strong style="color: #333;">Items:</strong>
                     <div style="margin: 0.5rem 0; color: #666;">
-                        {', '.join(order.get('items', []))}
+                        {', '.join(order.items)}
                     </div>
                 </div>
             </div>
@@ -471,13 +576,17 @@ def past_orders_page(user_data):
             col1, col2, col3 = st.columns([1, 1, 2])
             
             with col1:
-                if st.button(f"🔄 Reorder", key=f"reorder_{order.get('id')}"):
-                    st.success(f"Added {order.get('restaurant')} items to cart!")
+                if st.button(f"🔄 Reorder", key=f"reorder_{order.id}"):
+                    st.success(f"Added {order.restaurant} items to cart!")
             
             with col2:
-                if st.button(f"⭐ Rate", key=f"rate_{order.get('id')}"):
+                if st.button(f"⭐ Rate", key=f"rate_{order.id}"):
                     st.info("Rating feature coming soon!")
 
+    if not search_text:
+        load_more_button('orders_history', user_data, db_manager.get_user_orders_page, "⬇️ Load older orders")
+    export_section('orders', user_data, db_manager.stream_user_orders, ORDER_COLUMNS, "orders")
+
 
 def subscription_page(user_data):
     """Subscription management page."""
@@ -488,7 +597,7 @@ def subscription_page(user_data):
     </div>
     """, unsafe_allow_html=True)
 
-    current_plan = user_data.get('subscription', 'Basic')
+    current_plan = user_data.subscription
     
     # Display current plan
     st.subheader("📋 Current Plan")
@@ -591,15 +700,15 @@ def recommendations_page(user_data):
     </div>
     """, unsafe_allow_html=True)
 
-    # User's order history for personalization
-    orders = user_data.get('orders', [])
+    # User's recent order history for personalization
+    orders = get_recent_orders()
     
     # Analyze user preferences
     if orders:
         # Get favorite restaurants
         restaurant_counts = {}
         for order in orders:
-            restaurant = order.get('restaurant', 'Unknown')
+            restaurant = order.restaurant
             restaurant_counts[restaurant] = restaurant_counts.get(restaurant, 0) + 1
         
         favorite_restaurants = sorted(restaurant_counts.items(), key=lambda x: x[1], reverse=True)[:3]
@@ -0,0 +1,74 @@
+"""Apply versioned database migrations from supabase/migrations.
+
+Run once per deploy, before starting the app:
+
+    python migrate.py              # apply pending migrations
+    python migrate.py --status     # list applied and pending migrations
+    python migrate.py --dry-run    # show what would be applied
+    python migrate.py --baseline 20250714165641
+                                   # adopt a database created before migrations were tracked
+
+With DB_SHARDS set, each command runs against every shard in turn.
+"""
+
+import argparse
+import sys
+
+import psycopg2
+
+from config import DB_SHARDS
+from utils.migrations import MigrationError, MigrationRunner
+
+
+def run(runner, args):
+    """Run the requested command against one database; returns the exit code."""
+    try:
+        if args.status:
+            for migration in runner.status():
+                mark = "✅" if migration['applied'] else "⏳"
+                note = "  ⚠️ file changed since it was applied" if migration['modified'] else ""
+                print(f"{mark} {migration['version']}_{migration['name']}{note}")
+            return 0
+
+        if args.baseline:
+            recorded = runner.baseline(args.baseline)
+            print(f"📌 Recorded {len(recorded)} migrations up to {args.baseline} as applied")
+            return 0
+
+        pending = runner.migrate(dry_run=args.dry_run)
+        if not pending:
+            print("✅ Database schema is up to date")
+        elif args.dry_run:
+            for migration in pending:
+                print(f"⏳ {migration.version}_{migration.name}")
+        else:
+            print(f"🎉 Applied {len(pending)} migrations")
+        return 0
+    except MigrationError as e:
+        print(f"❌ {e}")
+    except psycopg2.Error as e:
+        print(f"❌ Database error: {e}")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--status', action='store_true', help="list migrations and exit")
+    parser.add_argument('--dry-run', action='store_true', help="show pending migrations without applying them")
+    parser.add_argument('--baseline', metavar='VERSION',
+                        help="mark migrations up to VERSION as applied without running them")
+    args = parser.parse_args()
+
+    if not DB_SHARDS:
+        return run(MigrationRunner(), args)
+
+    # Every shard carries the full schema
+    failed = 0
+    for index, params in enumerate(DB_SHARDS):
+        print(f"🗄️  Shard {index} ({params['host']}/{params['database']})")
+        failed += run(MigrationRunner(params), args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Partition maintenance for the time-partitioned orders and bills tables.
+
+Creates upcoming partitions ahead of time (run it daily from cron if the
+database has no pg_cron) and, with --verify, checks that the paged order
+and bill history queries are pruned to the partitions they need.
+"""
+
+import argparse
+
+from utils.database import db_manager
+
+
+def scanned_relations(plan):
+    """Collect every relation a JSON EXPLAIN plan touches."""
+    relations = set()
+    if 'Relation Name' in plan:
+        relations.add(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        relations |= scanned_relations(child)
+    return relations
+
+
+def partitions_of(table):
+    result = db_manager.execute_query(
+        "SELECT inhrelid::regclass::text AS name FROM pg_inherits WHERE inhparent = %s::regclass",
+        (table,), fetch=True, read_only=True
+    )
+    return {row['name'] for row in result or []}
+
+
+def explain(statement, params):
+    """Run EXPLAIN (FORMAT JSON) for a registered statement and return the partitions it scans."""
+    query = db_manager.statements.query(statement)
+    result = db_manager.execute_query(
+        "EXPLAIN (FORMAT JSON) " + query, params, fetch=True, read_only=True
+    )
+    return scanned_relations(result[0]['QUERY PLAN'][0]['Plan'])
+
+
+def verify_pruning(username):
+    """Show how many partitions each history query touches for ``username``."""
+    user = db_manager.get_user_by_username(username)
+    if not user:
+        print(f"❌ User {username!r} not found")
+        return False
+
+    ok = True
+    for table, fetch_page, statement in [
+        ('orders', db_manager.get_user_orders_page, 'orders_page'),
+        ('bills', db_manager.get_user_bills_page, 'bills_page'),
+    ]:
+        partitions = partitions_of(table)
+        if not partitions:
+            print(f"⚠️  {table} is not partitioned; apply the partitioning migration first")
+            ok = False
+            continue
+
+        # Fetch real pages so the cursor points at this user's history
+        _, cursor = fetch_page(user.id, limit=20)
+        first_page = explain(statement, (user.id, 21)) & partitions
+        print(f"📊 {table}: {len(partitions)} partitions")
+        print(f"  first page         scans {len(first_page):>3} (newest-first merge over each partition's index)")
+
+        if cursor:
+            fetch_page(user.id, limit=20, cursor=cursor)
+            later_page = explain(f"{statement}_after", (user.id, cursor[0], *cursor, 21)) & partitions
+            pruned = len(partitions) - len(later_page)
+            print(f"  next page          scans {len(later_page):>3}, pruned {pruned}")
+            ok = ok and pruned > 0
+        else:
+            print("  next page          n/a (history fits on one page)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help="create partitions this many months into the future")
+    parser.add_argument('--verify', metavar='USERNAME',
+                        help="check partition pruning for this user's paged history queries")
+    args = parser.parse_args()
+
+    created = db_manager.maintain_partitions(args.months_ahead)
+    print(f"✅ Partition maintenance done, {created} new partitions created")
+
+    if args.verify:
+        if verify_pruning(args.verify):
+            print("🎉 Partition pruning is working")
+        else:
+            print("⚠️  Paged queries were not pruned")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,14 @@
 """Database population script to add sample users with orders and bills."""
 
-import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import bcrypt
-import json
+import random
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from utils.database import db_manager
+from utils.storage import SIGNUP_CREATED
 
 # Load environment variables
 load_dotenv()
 
-def get_connection():
-    """Get database connection."""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        port=os.getenv('DB_PORT', '5432'),
-        database=os.getenv('DB_NAME', 'quickdeliver'),
-        user=os.getenv('DB_USER', 'postgres'),
-        password=os.getenv('DB_PASSWORD', 'Dharani@05')
-    )
-
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
-
 def populate_users():
     """Populate database with sample users."""
     users_data = [
@@ -66,44 +49,28 @@ def populate_users():
         }
     ]
     
+    print("Adding users to database...")
+
+    # Through db_manager, so with DB_SHARDS each user lands on its shard and is claimed in the directory
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        print("Adding users to database...")
-        
-        for user in users_data:
-            # Check if user already exists
-            cursor.execute("SELECT id FROM users WHERE username = %s", (user['username'],))
-            if cursor.fetchone():
-                print(f"⚠️  User {user['username']} already exists, skipping...")
-                continue
-            
-            # Hash password
-            password_hash = hash_password(user['password'])
-            
-            # Insert user
-            cursor.execute("""
-                INSERT INTO users (username, email, name, password_hash, subscription)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-            """, (user['username'], user['email'], user['name'], password_hash, user['subscription']))
-            
-            user_id = cursor.fetchone()['id']
-            user['id'] = user_id
-            
-            print(f"✅ Added user: {user['name']} ({user['username']})")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return users_data
-        
+        outcomes = db_manager.create_users(users_data)
     except Exception as e:
         print(f"❌ Error adding users: {e}")
         return []
 
+    for user, outcome in zip(users_data, outcomes):
+        if outcome != SIGNUP_CREATED:
+            print(f"⚠️  User {user['username']} not added ({outcome.replace('_', ' ')}), skipping...")
+            continue
+
+        user['id'] = db_manager.get_user_by_username(user['username']).id
+        if user['subscription'] != 'Basic':
+            db_manager.update_user_subscription(user['id'], user['subscription'])
+
+        print(f"✅ Added user: {user['name']} ({user['username']})")
+
+    return users_data
+
 def populate_orders(users_data):
     """Populate database with sample orders for users."""
     
@@ -128,61 +95,58 @@ def populate_orders(users_data):
     
     statuses = ["Delivered", "Delivered", "Delivered", "In Transit", "Preparing", "Cancelled"]
     
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        print("Adding orders to database...")
-        
-        order_counter = 1
-        
-        for user in users_data:
-            if not user.get('id'):
-                continue
-                
-            # Generate 3-6 orders per user
-            import random
-            num_orders = random.randint(3, 6)
+    print("Adding orders to database...")
+    
+    orders = []
+    order_counter = 1
+    
+    for user in users_data:
+        if not user.get('id'):
+            continue
             
-            for i in range(num_orders):
-                # Random restaurant
-                restaurant = random.choice(restaurants)
-                
-                # Random items from that restaurant
-                available_items = sample_items.get(restaurant, ["Item 1", "Item 2"])
-                num_items = random.randint(1, 3)
-                items = random.sample(available_items, min(num_items, len(available_items)))
-                
-                # Random total (₹400 to ₹2500)
-                total = random.randint(200, 999)
-                
-                # Random status
-                status = random.choice(statuses)
-                
-                # Random date in last 30 days
-                days_ago = random.randint(1, 30)
-                order_date = datetime.now() - timedelta(days=days_ago)
-                
-                # Generate order number
-                order_number = f"ORD-2024-{order_counter:03d}"
-                order_counter += 1
-                
-                # Insert order
-                cursor.execute("""
-                    INSERT INTO orders (user_id, order_number, restaurant, items, total, status, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (user['id'], order_number, restaurant, json.dumps(items), total, status, order_date))
-                
-                print(f"  📦 Added order {order_number} for {user['name']}")
+        # Generate 3-6 orders per user
+        num_orders = random.randint(3, 6)
         
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print("✅ Orders added successfully!")
-        
-    except Exception as e:
-        print(f"❌ Error adding orders: {e}")
+        for i in range(num_orders):
+            # Random restaurant
+            restaurant = random.choice(restaurants)
+            
+            # Random items from that restaurant
+            available_items = sample_items.get(restaurant, ["Item 1", "Item 2"])
+            num_items = random.randint(1, 3)
+            items = random.sample(available_items, min(num_items, len(available_items)))
+            
+            # Random total (₹400 to ₹2500)
+            total = random.randint(200, 999)
+            
+            # Random status
+            status = random.choice(statuses)
+            
+            # Random date in last 30 days
+            days_ago = random.randint(1, 30)
+            order_date = datetime.now() - timedelta(days=days_ago)
+            
+            # Generate order number
+            order_number = f"ORD-2024-{order_counter:03d}"
+            order_counter += 1
+            
+            orders.append({
+                'user_id': user['id'],
+                'order_number': order_number,
+                'restaurant': restaurant,
+                'items': items,
+                'total': total,
+                'status': status,
+                'created_at': order_date
+            })
+    
+    # Stream all orders through COPY instead of one INSERT per row
+    report = db_manager.create_orders_bulk(orders)
+    
+    for rejected in report['rejected']:
+        print(f"  ⚠️  Skipped order {rejected['order_number']}: {rejected['reason']}")
+    
+    print(f"✅ {report['inserted']} orders added successfully!")
 
 def populate_bills(users_data):
     """Populate database with sample bills for users."""
@@ -194,51 +158,47 @@ def populate_bills(users_data):
         'Premium': 799
     }
     
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        print("Adding bills to database...")
-        
-        for user in users_data:
-            if not user.get('id'):
+    print("Adding bills to database...")
+
+    for user in users_data:
+        if not user.get('id'):
+            continue
+
+        # Bills live with their user: on the user's shard when DB_SHARDS is set
+        node = db_manager.shard_for(user['id'], write=True) if hasattr(db_manager, 'shard_for') else db_manager
+
+        subscription = user.get('subscription', 'Basic')
+        monthly_amount = subscription_prices.get(subscription, 0)
+
+        # Generate bills for last 6 months
+        for month_offset in range(6):
+            bill_date = datetime.now() - timedelta(days=30 * month_offset)
+            month_name = bill_date.strftime("%B %Y")
+
+            # Due date is usually 25th of the month
+            due_date = bill_date.replace(day=25)
+
+            # Random status (mostly paid for older bills)
+            if month_offset > 1:
+                status = "Paid"
+            elif month_offset == 1:
+                status = "Paid" if user['username'] != 'amit_singh' else "Pending"
+            else:
+                status = "Pending"
+
+            # Insert bill (execute_query reports errors and returns None)
+            added = node.execute_query("""
+                INSERT INTO bills (user_id, month, amount, status, due_date, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (user['id'], month_name, monthly_amount, status, due_date, bill_date), fetch=True)
+            if not added:
+                print(f"  ❌ Could not add {month_name} bill for {user['name']}")
                 continue
-                
-            subscription = user.get('subscription', 'Basic')
-            monthly_amount = subscription_prices.get(subscription, 0)
-            
-            # Generate bills for last 6 months
-            for month_offset in range(6):
-                bill_date = datetime.now() - timedelta(days=30 * month_offset)
-                month_name = bill_date.strftime("%B %Y")
-                
-                # Due date is usually 25th of the month
-                due_date = bill_date.replace(day=25)
-                
-                # Random status (mostly paid for older bills)
-                if month_offset > 1:
-                    status = "Paid"
-                elif month_offset == 1:
-                    status = "Paid" if user['username'] != 'amit_singh' else "Pending"
-                else:
-                    status = "Pending"
-                
-                # Insert bill
-                cursor.execute("""
-                    INSERT INTO bills (user_id, month, amount, status, due_date, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (user['id'], month_name, monthly_amount, status, due_date, bill_date))
-                
-                print(f"  💰 Added {month_name} bill for {user['name']} - ₹{monthly_amount} ({status})")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        print("✅ Bills added successfully!")
-        
-    except Exception as e:
-        print(f"❌ Error adding bills: {e}")
+
+            print(f"  💰 Added {month_name} bill for {user['name']} - ₹{monthly_amount} ({status})")
+
+    print("✅ Bills added successfully!")
 
 def main():
     """Main function to populate database."""
@@ -0,0 +1,222 @@
+"""Initialise and rebalance the user shards configured in DB_SHARDS.
+
+    python rebalance_shards.py --init     # create the slot map and user directory
+    python rebalance_shards.py --status   # slots and users per shard
+    python rebalance_shards.py --plan     # slots that --apply would move
+    python rebalance_shards.py --apply    # move slots so every shard owns an equal share
+
+--init assigns every slot to the first shard, where an existing single-database
+deployment keeps its data, and registers its users in the directory. After
+adding shards to DB_SHARDS (and running `python migrate.py`), --apply moves
+slots in batches. For each batch it:
+
+1. marks the slots as moving, which makes the app refuse writes to their users,
+2. waits until every app process has re-read the slot map,
+3. copies the users with their orders and bills to the new shard,
+4. switches the slots to the new shard,
+5. waits again, then deletes the old copies.
+
+Reads keep working throughout. Slot moves are idempotent, so an interrupted
+run can simply be started again.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+from config import DB_STATEMENT_TIMEOUT_MS, SHARD_MAP_REFRESH_SECONDS
+from utils.database import db_manager
+from utils.sharding import SLOT_COUNT, ShardedDatabaseManager, slot_for
+
+# Parent tables first, so foreign keys hold while copying
+MOVED_TABLES = [('users', 'id'), ('orders', 'user_id'), ('bills', 'user_id')]
+
+
+def slot_map():
+    rows = db_manager.directory.execute_query(
+        "SELECT slot, shard, moving FROM shard_slots ORDER BY slot", fetch=True, tuples=True
+    )
+    return {slot: (shard, moving) for slot, shard, moving in rows or []}
+
+
+def init():
+    """Create the slot map (all slots on the first shard) and fill the directory."""
+    if slot_map():
+        print("✅ Slot map already initialised")
+    else:
+        for index, shard in enumerate(db_manager.shards[1:], start=1):
+            if shard.execute_query("SELECT 1 FROM users LIMIT 1", fetch=True):
+                print(f"❌ Shard {index} already has users; only the first shard may hold data before --init")
+                return False
+        db_manager.directory.execute_query(
+            "INSERT INTO shard_slots (slot, shard) SELECT g, 0 FROM generate_series(0, %s) g",
+            (SLOT_COUNT - 1,)
+        )
+        print(f"🗺️  Assigned all {SLOT_COUNT} slots to shard 0")
+
+    users = db_manager.directory.execute_query(
+        """SELECT u.id::text, u.username, u.email FROM users u
+           WHERE NOT EXISTS (SELECT 1 FROM user_directory d WHERE d.user_id = u.id)""",
+        fetch=True, tuples=True
+    ) or []
+    with db_manager.directory.get_connection() as conn:
+        with conn.cursor() as cursor:
+            for user_id, username, email in users:
+                cursor.execute(
+                    """INSERT INTO user_directory (user_id, username, email, slot)
+                       VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING""",
+                    (user_id, username, email, slot_for(user_id))
+                )
+        conn.commit()
+    print(f"📇 Registered {len(users)} users in the directory")
+    return True
+
+
+def status():
+    slots = slot_map()
+    if not slots:
+        print("❌ Slot map not initialised; run with --init")
+        return False
+    users_per_slot = dict(db_manager.directory.execute_query(
+        "SELECT slot, count(*) FROM user_directory GROUP BY slot", fetch=True, tuples=True
+    ) or [])
+    stored = db_manager.scatter(
+        lambda shard: shard.execute_query("SELECT count(*) FROM users", fetch=True, tuples=True)[0][0]
+    )
+
+    print(f"{'shard':<8}{'slots':>7}{'users (directory)':>19}{'users (stored)':>16}  database")
+    for index, shard in enumerate(db_manager.shards):
+        owned = [slot for slot, (owner, _) in slots.items() if owner == index]
+        users = sum(users_per_slot.get(slot, 0) for slot in owned)
+        params = shard.connection_params
+        print(f"{index:<8}{len(owned):>7}{users:>19}{stored[index]:>16}  {params['host']}/{params['database']}")
+    moving = [slot for slot, (_, is_moving) in slots.items() if is_moving]
+    if moving:
+        print(f"⚠️  Slots marked as moving (an interrupted --apply?): {moving}")
+    return True
+
+
+def plan():
+    """Slot moves needed to spread slots evenly: slot s belongs on shard s % N."""
+    slots = slot_map()
+    return [
+        (slot, shard, slot % len(db_manager.shards))
+        for slot, (shard, _) in slots.items()
+        if shard != slot % len(db_manager.shards)
+    ]
+
+
+def copy_table(source_cursor, target_cursor, table, key, user_ids):
+    """Copy one table's rows for ``user_ids`` between shards through a temporary file."""
+    source_cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position", (table,)
+    )
+    columns = ", ".join(row[0] for row in source_cursor.fetchall())
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as buffer:
+        source_cursor.copy_expert(source_cursor.mogrify(
+            f"COPY (SELECT {columns} FROM {table} WHERE {key} = ANY(%s::uuid[])) TO STDOUT", (user_ids,)
+        ).decode(), buffer)
+        buffer.seek(0)
+        target_cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+
+
+def move_users(user_ids, source, target):
+    """Copy users with their orders and bills from ``source`` to ``target`` in one transaction."""
+    with source.get_connection() as source_conn, target.get_connection() as target_conn:
+        with source_conn.cursor() as source_cursor, target_conn.cursor() as target_cursor:
+            for cursor in (source_cursor, target_cursor):
+                cursor.execute("SET LOCAL statement_timeout = 0")
+            # Leftovers of an interrupted earlier attempt (orders and bills cascade)
+            target_cursor.execute("DELETE FROM users WHERE id = ANY(%s::uuid[])", (user_ids,))
+            for table, key in MOVED_TABLES:
+                copy_table(source_cursor, target_cursor, table, key, user_ids)
+        target_conn.commit()
+        source_conn.rollback()
+
+
+def apply(batch_size, max_slots, dry_run):
+    moves = plan()[:max_slots]
+    if not moves:
+        print("✅ Slots are balanced")
+        return True
+    if dry_run:
+        for slot, source, target in moves:
+            print(f"⏳ slot {slot}: shard {source} → {target}")
+        return True
+
+    directory = db_manager.directory
+    settle = SHARD_MAP_REFRESH_SECONDS + DB_STATEMENT_TIMEOUT_MS / 1000 + 1
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        slots = [slot for slot, _, _ in batch]
+        directory.execute_query("UPDATE shard_slots SET moving = true WHERE slot = ANY(%s)", (slots,))
+        try:
+            print(f"🚧 {len(slots)} slots read-only, waiting {settle:.0f}s for app processes to notice...")
+            time.sleep(settle)
+
+            moved = {}
+            for slot, source, target in batch:
+                user_ids = [row[0] for row in directory.execute_query(
+                    "SELECT user_id::text FROM user_directory WHERE slot = %s", (slot,), fetch=True, tuples=True
+                ) or []]
+                if user_ids:
+                    move_users(user_ids, db_manager.shards[source], db_manager.shards[target])
+                moved[slot] = (source, user_ids)
+                print(f"  📦 slot {slot}: {len(user_ids)} users copied to shard {target}")
+
+            with directory.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    for slot, _, target in batch:
+                        cursor.execute("UPDATE shard_slots SET shard = %s, moving = false WHERE slot = %s",
+                                       (target, slot))
+                conn.commit()
+        finally:
+            # Slots that failed to copy stay on their old shard and become writable again
+            directory.execute_query("UPDATE shard_slots SET moving = false WHERE slot = ANY(%s)", (slots,))
+
+        print(f"🔀 Switched, waiting {SHARD_MAP_REFRESH_SECONDS:.0f}s before deleting the old copies...")
+        time.sleep(SHARD_MAP_REFRESH_SECONDS + 1)
+        for slot, (source, user_ids) in moved.items():
+            if user_ids:
+                db_manager.shards[source].execute_query(
+                    "DELETE FROM users WHERE id = ANY(%s::uuid[])", (user_ids,)
+                )
+    print(f"🎉 Moved {len(moves)} slots")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--init', action='store_true', help="create the slot map and user directory")
+    group.add_argument('--status', action='store_true', help="show slots and users per shard")
+    group.add_argument('--plan', action='store_true', help="list the slot moves --apply would make")
+    group.add_argument('--apply', action='store_true', help="move slots to balance the shards")
+    parser.add_argument('--batch', type=int, default=16, help="slots moved per read-only window")
+    parser.add_argument('--max-slots', type=int, default=SLOT_COUNT, help="move at most this many slots")
+    args = parser.parse_args()
+
+    # db_manager may be the profile cache in front of the shards
+    if not isinstance(getattr(db_manager, 'backend', db_manager), ShardedDatabaseManager):
+        print("❌ DB_SHARDS is not set; list the shard databases in .env first")
+        return 1
+
+    try:
+        if args.init:
+            ok = init()
+        elif args.status:
+            ok = status()
+        else:
+            ok = apply(args.batch, args.max_slots, dry_run=args.plan)
+    except psycopg2.Error as e:
+        print(f"❌ Database error: {e}")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+/*
+  # Supabase auth compatibility for plain PostgreSQL
+
+  The RLS policies in the following migrations refer to the `authenticated` role and
+  `auth.uid()`, which Supabase provides. On a plain PostgreSQL server they are missing,
+  so this migration creates stand-ins; on Supabase it changes nothing.
+
+  1. Roles
+    - `authenticated` (NOLOGIN), only if it does not exist
+
+  2. Functions
+    - `auth.uid()` returning NULL, only if the `auth` schema has no such function
+      (the app connects as the table owner, which bypasses RLS)
+*/
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+    CREATE ROLE authenticated NOLOGIN;
+  END IF;
+
+  IF to_regprocedure('auth.uid()') IS NULL THEN
+    CREATE SCHEMA IF NOT EXISTS auth;
+    CREATE FUNCTION auth.uid() RETURNS uuid
+      LANGUAGE sql STABLE
+      AS 'SELECT NULL::uuid';
+  END IF;
+END;
+$$;
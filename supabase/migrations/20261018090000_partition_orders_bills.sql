@@ -0,0 +1,206 @@
+/*
+  # Partition orders by month and bills by year
+
+  1. Changes
+    - `orders` becomes a range-partitioned table on `created_at`, one partition per month
+    - `bills` becomes a range-partitioned table on `due_date`, one partition per year
+    - Both tables get a DEFAULT partition so rows outside the prepared ranges are never rejected
+    - Existing rows are copied into the new tables, then the old heaps are dropped
+    - `orders.created_at` is now NOT NULL (it is the partition key)
+
+  2. Keys
+    - Primary keys become (id, created_at) / (id, due_date): Postgres requires the partition key
+      in every unique constraint
+    - `order_number` uniqueness is enforced per partition as UNIQUE (order_number, created_at);
+      bulk ingestion additionally skips order numbers that already exist in any partition
+
+  3. Partition maintenance
+    - `ensure_partitions(table, step, from, to)` creates any missing partitions in a range
+    - `maintain_partitions(months_ahead)` keeps orders/bills partitions created ahead of time;
+      it is scheduled daily through pg_cron when that extension is installed, and can also be
+      run with `python partition_maintenance.py`
+
+  4. Security
+    - Row Level Security and the existing policies are re-created on the new tables
+*/
+
+-- Partition management ------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ensure_partitions(
+  parent text,
+  step text,
+  from_date date,
+  to_date date
+) RETURNS integer AS $$
+DECLARE
+  lower_bound date := date_trunc(step, from_date)::date;
+  upper_bound date;
+  partition_name text;
+  created integer := 0;
+BEGIN
+  IF step NOT IN ('month', 'year') THEN
+    RAISE EXCEPTION 'Unsupported partition step: %', step;
+  END IF;
+
+  WHILE lower_bound <= to_date LOOP
+    upper_bound := (lower_bound + ('1 ' || step)::interval)::date;
+    partition_name := parent || '_p' || to_char(lower_bound, CASE step WHEN 'month' THEN 'YYYYMM' ELSE 'YYYY' END);
+
+    IF to_regclass(partition_name) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, lower_bound, upper_bound
+      );
+      created := created + 1;
+    END IF;
+
+    lower_bound := upper_bound;
+  END LOOP;
+
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION maintain_partitions(months_ahead integer DEFAULT 3)
+RETURNS integer AS $$
+BEGIN
+  RETURN ensure_partitions('orders', 'month', current_date, (current_date + make_interval(months => months_ahead))::date)
+       + ensure_partitions('bills', 'year', current_date, (current_date + make_interval(months => months_ahead + 12))::date);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Orders --------------------------------------------------------------------
+
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey;
+ALTER INDEX orders_order_number_key RENAME TO orders_unpartitioned_order_number_key;
+DROP INDEX IF EXISTS idx_orders_user_id;
+DROP INDEX IF EXISTS idx_orders_order_number;
+DROP INDEX IF EXISTS idx_orders_status;
+DROP INDEX IF EXISTS idx_orders_created_at;
+
+CREATE TABLE orders (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  order_number text NOT NULL,
+  restaurant text NOT NULL,
+  items jsonb NOT NULL DEFAULT '[]',
+  total decimal(10,2) NOT NULL DEFAULT 0.00,
+  status text NOT NULL DEFAULT 'Pending',
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz DEFAULT now(),
+  PRIMARY KEY (id, created_at),
+  UNIQUE (order_number, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE orders_default PARTITION OF orders DEFAULT;
+
+SELECT ensure_partitions(
+  'orders',
+  'month',
+  COALESCE((SELECT min(created_at)::date FROM orders_unpartitioned), current_date),
+  (current_date + interval '3 months')::date
+);
+
+INSERT INTO orders (id, user_id, order_number, restaurant, items, total, status, created_at, updated_at)
+SELECT id, user_id, order_number, restaurant, items, total, status, COALESCE(created_at, now()), updated_at
+FROM orders_unpartitioned;
+
+DROP TABLE orders_unpartitioned;
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+
+CREATE TRIGGER update_orders_updated_at
+    BEFORE UPDATE ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE orders ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own orders"
+  ON orders
+  FOR SELECT
+  TO authenticated
+  USING (user_id = auth.uid());
+
+CREATE POLICY "Users can create orders"
+  ON orders
+  FOR INSERT
+  TO authenticated
+  WITH CHECK (user_id = auth.uid());
+
+CREATE POLICY "Users can update own orders"
+  ON orders
+  FOR UPDATE
+  TO authenticated
+  USING (user_id = auth.uid());
+
+-- Bills ---------------------------------------------------------------------
+
+ALTER TABLE bills RENAME TO bills_unpartitioned;
+ALTER INDEX bills_pkey RENAME TO bills_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_bills_user_id;
+DROP INDEX IF EXISTS idx_bills_status;
+DROP INDEX IF EXISTS idx_bills_due_date;
+
+CREATE TABLE bills (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  month text NOT NULL,
+  amount decimal(10,2) NOT NULL DEFAULT 0.00,
+  status text NOT NULL DEFAULT 'Pending',
+  due_date date NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now(),
+  PRIMARY KEY (id, due_date)
+) PARTITION BY RANGE (due_date);
+
+CREATE TABLE bills_default PARTITION OF bills DEFAULT;
+
+SELECT ensure_partitions(
+  'bills',
+  'year',
+  COALESCE((SELECT min(due_date) FROM bills_unpartitioned), current_date),
+  (current_date + interval '15 months')::date
+);
+
+INSERT INTO bills (id, user_id, month, amount, status, due_date, created_at, updated_at)
+SELECT id, user_id, month, amount, status, due_date, created_at, updated_at
+FROM bills_unpartitioned;
+
+DROP TABLE bills_unpartitioned;
+
+CREATE INDEX IF NOT EXISTS idx_bills_user_id ON bills(user_id);
+CREATE INDEX IF NOT EXISTS idx_bills_status ON bills(status);
+CREATE INDEX IF NOT EXISTS idx_bills_due_date ON bills(due_date);
+
+CREATE TRIGGER update_bills_updated_at
+    BEFORE UPDATE ON bills
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE bills ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own bills"
+  ON bills
+  FOR SELECT
+  TO authenticated
+  USING (user_id = auth.uid());
+
+CREATE POLICY "Users can update own bills"
+  ON bills
+  FOR UPDATE
+  TO authenticated
+  USING (user_id = auth.uid());
+
+-- Schedule partition maintenance where pg_cron is available -----------------
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('maintain-partitions', '15 3 * * *', 'SELECT maintain_partitions()');
+  END IF;
+END;
+$$;
@@ -0,0 +1,32 @@
+/*
+  # Composite covering indexes for order and bill history
+
+  1. New Indexes
+    - `idx_orders_user_created` on orders (user_id, created_at DESC, id DESC)
+      INCLUDE (order_number, restaurant, total, status)
+      Serves `WHERE user_id = ? ORDER BY created_at DESC` and the keyset pages without a sort,
+      and lets the per-user order count/total run as an index-only scan
+    - `idx_bills_user_due` on bills (user_id, due_date DESC, id DESC)
+      INCLUDE (month, amount, status)
+
+  2. Dropped Indexes
+    - `idx_orders_user_id`, `idx_bills_user_id`: prefixes of the composite indexes
+    - `idx_users_username`, `idx_users_email`: duplicate the UNIQUE constraint indexes
+    - `idx_orders_order_number`: duplicates the UNIQUE constraint index on order_number
+
+  `items` is deliberately not included: jsonb arrays can exceed the btree tuple size limit.
+*/
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_created
+  ON orders (user_id, created_at DESC, id DESC)
+  INCLUDE (order_number, restaurant, total, status);
+
+CREATE INDEX IF NOT EXISTS idx_bills_user_due
+  ON bills (user_id, due_date DESC, id DESC)
+  INCLUDE (month, amount, status);
+
+DROP INDEX IF EXISTS idx_orders_user_id;
+DROP INDEX IF EXISTS idx_bills_user_id;
+DROP INDEX IF EXISTS idx_users_username;
+DROP INDEX IF EXISTS idx_users_email;
+DROP INDEX IF EXISTS idx_orders_order_number;
@@ -0,0 +1,26 @@
+/*
+  # Trigram search over order restaurants and items
+
+  1. Extensions
+    - `pg_trgm`
+
+  2. Functions
+    - `order_search_text(restaurant, items)`: lower-cased restaurant name followed by the
+      `items` JSON array as text. IMMUTABLE so it can be indexed; queries must call it
+      with the same arguments to use the index
+
+  3. New Indexes
+    - `idx_orders_search_trgm`: GIN (gin_trgm_ops) on `order_search_text(restaurant, items)`.
+      Serves substring `LIKE '%...%'` and fuzzy word-similarity (`<%`) matches; the planner
+      combines it with `idx_orders_user_created` for per-user searches
+*/
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION order_search_text(restaurant text, items jsonb)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT lower(coalesce(restaurant, '') || ' ' || coalesce(items::text, '')) $$;
+
+CREATE INDEX IF NOT EXISTS idx_orders_search_trgm
+  ON orders USING gin (order_search_text(restaurant, items) gin_trgm_ops);
@@ -0,0 +1,34 @@
+/*
+  # Push order status changes with NOTIFY
+
+  1. Functions
+    - `notify_order_status()`: trigger function that sends
+      `{"user_id", "order_number", "status"}` as JSON on the `order_status` channel
+
+  2. Triggers
+    - `orders_status_notify`: AFTER UPDATE OF status on orders, only when the status
+      actually changed. Notifications are delivered at commit, so listeners never see
+      rolled-back changes
+*/
+
+CREATE OR REPLACE FUNCTION notify_order_status()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM pg_notify('order_status', json_build_object(
+    'user_id', NEW.user_id,
+    'order_number', NEW.order_number,
+    'status', NEW.status
+  )::text);
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS orders_status_notify ON orders;
+
+CREATE TRIGGER orders_status_notify
+  AFTER UPDATE OF status ON orders
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION notify_order_status();
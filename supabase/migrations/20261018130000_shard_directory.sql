@@ -0,0 +1,35 @@
+/*
+  # Shard directory
+
+  Applied to every shard, but only used on the first one (the directory shard) when
+  `DB_SHARDS` is set. Each user lives on the shard that owns their slot, where
+  slot = crc32(user id bytes) % 256 (see `utils/sharding.py`).
+
+  1. New Tables
+    - `user_directory`: every user's id, username, email and slot. Keeps usernames and
+      emails unique across shards and resolves a username to its shard
+    - `shard_slots`: which shard owns each slot; `moving` is set by
+      `rebalance_shards.py` while a slot's users are copied, and blocks writes to them
+
+  2. Security
+    - RLS enabled with no policies: only the table owner (the app) can read them
+*/
+
+CREATE TABLE IF NOT EXISTS user_directory (
+  user_id uuid PRIMARY KEY,
+  username text UNIQUE NOT NULL,
+  email text UNIQUE NOT NULL,
+  slot smallint NOT NULL,
+  created_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_directory_slot ON user_directory (slot);
+
+CREATE TABLE IF NOT EXISTS shard_slots (
+  slot smallint PRIMARY KEY,
+  shard smallint NOT NULL,
+  moving boolean NOT NULL DEFAULT false
+);
+
+ALTER TABLE user_directory ENABLE ROW LEVEL SECURITY;
+ALTER TABLE shard_slots ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,25 @@
+/*
+  # App sessions
+
+  Signed-in sessions, kept here when `SESSION_PERSIST` is set so they survive app
+  restarts and are shared by every app process (see `utils/sessions.py`). With
+  `DB_SHARDS` set, only the first (directory) shard is used.
+
+  1. New Tables
+    - `app_sessions`: one row per session; `token_hash` is the SHA-256 of the session
+      id, so the table alone can't be used to sign in
+
+  2. Security
+    - RLS enabled with no policies: only the table owner (the app) can read it
+*/
+
+CREATE TABLE IF NOT EXISTS app_sessions (
+  token_hash text PRIMARY KEY,
+  username text NOT NULL,
+  created_at timestamptz DEFAULT now(),
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_app_sessions_expires_at ON app_sessions (expires_at);
+
+ALTER TABLE app_sessions ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,136 @@
+/*
+  # Order number registry
+
+  Partitioning `orders` (20261018090000) narrowed `order_number` uniqueness to
+  UNIQUE (order_number, created_at). This restores it across all partitions.
+
+  1. New Tables
+    - `order_numbers`: one row per order number ever used, with the order that holds it.
+      Order numbers are not released when an order is deleted
+
+  2. Triggers
+    - `claim_order_number` (BEFORE INSERT on `orders`) records the new row's order number
+      and rejects a number held by another order with a unique_violation. Bulk loads that
+      set `app.skip_duplicate_order_numbers = on` (transaction-local) skip those rows instead,
+      so `INSERT ... RETURNING` reports only the rows that went in. Re-inserting the same
+      order id (a shard rebalance, a row moving between partitions) is allowed
+    - Existing orders are backfilled; if duplicates already exist, the oldest order keeps
+      the number
+
+  3. Partition maintenance
+    - `ensure_partitions` now moves rows that landed in the DEFAULT partition into a
+      partition it creates for their range, instead of failing
+*/
+
+CREATE TABLE IF NOT EXISTS order_numbers (
+  order_number text PRIMARY KEY,
+  order_id uuid NOT NULL,
+  created_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE order_numbers ENABLE ROW LEVEL SECURITY;
+
+INSERT INTO order_numbers (order_number, order_id)
+SELECT DISTINCT ON (order_number) order_number, id
+FROM orders
+ORDER BY order_number, created_at
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION claim_order_number()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO order_numbers (order_number, order_id)
+  VALUES (NEW.order_number, NEW.id)
+  ON CONFLICT DO NOTHING;
+
+  IF NOT FOUND AND NOT EXISTS (
+    SELECT 1 FROM order_numbers WHERE order_number = NEW.order_number AND order_id = NEW.id
+  ) THEN
+    IF current_setting('app.skip_duplicate_order_numbers', true) = 'on' THEN
+      RETURN NULL;
+    END IF;
+    RAISE EXCEPTION 'order_number % already exists', NEW.order_number
+      USING ERRCODE = 'unique_violation';
+  END IF;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS claim_order_number ON orders;
+CREATE TRIGGER claim_order_number
+    BEFORE INSERT ON orders
+    FOR EACH ROW
+    EXECUTE FUNCTION claim_order_number();
+
+-- Partition maintenance -------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION ensure_partitions(
+  parent text,
+  step text,
+  from_date date,
+  to_date date
+) RETURNS integer AS $$
+DECLARE
+  lower_bound date := date_trunc(step, from_date)::date;
+  upper_bound date;
+  partition_name text;
+  default_partition text;
+  partition_key text;
+  stranded boolean;
+  created integer := 0;
+BEGIN
+  IF step NOT IN ('month', 'year') THEN
+    RAISE EXCEPTION 'Unsupported partition step: %', step;
+  END IF;
+
+  SELECT d.relname, a.attname
+  INTO default_partition, partition_key
+  FROM pg_partitioned_table p
+  JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+  LEFT JOIN pg_class d ON d.oid = p.partdefid
+  WHERE p.partrelid = parent::regclass;
+
+  WHILE lower_bound <= to_date LOOP
+    upper_bound := (lower_bound + ('1 ' || step)::interval)::date;
+    partition_name := parent || '_p' || to_char(lower_bound, CASE step WHEN 'month' THEN 'YYYYMM' ELSE 'YYYY' END);
+
+    IF to_regclass(partition_name) IS NULL THEN
+      stranded := false;
+      IF default_partition IS NOT NULL THEN
+        EXECUTE format(
+          'SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+          default_partition, partition_key, lower_bound, partition_key, upper_bound
+        ) INTO stranded;
+      END IF;
+
+      IF stranded THEN
+        -- Rows for this range sit in the DEFAULT partition (maintenance lapsed): move them
+        -- into a standalone table, then attach it, since a new partition can't overlap them
+        EXECUTE format(
+          'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+          partition_name, parent
+        );
+        EXECUTE format(
+          'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+          default_partition, partition_key, lower_bound, partition_key, upper_bound, partition_name
+        );
+        EXECUTE format(
+          'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+          parent, partition_name, lower_bound, upper_bound
+        );
+      ELSE
+        EXECUTE format(
+          'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+          partition_name, parent, lower_bound, upper_bound
+        );
+      END IF;
+      created := created + 1;
+    END IF;
+
+    lower_bound := upper_bound;
+  END LOOP;
+
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,21 @@
+/*
+  # App settings
+
+  Values every app process must agree on, written once by whichever process gets there
+  first. With `DB_SHARDS` set, only the first (directory) shard is used.
+
+  1. New Tables
+    - `app_settings`: `name` → `value`. Holds `bcrypt_rounds`, the bcrypt cost calibrated by
+      the first app process (see `utils/passwords.py`); delete that row to recalibrate
+
+  2. Security
+    - RLS enabled with no policies: only the table owner (the app) can read it
+*/
+
+CREATE TABLE IF NOT EXISTS app_settings (
+  name text PRIMARY KEY,
+  value text NOT NULL,
+  updated_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE app_settings ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,52 @@
+"""Shared fixtures: the repository on ``sys.path``, fast test settings and an optional PostgreSQL."""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before config is imported: cheap bcrypt, no LISTEN/NOTIFY thread
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('ORDER_EVENTS_ENABLED', 'false')
+
+import psycopg2  # noqa: E402
+
+from config import DATABASE_CONFIG  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def postgres():
+    """Connection parameters of the ``DB_*`` database; tests using it are skipped when it is unreachable."""
+    params = {**DATABASE_CONFIG, 'connect_timeout': 2}
+    try:
+        psycopg2.connect(**params).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+    return params
+
+
+class FakeClock:
+    """Stands in for the ``time`` module of the code under test, moved forward by hand."""
+
+    def __init__(self):
+        # Starts at the wall-clock time, so rows it stamps are live to PostgreSQL too
+        self.now = time.time()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,34 @@
+"""BloomFilter: no false negatives and a false-positive rate near the one it was sized for."""
+from utils.bloom import BloomFilter
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f"user_{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert bloom.stats()['items'] == 1000
+
+
+def test_false_positive_rate_within_capacity():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"user_{i}")
+    false_positives = sum(f"other_{i}" in bloom for i in range(10000))
+    assert false_positives < 10000 * 0.01 * 2
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(100)
+    assert "anyone" not in bloom
+    assert "" not in bloom
+
+
+def test_sized_from_capacity_and_error_rate():
+    # ~9.6 bits and 7 hashes per item for a 1% error rate
+    bloom = BloomFilter(1000, 0.01)
+    assert bloom.size == 9586
+    assert bloom.hashes == 7
+    assert bloom.stats()['bytes'] == 1199
+    assert BloomFilter(0).capacity == 1
@@ -0,0 +1,224 @@
+"""TTLCache and CachedStorage: hits, expiry, eviction, single-flight and tag invalidation."""
+import threading
+
+import pytest
+
+import utils.cache
+from utils.cache import TTLCache
+from utils.sqlite_database import SqliteDatabaseManager
+from utils.storage import CachedStorage
+
+
+class BlockingLoader:
+    """Loader that counts its calls and holds every call until ``release()``."""
+
+    def __init__(self, value='value'):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self._release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self._release.wait(5)
+        return f"{self.value}{self.calls}"
+
+    def release(self):
+        self._release.set()
+
+
+def spawn(cache, key, loader, tags=lambda value: ()):
+    """Call ``get_or_load`` in a thread; returns the thread and a dict receiving its result."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', cache.get_or_load(key, loader, tags)))
+    thread.start()
+    return thread, result
+
+
+def wait_for_waiters(cache, coalesced):
+    """Wait until ``coalesced`` callers have joined an in-flight load."""
+    for _ in range(500):
+        if cache.stats()['coalesced'] >= coalesced:
+            return
+        threading.Event().wait(0.01)
+    pytest.fail("callers never joined the in-flight load")
+
+
+def test_hit_after_load():
+    cache = TTLCache(10, 60)
+    assert cache.get_or_load('k', lambda: 1) == 1
+    assert cache.get_or_load('k', lambda: 2) == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_uncacheable_values_are_not_stored():
+    cache = TTLCache(10, 60)
+    assert cache.get_or_load('k', lambda: None) is None
+    assert cache.get_or_load('k', lambda: 1) == 1
+
+
+def test_entries_expire(monkeypatch, clock):
+    monkeypatch.setattr(utils.cache, 'time', clock)
+    cache = TTLCache(10, 30)
+    cache.get_or_load('k', lambda: 1)
+    clock.advance(29)
+    assert cache.get_or_load('k', lambda: 2) == 1
+    clock.advance(1)
+    assert cache.get_or_load('k', lambda: 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(2, 60)
+    cache.get_or_load('a', lambda: 1)
+    cache.get_or_load('b', lambda: 2)
+    cache.get_or_load('a', lambda: None)  # 'a' is now the most recently used
+    cache.get_or_load('c', lambda: 3)
+    assert cache.get_or_load('a', lambda: 'reloaded') == 1
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_disabled_cache_always_loads():
+    cache = TTLCache(0, 60)
+    assert cache.get_or_load('k', lambda: 1) == 1
+    assert cache.get_or_load('k', lambda: 2) == 2
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache(10, 60)
+    loader = BlockingLoader()
+    leader, first = spawn(cache, 'k', loader)
+    assert loader.started.wait(5)
+    waiters = [spawn(cache, 'k', loader) for _ in range(5)]
+    wait_for_waiters(cache, 5)
+    loader.release()
+    for thread, _ in [(leader, first)] + waiters:
+        thread.join(5)
+
+    assert loader.calls == 1
+    assert {result['value'] for _, result in waiters} == {first['value']}
+    assert cache.get_or_load('k', loader) == first['value']
+
+
+def test_load_error_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache(10, 60)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("database down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load('k', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(5)
+    threads += [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_waiters(cache, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4
+    assert cache.stats()['load_errors'] == 1
+    assert cache.get_or_load('k', lambda: 'recovered') == 'recovered'
+
+
+def test_invalidate_drops_entries_by_tag():
+    cache = TTLCache(10, 60)
+    cache.get_or_load('profile', lambda: 'p', lambda value: ('42', 'alice'))
+    cache.get_or_load('orders', lambda: 'o', lambda value: ('42',))
+    cache.get_or_load('other', lambda: 'x', lambda value: ('7',))
+
+    assert cache.invalidate('42') == 2
+    assert cache.get_or_load('profile', lambda: 'p2') == 'p2'
+    assert cache.get_or_load('orders', lambda: 'o2') == 'o2'
+    assert cache.get_or_load('other', lambda: 'x2') == 'x'
+
+
+def test_invalidation_during_a_load_keeps_its_result_out_of_the_cache():
+    cache = TTLCache(10, 60)
+    loader = BlockingLoader('old')
+    leader, before = spawn(cache, 'k', loader, lambda value: ('42',))
+    assert loader.started.wait(5)
+    cache.invalidate('42')
+    # Joins the load that began before the write, so has to load again
+    late, after = spawn(cache, 'k', loader, lambda value: ('42',))
+    wait_for_waiters(cache, 1)
+    loader.release()
+    leader.join(5)
+    late.join(5)
+
+    assert before['value'] == 'old1'
+    assert after['value'] == 'old2'
+    assert loader.calls == 2
+    assert cache.get_or_load('k', loader) == 'old2'
+
+
+def test_invalidation_of_another_tag_leaves_a_load_alone():
+    cache = TTLCache(10, 60)
+    loader = BlockingLoader()
+    leader, first = spawn(cache, 'k', loader, lambda value: ('42',))
+    assert loader.started.wait(5)
+    cache.invalidate('7')
+    joined, second = spawn(cache, 'k', loader, lambda value: ('42',))
+    wait_for_waiters(cache, 1)
+    loader.release()
+    leader.join(5)
+    joined.join(5)
+
+    assert loader.calls == 1
+    assert second['value'] == first['value']
+    assert cache.get_or_load('k', lambda: 'reloaded') == first['value']
+
+
+def test_clear_during_a_load_keeps_its_result_out_of_the_cache():
+    cache = TTLCache(10, 60)
+    loader = BlockingLoader()
+    leader, _ = spawn(cache, 'k', loader)
+    assert loader.started.wait(5)
+    cache.clear()
+    loader.release()
+    leader.join(5)
+
+    assert cache.get_or_load('k', lambda: 'reloaded') == 'reloaded'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    backend = SqliteDatabaseManager(str(tmp_path / 'test.db'))
+    assert backend.create_user('alice', 'alice@example.com', 'password123', 'Alice')
+    return CachedStorage(backend, TTLCache(100, 60))
+
+
+def test_cached_storage_serves_repeat_reads_from_the_cache(storage):
+    first = storage.get_user_profile('alice')
+    storage.backend.execute_query("UPDATE users SET name = 'Renamed' WHERE username = 'alice'")
+
+    assert storage.get_user_profile('alice') is first
+    assert storage.cache.stats()['hits'] == 1
+
+
+def test_cached_storage_writes_drop_the_users_entries(storage):
+    user = storage.get_user_profile('alice')
+    assert user.subscription == 'Basic'
+    orders = storage.get_user_orders(user.id)
+
+    assert storage.update_user_subscription(user.id, 'Premium')
+    assert storage.get_user_profile('alice').subscription == 'Premium'
+
+    assert storage.create_order(user.id, {'order_number': 'ORD-1', 'restaurant': 'Pizza Palace',
+                                          'items': ['Margherita Pizza'], 'total': 250})
+    assert len(storage.get_user_orders(user.id)) == len(orders) + 1
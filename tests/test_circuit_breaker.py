@@ -0,0 +1,74 @@
+"""CircuitBreaker state transitions: closed, open, half-open and back."""
+import pytest
+
+import utils.circuit_breaker
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(utils.circuit_breaker, 'time', clock)
+    return CircuitBreaker('test database', failure_threshold=3, reset_timeout=15)
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.stats()['times_opened'] == 1
+
+
+def test_success_resets_the_failure_count(breaker):
+    fail(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+
+def test_open_half_open_closed(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(14)
+    assert breaker.state == OPEN
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+    breaker.before_call()  # the trial call
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_another_timeout(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(15)
+    fail(breaker)  # the trial call fails
+    assert breaker.state == OPEN
+    clock.advance(14)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_released_trial_lets_another_call_try(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(15)
+    breaker.before_call()
+    breaker.release()  # never reached the database (e.g. pool timeout)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
@@ -0,0 +1,110 @@
+"""PasswordHasher cost selection and rehashing, and the TokenBucketThrottle."""
+import bcrypt
+import pytest
+
+import utils.passwords
+from utils.passwords import PasswordHasher, ROUNDS_SETTING, TokenBucketThrottle, calibrate_rounds
+from utils.sqlite_database import SqliteDatabaseManager
+
+
+def bcrypt_hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return SqliteDatabaseManager(str(tmp_path / 'test.db'))
+
+
+def hasher(**kwargs) -> PasswordHasher:
+    return PasswordHasher(workers=1, max_queue=4, wait_seconds=10, **kwargs)
+
+
+def test_calibration_stays_within_bounds():
+    assert calibrate_rounds(target_ms=0, min_rounds=4, max_rounds=6)[0] == 4
+    assert calibrate_rounds(target_ms=10 ** 9, min_rounds=4, max_rounds=6)[0] == 6
+
+
+def test_configured_rounds_skip_calibration(settings):
+    passwords = hasher(rounds=5)
+    passwords.settings = settings
+    assert passwords.rounds == 5
+    assert settings.get_setting(ROUNDS_SETTING) is None
+
+
+def test_first_calibration_is_stored_and_shared(settings):
+    first, second = hasher(min_rounds=4, max_rounds=5), hasher(min_rounds=4, max_rounds=5)
+    first.settings = second.settings = settings
+
+    rounds = first.rounds
+    assert settings.get_setting(ROUNDS_SETTING) == str(rounds)
+    assert second.rounds == rounds
+    assert second.stats()['calibrated_hash_ms'] is None  # read, not calibrated
+
+
+def test_stored_rounds_win_over_calibration(settings):
+    settings.claim_setting(ROUNDS_SETTING, '7')
+    passwords = hasher(min_rounds=4, max_rounds=5)
+    passwords.settings = settings
+    assert passwords.rounds == 7
+
+
+def test_hash_and_verify():
+    passwords = hasher(rounds=4)
+    hashed = passwords.hash('secret')
+    assert passwords.verify('secret', hashed)
+    assert not passwords.verify('wrong', hashed)
+    assert not passwords.verify('secret', 'not a hash')
+
+
+def test_only_weaker_hashes_need_rehashing():
+    passwords = hasher(rounds=5)
+    assert passwords.needs_rehash(bcrypt_hash('secret', 4))
+    assert not passwords.needs_rehash(bcrypt_hash('secret', 5))
+    assert not passwords.needs_rehash(bcrypt_hash('secret', 6))
+    # Legacy unsalted SHA-256
+    assert passwords.needs_rehash('2bb80d537b1da3e38bd30361aa855686bde0eacd7162fef6a25fe97bf527a25b')
+
+
+@pytest.fixture
+def throttle(monkeypatch, clock):
+    monkeypatch.setattr(utils.passwords, 'time', clock)
+    return TokenBucketThrottle()
+
+
+def test_throttle_allows_a_burst_then_refills(throttle, clock):
+    limits = {('ip', '10.0.0.1'): (3, 6)}  # burst of 3, a token every 10 seconds
+    assert [throttle.acquire(limits) for _ in range(3)] == [0, 0, 0]
+    assert throttle.acquire(limits) == pytest.approx(10)
+
+    clock.advance(5)
+    assert throttle.acquire(limits) == pytest.approx(5)
+    clock.advance(5)
+    assert throttle.acquire(limits) == 0
+    assert throttle.acquire(limits) == pytest.approx(10)
+
+
+def test_throttle_refills_no_further_than_the_burst(throttle, clock):
+    limits = {('ip', '10.0.0.1'): (2, 60)}
+    throttle.acquire(limits)
+    clock.advance(3600)
+    assert [throttle.acquire(limits) for _ in range(3)] == [0, 0, pytest.approx(1)]
+
+
+def test_throttle_takes_from_every_bucket_or_none(throttle):
+    ip, user = ('ip', '10.0.0.1'), ('user', 'alice')
+    assert throttle.acquire({ip: (5, 60), user: (1, 60)}) == 0
+    # The user bucket is empty, so the IP bucket is left alone
+    assert throttle.acquire({ip: (5, 60), user: (1, 60)}) == pytest.approx(1)
+    assert [throttle.acquire({ip: (5, 60)}) for _ in range(4)] == [0, 0, 0, 0]
+    assert throttle.stats()['throttled'] == 1
+
+
+def test_throttle_keeps_only_recent_keys(clock, monkeypatch):
+    monkeypatch.setattr(utils.passwords, 'time', clock)
+    throttle = TokenBucketThrottle(max_keys=2)
+    for ip in ('a', 'b', 'c'):
+        throttle.acquire({('ip', ip): (1, 1)})
+    assert throttle.stats()['tracked_keys'] == 2
+    # 'a' was forgotten, so it starts again with a full bucket
+    assert throttle.acquire({('ip', 'a'): (1, 1)}) == 0
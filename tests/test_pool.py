@@ -0,0 +1,126 @@
+"""ConnectionPool against a real PostgreSQL: checkout, reuse, limits, validation and cleanup."""
+import threading
+
+import psycopg2
+import pytest
+
+import utils.pool
+from utils.pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def make_pool(postgres):
+    pools = []
+
+    def make(**kwargs):
+        pool = ConnectionPool(postgres, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.closeall()
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool({}, minconn=2, maxconn=1)
+    with pytest.raises(ValueError):
+        ConnectionPool({}, minconn=0, maxconn=0)
+
+
+def test_connection_is_reused(make_pool):
+    pool = make_pool(maxconn=2)
+    with pool.connection() as conn:
+        first = conn
+    with pool.connection() as conn:
+        assert conn is first
+    stats = pool.stats()
+    assert stats['connections_created'] == 1
+    assert stats['checkouts'] == 2
+    assert stats['in_use'] == 0 and stats['idle'] == 1
+
+
+def test_checkout_times_out_when_exhausted(make_pool):
+    pool = make_pool(maxconn=1, timeout=0.1)
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()['checkout_timeouts'] == 1
+    pool.putconn(conn)
+    pool.putconn(pool.getconn())
+
+
+def test_waiter_gets_a_returned_connection(make_pool):
+    pool = make_pool(maxconn=1, timeout=5)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    for _ in range(500):
+        if pool.stats()['waiting']:
+            break
+        threading.Event().wait(0.01)
+    pool.putconn(conn)
+    waiter.join(5)
+    assert got == [conn]
+    pool.putconn(conn)
+
+
+def test_open_transaction_is_rolled_back_on_return(make_pool):
+    pool = make_pool(maxconn=1)
+    conn = pool.getconn()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    assert conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    pool.putconn(conn)
+    assert conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def test_broken_connection_is_discarded(make_pool):
+    pool = make_pool(maxconn=1)
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            raise psycopg2.OperationalError("connection lost")
+    assert conn.closed
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert pool.stats()['connections_discarded'] == 1
+
+
+def test_dead_idle_connection_is_replaced(make_pool):
+    pool = make_pool(maxconn=1, validate_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    with psycopg2.connect(**pool.connection_params) as admin, admin.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s)", (conn.get_backend_pid(),))
+    admin.close()
+
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        with fresh.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    assert pool.stats()['validation_failures'] == 1
+
+
+def test_surplus_idle_connections_are_closed(make_pool, monkeypatch, clock):
+    monkeypatch.setattr(utils.pool, 'time', clock)
+    pool = make_pool(minconn=1, maxconn=3, max_idle=60)
+    first, second, third = (pool.getconn() for _ in range(3))
+    pool.putconn(first)
+    pool.putconn(second)
+    clock.advance(61)
+    pool.putconn(third)  # returns prune the idle list
+
+    assert pool.stats()['idle'] == 2
+    assert not first.closed  # kept: minconn
+    assert second.closed
+    assert not third.closed  # just used
+
+
+def test_closed_pool_refuses_checkouts(make_pool):
+    pool = make_pool()
+    pool.putconn(pool.getconn())
+    pool.closeall()
+    with pytest.raises(psycopg2.pool.PoolError):
+        pool.getconn()
@@ -0,0 +1,120 @@
+"""SessionStore: token signing, expiry, revalidation and revocation across stores."""
+import psycopg2
+import pytest
+
+import utils.sessions
+from utils.circuit_breaker import CircuitOpenError
+from utils.database import DatabaseManager
+from utils.sessions import SessionStore
+
+SECRET = b'test-secret'
+
+
+class RecordingDatabase:
+    """``execute_query`` provider that records calls and fails like a database that is down."""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute_query(self, query, params=None, fetch=False, tuples=False):
+        self.queries.append(query)
+        raise CircuitOpenError("database is unavailable")
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(utils.sessions, 'time', clock)
+
+
+def test_token_resumes_its_session():
+    store = SessionStore(60, SECRET)
+    session = store.get(store.create('alice'))
+    assert session.username == 'alice'
+
+
+@pytest.mark.parametrize('tamper', [
+    lambda token: token[:-1] + ('0' if token[-1] != '0' else '1'),  # signature changed
+    lambda token: 'x' + token,  # session id changed
+    lambda token: token.partition('.')[0],  # no signature
+    lambda token: '',
+])
+def test_bad_signature_is_rejected_without_a_lookup(tamper):
+    database = RecordingDatabase()
+    store = SessionStore(60, SECRET, database)
+    token = store.create('alice')
+    database.queries.clear()
+
+    assert store.get(tamper(token)) is None
+    assert store.get(None) is None
+    assert database.queries == []
+
+
+def test_token_from_another_secret_is_rejected():
+    token = SessionStore(60, b'other-secret').create('alice')
+    assert SessionStore(60, SECRET).get(token) is None
+
+
+def test_session_expires_after_timeout(clock):
+    store = SessionStore(60, SECRET)
+    token = store.create('alice')
+    clock.advance(59)
+    assert store.get(token) is not None
+    clock.advance(1)
+    assert store.get(token) is None
+
+
+def test_revoked_session_is_gone():
+    store = SessionStore(60, SECRET)
+    token = store.create('alice')
+    store.revoke(token)
+    assert store.get(token) is None
+
+
+def test_oldest_sessions_make_room_for_new_ones():
+    store = SessionStore(60, SECRET, max_sessions=2)
+    first, second, third = (store.create(name) for name in ('a', 'b', 'c'))
+    assert store.get(first) is None
+    assert store.get(second).username == 'b'
+    assert store.get(third).username == 'c'
+
+
+def test_session_not_persisted_is_kept_without_revalidation(clock):
+    database = RecordingDatabase()
+    store = SessionStore(60, SECRET, database)
+    token = store.create('alice')
+    database.queries.clear()
+    clock.advance(utils.sessions._REVALIDATE_SECONDS)
+
+    assert store.get(token).username == 'alice'
+    assert database.queries == []
+
+
+@pytest.fixture
+def database(postgres):
+    """A ``DatabaseManager`` on the test database, with ``app_sessions`` emptied of this test's rows."""
+    with psycopg2.connect(**postgres) as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('app_sessions')")
+        if cursor.fetchone()[0] is None:
+            pytest.skip("app_sessions is missing: run python migrate.py")
+    manager = DatabaseManager()
+    yield manager
+    manager.execute_query("DELETE FROM app_sessions WHERE username LIKE 'pytest_%%'")
+
+
+def test_persisted_session_resumes_in_another_store(database):
+    token = SessionStore(60, SECRET, database).create('pytest_alice')
+    session = SessionStore(60, SECRET, database).get(token)
+    assert session.username == 'pytest_alice'
+    assert session.user is None
+
+
+def test_revocation_reaches_a_second_store(database, clock):
+    first, second = SessionStore(60, SECRET, database), SessionStore(60, SECRET, database)
+    token = first.create('pytest_alice')
+    assert second.get(token) is not None
+
+    second.revoke(token)
+    # Held in the first store's memory until it re-checks the row
+    assert first.get(token) is not None
+    clock.advance(utils.sessions._REVALIDATE_SECONDS)
+    assert first.get(token) is None
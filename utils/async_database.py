@@ -0,0 +1,287 @@
+"""PostgreSQL backend running its per-session queries on asyncpg, on a shared background event loop."""
+#async_database.py
+import asyncio
+import functools
+import itertools
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import asyncpg
+import streamlit as st
+
+from config import DB_POOL_CONFIG, DB_STATEMENT_TIMEOUT_MS, REPLICA_RETRY_SECONDS
+from utils.circuit_breaker import CircuitOpenError
+from utils.database import DatabaseManager
+from utils.models import Bill, Order, OrderStats, User
+from utils.pool import ConnectionPool
+
+# The server (not the statement) failed: counted against the circuit breaker, like
+# psycopg2's OperationalError/InterfaceError and statement timeouts (TimeoutError is an OSError)
+SERVER_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.ConnectionDoesNotExistError,
+                 asyncpg.QueryCanceledError)
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+
+
+@functools.lru_cache(maxsize=256)
+def to_asyncpg(query: str) -> str:
+    """Rewrite a psycopg2 query (``%s`` parameters, ``%%`` for ``%``) with asyncpg's ``$n`` parameters."""
+    numbers = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda match: f"${next(numbers)}" if match.group(1) == 's' else '%', query)
+
+
+class BackgroundLoop:
+    """A single asyncio event loop running in a daemon thread.
+
+    Streamlit runs each session's script in its own thread; all of them hand
+    coroutines to this one loop, so a single loop (and one asyncpg pool per
+    database) serves every session in the process.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._loop.run_forever, name="async-db-loop", daemon=True
+                )
+                thread.start()
+            return self._loop
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run ``coro`` on the background loop and block the calling thread for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+background_loop = BackgroundLoop()
+
+
+class AsyncDatabaseManager(DatabaseManager):
+    """``DatabaseManager`` whose ``StorageBackend`` queries run on asyncpg.
+
+    The queries behind the interface methods (sign-in, profile, history
+    pages, order and plan writes, ...) run as coroutines on
+    ``background_loop`` over asyncpg pools for the primary and each replica,
+    with the same replica routing, read-your-writes pin, circuit breaker,
+    query statistics and records as ``DatabaseManager``.
+    ``get_user_profile`` fetches the user, their recent orders, recent bills
+    and order stats concurrently. Streaming exports, COPY bulk loads and raw
+    ``execute_query``/``get_connection`` calls from scripts keep using the
+    psycopg2 pools.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # asyncpg pool per psycopg2 pool it stands in for (primary, replicas), created on first use
+        self._async_pools: Dict[int, asyncpg.Pool] = {}
+        self._async_pools_lock = asyncio.Lock()
+
+    @staticmethod
+    async def _init_connection(conn) -> None:
+        """Decode JSON and UUIDs the same way psycopg2 does."""
+        for json_type in ('json', 'jsonb'):
+            await conn.set_type_codec(
+                json_type, encoder=json.dumps, decoder=json.loads, schema='pg_catalog'
+            )
+        await conn.set_type_codec(
+            'uuid', encoder=str, decoder=str, schema='pg_catalog', format='text'
+        )
+
+    async def _get_pool(self, source: ConnectionPool) -> asyncpg.Pool:
+        """The asyncpg pool for the database ``source`` (a psycopg2 pool) connects to."""
+        pool = self._async_pools.get(id(source))
+        if pool is None:
+            async with self._async_pools_lock:
+                pool = self._async_pools.get(id(source))
+                if pool is None:
+                    params = source.connection_params
+                    pool = self._async_pools[id(source)] = await asyncpg.create_pool(
+                        host=params['host'],
+                        port=int(params['port']),
+                        database=params['database'],
+                        user=params['user'],
+                        password=params['password'],
+                        timeout=params['connect_timeout'],
+                        server_settings={'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)},
+                        min_size=DB_POOL_CONFIG['minconn'],
+                        max_size=DB_POOL_CONFIG['maxconn'],
+                        max_inactive_connection_lifetime=DB_POOL_CONFIG['max_idle'],
+                        init=self._init_connection,
+                    )
+        return pool
+
+    async def _acquire(self, replicas: List[ConnectionPool]):
+        """Check out a connection from the first healthy replica in ``replicas``, else the primary."""
+        for source in replicas:
+            if self._replica_down_until.get(id(source), 0) > time.monotonic():
+                continue
+            try:
+                pool = await self._get_pool(source)
+                return source, pool, await pool.acquire(timeout=DB_POOL_CONFIG['timeout'])
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                print(f"Warning: Read replica {source.connection_params['host']} unavailable: {e}")
+                self._replica_down_until[id(source)] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+        self.breaker.before_call()
+        pool = None
+        try:
+            pool = await self._get_pool(self.pool)
+            return self.pool, pool, await pool.acquire(timeout=DB_POOL_CONFIG['timeout'])
+        except SERVER_ERRORS:
+            if pool is not None and pool.get_size() >= pool.get_max_size():
+                # Timed out waiting for a free connection: says nothing about the server's health
+                self.breaker.release()
+            else:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.release()
+            raise
+
+    async def _execute(self, query: str, params: Optional[tuple], fetch: bool,
+                       prepared: Optional[str], replicas: List[ConnectionPool]) -> Optional[List]:
+        """Run one query on a pooled connection; asyncpg caches its prepared statement per connection."""
+        started = time.perf_counter()
+        source, pool, conn = await self._acquire(replicas)
+        self.query_stats.record_acquire(f"{self._pool_label(source)} (asyncpg)", time.perf_counter() - started)
+        server_failed = False
+        started = time.perf_counter()
+        try:
+            if fetch:
+                result = await conn.fetch(to_asyncpg(query), *(params or ()))
+                rows = len(result)
+            else:
+                status = await conn.execute(to_asyncpg(query), *(params or ()))
+                result = None
+                rows = int(status.rsplit(' ', 1)[-1]) if status[-1:].isdigit() else None
+        except Exception as e:
+            server_failed = isinstance(e, SERVER_ERRORS)
+            self.query_stats.record_query(query, time.perf_counter() - started, name=prepared, error=True)
+            raise
+        finally:
+            await pool.release(conn)
+            if source is self.pool:
+                if server_failed:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+        self.query_stats.record_query(query, time.perf_counter() - started, rows=rows, name=prepared)
+        return result
+
+    def _replicas(self, read_only: bool) -> List[ConnectionPool]:
+        """Replicas a query may use, in round-robin order (none for writes or a pinned session).
+
+        Decided in the calling thread, where the session's read-your-writes pin is visible.
+        """
+        if not read_only or not self.replica_pools or self._pinned_to_primary():
+            return []
+        return [next(self._replica_cycle) for _ in self.replica_pools]
+
+    def _run(self, coro):
+        """Wait for ``coro`` on the background loop; errors are reported and return ``None``.
+
+        ``CircuitOpenError`` is raised, as ``execute_query`` does.
+        """
+        try:
+            return background_loop.run(coro)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            st.error(f"Query execution error: {e}")
+            return None
+
+    @staticmethod
+    def _rows(result: Optional[List], tuples: bool) -> Optional[List]:
+        if result is None:
+            return None
+        return [tuple(row) if tuples else dict(row) for row in result]
+
+    def _query(self, query: str, params: tuple = None, fetch: bool = False,
+               prepared: Optional[str] = None, read_only: bool = False,
+               tuples: bool = False) -> Optional[List]:
+        """``execute_query`` on asyncpg, for the ``StorageBackend`` methods."""
+        result = self._run(self._execute(query, params, fetch, prepared, self._replicas(read_only)))
+        return self._rows(result, tuples)
+
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        """Get a user with their recent orders and bills and full-history ``order_stats``.
+
+        The user, orders, bills and stats are four queries run concurrently on
+        their own pooled connections (the bills query is skipped for
+        ``bills_limit=0``), so the wait is about that of the slowest one.
+        """
+        replicas = self._replicas(read_only=True)
+        queries = [
+            ("""
+                SELECT id, username, email, name, subscription, created_at
+                FROM users
+                WHERE username = %s
+            """, (username,), 'user_by_username'),
+            ("""
+                SELECT o.order_number,
+                       COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), ''),
+                       o.restaurant,
+                       CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]'::jsonb END,
+                       COALESCE(o.total, 0)::float8,
+                       o.status
+                FROM orders o
+                WHERE o.user_id = (SELECT id FROM users WHERE username = %s)
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT %s
+            """, (username, orders_limit), 'profile_orders'),
+            ("""
+                SELECT b.month,
+                       COALESCE(b.amount, 0)::float8,
+                       b.status,
+                       COALESCE(to_char(b.due_date, 'YYYY-MM-DD'), '')
+                FROM bills b
+                WHERE b.user_id = (SELECT id FROM users WHERE username = %s)
+                ORDER BY b.due_date DESC, b.id DESC
+                LIMIT %s
+            """, (username, bills_limit), 'profile_bills') if bills_limit != 0 else None,
+            ("""
+                SELECT count(*), COALESCE(sum(o.total), 0)::float8
+                FROM orders o
+                WHERE o.user_id = (SELECT id FROM users WHERE username = %s)
+            """, (username,), 'profile_order_stats'),
+        ]
+
+        async def fetch(entry):
+            if entry is None:
+                return []
+            query, params, name = entry
+            return await self._execute(query, params, True, name, replicas)
+
+        async def fetch_all():
+            return await asyncio.gather(*map(fetch, queries))
+
+        result = self._run(fetch_all())
+        if not result or not result[0]:
+            return None
+        users, orders, bills, stats = result
+        return User.from_row(users[0])._replace(
+            orders=tuple(map(Order.from_row, orders)),
+            bills=tuple(map(Bill.from_row, bills)),
+            order_stats=OrderStats(*stats[0]),
+        )
+
+    def pool_stats(self) -> Dict:
+        """Connection counters, with the primary's asyncpg pool next to its psycopg2 pool."""
+        stats = super().pool_stats()
+        pool = self._async_pools.get(id(self.pool))
+        stats['primary']['asyncpg'] = {
+            'size': pool.get_size() if pool else 0,
+            'idle': pool.get_idle_size() if pool else 0,
+            'max': DB_POOL_CONFIG['maxconn'],
+        }
+        return stats
+
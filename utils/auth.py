@@ -1,79 +1,99 @@
 """Authentication utilities for the delivery app."""
 #auth.py
-import bcrypt
 import streamlit as st
-from typing import Dict, Optional
+import streamlit.components.v1 as components
+from typing import List, Optional, Tuple
 from utils.database import db_manager
+from utils.circuit_breaker import CircuitOpenError
+from utils.passwords import (
+    LoginRejectedError, LoginThrottledError, check_availability_attempt, check_login_attempt, password_hasher
+)
+from utils.sessions import SESSION_COOKIE, session_store
+from utils.sharding import SlotMovingError
+from utils.availability import name_availability
+from utils.storage import SIGNUP_CREATED, SIGNUP_EMAIL_TAKEN, SIGNUP_USERNAME_TAKEN
+from utils.models import Order, OrderStats, User
+from utils.order_events import OrderEvent, order_events, session_waker
 from utils.data import MOCK_USERS  # Keep for fallback
+from config import HISTORY_PAGE_SIZE, LOGIN_TRUST_FORWARDED_FOR, ORDER_EVENTS_ENABLED, SESSION_TIMEOUT
 
 
 def hash_password(password: str) -> str:
-    """Hash password using bcrypt for security."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Hash password using bcrypt (on the shared bcrypt worker pool)."""
+    return password_hasher.hash(password)
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash."""
+    """Verify password against hash (bcrypt, or the SHA-256 digests of the demo users)."""
+    return password_hasher.verify(password, hashed)
+
+
+def client_ip() -> Optional[str]:
+    """The browser's IP address, for per-client login throttling."""
+    context = getattr(st, 'context', None)
+    if LOGIN_TRUST_FORWARDED_FOR:
+        # Only behind a proxy that sets the header; otherwise clients could pick their own IP
+        forwarded = (getattr(context, 'headers', None) or {}).get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return getattr(context, 'ip_address', None)
+
+
+def check_name_available(field: str, value: str) -> Optional[bool]:
+    """Live sign-up check that ``value`` is a free ``'username'`` or ``'email'``; ``None`` if it can't be told now.
+
+    Each new value spends a check from the client IP's availability bucket,
+    so the form can't be used to enumerate accounts quickly; answers are
+    remembered for the session, so reruns don't spend more.
+    """
+    checked = st.session_state.setdefault('availability_checks', {})
+    if (field, value) in checked:
+        return checked[(field, value)]
+    is_available = name_availability.username_available if field == 'username' else name_availability.email_available
     try:
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-    except Exception:
-        # Fallback for existing SHA-256 hashes (for demo users)
-        import hashlib
-        return hashed == hashlib.sha256(password.encode()).hexdigest()
+        check_availability_attempt(client_ip())
+        available = is_available(value)
+    except (LoginThrottledError, CircuitOpenError):
+        return None
+    checked[(field, value)] = available
+    return available
+
 
+def authenticate_user(username: str, password: str) -> Optional[User]:
+    """Authenticate user credentials against database; returns the account if they match.
 
-def authenticate_user(username: str, password: str) -> bool:
-    """Authenticate user credentials against database."""
+    Raises ``LoginRejectedError`` when the client or username is out of
+    attempts, or when the bcrypt workers are too busy to check the password.
+    """
+    check_login_attempt(client_ip(), username)
     try:
-        user_data = db_manager.authenticate_user(username, password)
-        return user_data is not None
+        return db_manager.authenticate_user(username, password)
+    except LoginRejectedError:
+        raise
     except Exception:
-        # Fallback to mock data for demo users
-        if username in MOCK_USERS:
-            return verify_password(password, MOCK_USERS[username]["password"])
-        return False
+        # Database unavailable: fallback to mock data for demo users
+        if username in MOCK_USERS and verify_password(password, MOCK_USERS[username]["password"]):
+            return User.from_dict(username, MOCK_USERS[username])
+        return None
 
 
-def get_user_data(username: str) -> Dict:
-    """Get user data from database."""
+def get_user_data(username: str) -> User:
+    """Get the user's account (no order or bill history) from database."""
     try:
+        # History is loaded by the pages that show it (get_recent_orders, Past Orders, Bill Tracker)
         user_data = db_manager.get_user_by_username(username)
         if user_data:
-            # Get additional data (orders, bills)
-            user_id = user_data['id']
-            orders = db_manager.get_user_orders(user_id)
-            bills = db_manager.get_user_bills(user_id)
-            
-            # Format data to match existing structure
-            user_data['orders'] = [
-                {
-                    'id': order['order_number'],
-                    'date': order['created_at'].strftime('%Y-%m-%d') if order['created_at'] else '',
-                    'restaurant': order['restaurant'],
-                    'items': order['items'] if isinstance(order['items'], list) else [],
-                    'total': float(order['total']) if order['total'] else 0,
-                    'status': order['status']
-                }
-                for order in orders
-            ]
-            
-            user_data['bills'] = [
-                {
-                    'month': bill['month'],
-                    'amount': float(bill['amount']) if bill['amount'] else 0,
-                    'status': bill['status'],
-                    'due_date': bill['due_date'].strftime('%Y-%m-%d') if bill['due_date'] else ''
-                }
-                for bill in bills
-            ]
-            
             return user_data
+    except CircuitOpenError:
+        # Database is down: fall back straight away without an error per rerun
+        pass
     except Exception as e:
         st.error(f"Error fetching user data: {e}")
     
     # Fallback to mock data
-    return MOCK_USERS.get(username, {})
+    if username in MOCK_USERS:
+        return User.from_dict(username, MOCK_USERS[username])
+    return User(id=None, username=username, email='', name=username)
 
 
 def is_authenticated() -> bool:
@@ -81,36 +101,187 @@ def is_authenticated() -> bool:
     return st.session_state.get('authenticated', False)
 
 
-def login_user(username: str) -> None:
-    """Login user and set session state."""
+def login_user(username: str, user_data: Optional[User] = None) -> None:
+    """Login user, set session state and start a session that refreshed pages and new tabs resume.
+
+    ``user_data`` is the account ``authenticate_user`` returned, if at hand.
+    """
+    user_data = user_data or get_user_data(username)
+    token = session_store.create(username, user_data)
+    _set_session_state(username, user_data, token)
+
+
+def _set_session_state(username: str, user_data: User, token: str) -> None:
     st.session_state.authenticated = True
     st.session_state.username = username
-    st.session_state.user_data = get_user_data(username)
+    st.session_state.user_data = user_data
+    st.session_state.session_token = token
+    for key in ['order_summary', 'orders_history', 'bills_history']:
+        st.session_state.pop(key, None)
+    subscribe_order_events(user_data)
+
+
+def get_recent_orders() -> Tuple[Order, ...]:
+    """The signed-in user's most recent orders (up to ``HISTORY_PAGE_SIZE``), newest first."""
+    return _order_summary()[0]
+
+
+def get_order_stats() -> OrderStats:
+    """Order count and total spent over the signed-in user's whole history."""
+    return _order_summary()[1]
+
+
+def _order_summary() -> Tuple[Tuple[Order, ...], OrderStats]:
+    """Recent orders and order stats, loaded together (one query) on first use and kept for the session."""
+    summary = st.session_state.get('order_summary')
+    if summary is not None:
+        return summary
+
+    user_data = st.session_state.user_data
+    if not user_data.id:
+        # Mock users keep their (small) full history in memory
+        return user_data.orders, user_data.order_stats
+    try:
+        profile = db_manager.get_user_profile(user_data.username, orders_limit=HISTORY_PAGE_SIZE, bills_limit=0)
+    except CircuitOpenError:
+        # Database is down: show nothing now and load on a later run
+        return (), OrderStats()
+    if profile is None:
+        return (), OrderStats()
+    summary = st.session_state.order_summary = (profile.orders, profile.order_stats)
+    return summary
+
+
+def restore_session() -> None:
+    """Keep the browser's sign-in in step with its session token.
+
+    A refreshed page or new tab whose session cookie holds a live token is
+    signed in again from the session store, without a password check and,
+    within this process, without a user query. A signed-in session is
+    signed out once ``SESSION_TIMEOUT`` has passed or it is revoked.
+    """
+    if is_authenticated():
+        if session_store.get(st.session_state.get('session_token')) is None:
+            logout_user()
+            st.warning("⏰ Your session has expired. Please sign in again.")
+        return
+
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return
+    session = session_store.get(token)
+    if session is None:
+        # sync_session_cookie() clears the stale cookie
+        return
+    _set_session_state(session.username, session.user or get_user_data(session.username), token)
+
+
+def sync_session_cookie() -> None:
+    """Write the session token to the browser's cookie after sign-in, and clear it after sign-out.
+
+    Streamlit can't set response headers, so a script in a zero-height
+    component writes the cookie: it can't be HttpOnly, but it is
+    ``SameSite=Strict``, ``Secure`` over HTTPS, and never part of a URL.
+    """
+    token = st.session_state.get('session_token') or ''
+    # Cookies are read once per connection; keep the script rendered once this run has changed them
+    if token == st.context.cookies.get(SESSION_COOKIE, '') and not st.session_state.get('session_cookie_written'):
+        return
+    st.session_state.session_cookie_written = True
+    max_age = SESSION_TIMEOUT if token else 0
+    components.html(f"""
+        <script>
+        const secure = parent.location.protocol === 'https:' ? '; Secure' : '';
+        parent.document.cookie = '{SESSION_COOKIE}={token}; Path=/; Max-Age={max_age}; SameSite=Strict' + secure;
+        </script>
+    """, height=0)
 
 
 def logout_user() -> None:
-    """Logout user and clear session state."""
-    for key in ['authenticated', 'username', 'user_data', 'chat_history']:
+    """Logout user, end their session and clear session state."""
+    session_store.revoke(st.session_state.get('session_token'))
+    if 'order_mailbox' in st.session_state:
+        order_events.unsubscribe(st.session_state.order_mailbox)
+    for key in ['authenticated', 'username', 'user_data', 'chat_history', 'order_summary', 'orders_history',
+                'bills_history', 'order_mailbox', 'session_token']:
         if key in st.session_state:
             del st.session_state[key]
 
 
-def create_user(username: str, email: str, password: str, name: str) -> bool:
-    """Create new user account in database."""
+def subscribe_order_events(user_data: User) -> None:
+    """Have order status changes for this user pushed to the session."""
+    if 'order_mailbox' in st.session_state:
+        order_events.unsubscribe(st.session_state.pop('order_mailbox'))
+    if ORDER_EVENTS_ENABLED and user_data.id:
+        st.session_state.order_mailbox = order_events.subscribe(str(user_data.id), wake=session_waker())
+
+
+def apply_order_events() -> List[OrderEvent]:
+    """Apply pushed order status changes to the orders held in session state.
+
+    Only the changed orders are replaced, in the loaded recent orders and
+    Past Orders pages; nothing is reloaded. After the listener missed events
+    (resync) both are dropped so they reload when next shown. Returns the
+    status changes that were applied.
+    """
+    mailbox = st.session_state.get('order_mailbox')
+    if mailbox is None:
+        return []
+    events = mailbox.drain()
+    if not events:
+        return []
+
+    statuses = {event.order_number: event.status for event in events if event.order_number}
+    if len(statuses) < len(events):
+        st.session_state.pop('order_summary', None)
+        st.session_state.pop('orders_history', None)
+
+    summary = st.session_state.get('order_summary')
+    if summary and any(order.id in statuses for order in summary[0]):
+        st.session_state.order_summary = (tuple(
+            order._replace(status=statuses[order.id]) if order.id in statuses else order
+            for order in summary[0]
+        ), summary[1])
+    history = st.session_state.get('orders_history')
+    if history:
+        history['items'] = [
+            order._replace(status=statuses[order.id]) if order.id in statuses else order
+            for order in history['items']
+        ]
+    return [event for event in events if event.order_number]
+
+
+def create_user(username: str, email: str, password: str, name: str) -> Optional[str]:
+    """Create new user account in database.
+
+    Returns the ``utils.storage`` ``SIGNUP_*`` outcome (created, username or
+    email taken, failed), or ``None`` after showing why sign-up couldn't run.
+    """
     try:
-        # Check if username or email already exists
-        if db_manager.check_username_exists(username):
-            return False
-        
-        if db_manager.check_email_exists(email):
-            return False
-        
-        # Create user in database
-        return db_manager.create_user(username, email, password, name)
-        
+        check_login_attempt(client_ip())
+
+        # One round-trip: the insert itself reports a taken username or email
+        signup = {'username': username, 'email': email, 'password': password, 'name': name}
+        outcome = db_manager.create_users([signup])[0]
+        # Keep the live availability checks current with what the insert found
+        name_availability.add(username if outcome in (SIGNUP_CREATED, SIGNUP_USERNAME_TAKEN) else None,
+                              email if outcome in (SIGNUP_CREATED, SIGNUP_EMAIL_TAKEN) else None)
+        st.session_state.pop('availability_checks', None)
+        return outcome
+
+    except LoginRejectedError as e:
+        st.error(f"⏳ {e}")
+        return None
+    except SlotMovingError as e:
+        # Shards are being rebalanced: nothing is down, the same sign-up works shortly
+        st.warning(f"⏳ {e}")
+        return None
+    except CircuitOpenError:
+        st.error("Sign-up is temporarily unavailable. Please try again in a moment.")
+        return None
     except Exception as e:
         st.error(f"Error creating user: {e}")
-        return False
+        return None
 
 
 def init_session_state() -> None:
@@ -0,0 +1,123 @@
+"""Live username/email availability checks, prefiltered by in-process Bloom filters."""
+#availability.py
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import NAME_FILTER_CAPACITY, NAME_FILTER_ERROR_RATE, NAME_FILTER_REBUILD_SECONDS
+from utils.bloom import BloomFilter
+from utils.database import db_manager
+from utils.storage import StorageBackend
+
+
+class NameAvailability:
+    """Whether a username or email is still free, mostly without asking the database.
+
+    Bloom filters of every existing username and email are built from
+    ``stream_user_names`` in a background thread: once at startup, then
+    every ``rebuild_seconds`` to pick up users created by other processes.
+    Sign-ups in this process are added as they happen. A name the filter
+    has never seen is reported free straight away; only probable matches
+    (taken names, plus about ``error_rate`` of free ones) are looked up in
+    the database, as is everything until the first build finishes. The
+    answer is advisory: the sign-up insert still has the final say.
+    """
+
+    def __init__(self, backend: StorageBackend, capacity: int, error_rate: float, rebuild_seconds: float):
+        self.backend = backend
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.Lock()
+        self._filters: Optional[Tuple[BloomFilter, BloomFilter]] = None  # (usernames, emails)
+        self._built_at = 0.0
+        self._next_build_at = 0.0
+        self._build_seconds = 0.0
+        # Names added while a build runs, replayed into the new filters; None when no build runs
+        self._added_during_build: Optional[List[Tuple[Optional[str], Optional[str]]]] = None
+        self._counters = dict.fromkeys(['checks', 'filtered', 'db_lookups', 'builds', 'build_errors'], 0)
+
+    def refresh(self) -> None:
+        """Start a background build unless one is running or the filters are recent."""
+        with self._lock:
+            if self._added_during_build is not None or time.monotonic() < self._next_build_at:
+                return
+            self._added_during_build = []
+        threading.Thread(target=self._build, name='name-filter-build', daemon=True).start()
+
+    def _build(self) -> None:
+        started = time.monotonic()
+        try:
+            usernames = BloomFilter(self.capacity, self.error_rate)
+            emails = BloomFilter(self.capacity, self.error_rate)
+            for username, email in self.backend.stream_user_names():
+                usernames.add(username)
+                emails.add(email)
+            if usernames.count * 2 > self.capacity:
+                # Keep headroom for sign-ups: the next build gets room for twice as many
+                self.capacity = usernames.count * 2
+        except Exception as e:
+            print(f"Warning: Could not build the username/email filters: {e}")
+            with self._lock:
+                self._counters['build_errors'] += 1
+                # Checks keep using the old filters (or the database) until the next attempt
+                self._next_build_at = time.monotonic() + self.rebuild_seconds
+                self._added_during_build = None
+            return
+
+        with self._lock:
+            for username, email in self._added_during_build:
+                self._add(usernames, emails, username, email)
+            self._filters = (usernames, emails)
+            self._built_at = time.monotonic()
+            self._next_build_at = self._built_at + self.rebuild_seconds
+            self._build_seconds = self._built_at - started
+            self._counters['builds'] += 1
+            self._added_during_build = None
+
+    def add(self, username: Optional[str] = None, email: Optional[str] = None) -> None:
+        """Record names that are now taken (e.g. by a sign-up)."""
+        with self._lock:
+            if self._filters is not None:
+                self._add(*self._filters, username, email)
+            if self._added_during_build is not None:
+                self._added_during_build.append((username, email))
+
+    @staticmethod
+    def _add(usernames: BloomFilter, emails: BloomFilter, username: Optional[str], email: Optional[str]) -> None:
+        if username:
+            usernames.add(username)
+        if email:
+            emails.add(email)
+
+    def username_available(self, username: str) -> bool:
+        return self._available(0, username, self.backend.check_username_exists)
+
+    def email_available(self, email: str) -> bool:
+        return self._available(1, email, self.backend.check_email_exists)
+
+    def _available(self, index: int, name: str, exists: Callable[[str], bool]) -> bool:
+        self.refresh()
+        filters = self._filters
+        probably_taken = filters is None or name in filters[index]
+        with self._lock:
+            self._counters['checks'] += 1
+            self._counters['db_lookups' if probably_taken else 'filtered'] += 1
+        return not probably_taken or not exists(name)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            filters = self._filters
+            return {
+                **self._counters,
+                'ready': filters is not None,
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if filters else None,
+                'build_seconds': round(self._build_seconds, 3),
+                'usernames': filters[0].stats() if filters else None,
+                'emails': filters[1].stats() if filters else None,
+            }
+
+
+# Shared by every session in the process
+name_availability = NameAvailability(db_manager, NAME_FILTER_CAPACITY, NAME_FILTER_ERROR_RATE,
+                                     NAME_FILTER_REBUILD_SECONDS)
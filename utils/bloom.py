@@ -0,0 +1,52 @@
+"""Bloom filter: a compact set that answers "definitely not present" or "probably present"."""
+#bloom.py
+import hashlib
+import math
+import threading
+from typing import Dict
+
+
+class BloomFilter:
+    """Set membership in ``~1.44 * log2(1 / error_rate)`` bits per item.
+
+    Sized for ``capacity`` items with a false-positive rate of
+    ``error_rate``; adding more items raises the rate. Lookups never miss
+    an added item. Positions come from one BLAKE2b digest per key
+    (double hashing), so a check costs a few microseconds.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def stats(self) -> Dict:
+        return {
+            'items': self.count,
+            'capacity': self.capacity,
+            'bytes': len(self._bits),
+            'hashes': self.hashes,
+            'error_rate': self.error_rate,
+        }
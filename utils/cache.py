@@ -0,0 +1,171 @@
+"""Process-wide LRU + TTL cache with single-flight loading and tag invalidation."""
+#cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class _Flight:
+    """A load in progress; callers missing the same key wait for it instead of loading again."""
+
+    __slots__ = ('done', 'value', 'error', 'invalidations', 'stale_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        # (clock, tags) of each invalidation while loading; tags None for clear()
+        self.invalidations: List[Tuple[int, Optional[tuple]]] = []
+        # clock of the first of those that hit this load's entry, once it finished
+        self.stale_at: Optional[int] = None
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire ``ttl_seconds`` after loading.
+
+    ``get_or_load`` calls the loader once per key however many threads miss
+    it at the same time; the others wait and share its result (or its
+    exception). Each entry carries tags, and ``invalidate`` drops every
+    entry with a given tag. A load overlapping an invalidation of one of
+    its own tags is returned to the callers that were already waiting but
+    not stored, and callers that joined it after that invalidation load
+    again, so a read that began before a write can never put pre-write data
+    back in the cache. Loads of other keys are not affected.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tagged: Dict[Hashable, Set[Hashable]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._clock = 0  # bumped by every invalidation
+        self._counters = dict.fromkeys(
+            ['hits', 'misses', 'coalesced', 'evictions', 'expirations', 'invalidations', 'load_errors'], 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], object],
+                    tags: Callable[[object], Iterable[Hashable]] = lambda value: (),
+                    cacheable: Callable[[object], bool] = lambda value: value is not None):
+        """Get ``key``, calling ``loader`` on a miss.
+
+        ``tags(value)`` names the tags to store the entry under; values for
+        which ``cacheable(value)`` is false (by default ``None``) are returned
+        but not stored.
+        """
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return entry[1]
+                self._remove(key)
+                self._counters['expirations'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._counters['misses'] += 1
+            else:
+                joined = self._clock
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.stale_at is not None and flight.stale_at <= joined:
+                # Joined after this key was invalidated: the load may predate the write
+                return self.get_or_load(key, loader, tags, cacheable)
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters['load_errors'] += 1
+            raise
+        else:
+            # Values that aren't stored have no tags: any invalidation makes them stale
+            entry_tags = tuple(tags(flight.value)) if cacheable(flight.value) else None
+            with self._lock:
+                flight.stale_at = next(
+                    (clock for clock, dropped in flight.invalidations
+                     if dropped is None or entry_tags is None or not set(dropped).isdisjoint(entry_tags)),
+                    None
+                )
+                if entry_tags is not None and flight.stale_at is None:
+                    self._store(key, flight.value, entry_tags)
+            return flight.value
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def invalidate(self, *tags: Hashable) -> int:
+        """Drop every entry stored under any of ``tags``; returns how many were dropped."""
+        with self._lock:
+            self._note_invalidation(tags)
+            dropped = 0
+            for tag in tags:
+                for key in self._tagged.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        dropped += 1
+            self._counters['invalidations'] += dropped
+            return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._note_invalidation(None)
+            self._counters['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._tagged.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses'] + self._counters['coalesced']
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+    def _note_invalidation(self, tags: Optional[tuple]) -> None:
+        """Tell the loads in flight that ``tags`` (``None``: everything) were just invalidated."""
+        self._clock += 1
+        for flight in self._flights.values():
+            flight.invalidations.append((self._clock, tags))
+
+    def _store(self, key: Hashable, value, tags: tuple) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tags)
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
@@ -0,0 +1,90 @@
+"""Circuit breaker that fails database calls fast while the database is unavailable."""
+#circuit_breaker.py
+import threading
+import time
+from typing import Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker shared by every session in the process.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected immediately. Once ``reset_timeout`` seconds have passed
+    a single trial call is let through (half-open): success closes the circuit,
+    failure opens it again for another ``reset_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 15):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Reserve a call, or raise ``CircuitOpenError`` if the circuit rejects it."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self._rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"✅ {self.name} reachable again, circuit closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._times_opened += 1
+                    print(f"Warning: {self.name} failing, circuit open for {self.reset_timeout:.0f}s")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Give back a reserved call that never reached the database."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'rejected': self._rejected,
+                'times_opened': self._times_opened,
+            }
@@ -1,213 +1,389 @@
 """Database utilities for PostgreSQL connection and operations."""
 #database.py
 import os
+import csv
+import io
+import itertools
+import re
+import uuid
+import threading
+import time
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
 import streamlit as st
-from typing import Dict, List, Optional, Any
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from typing import Dict, List, Optional, Any, Set, Tuple, Iterable, Iterator
 from contextlib import contextmanager
-import bcrypt
+from config import (
+    DB_POOL_CONFIG, DB_PREPARED_STATEMENTS, DB_REPLICA_HOSTS,
+    READ_YOUR_WRITES_SECONDS, REPLICA_RETRY_SECONDS,
+    DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE, DB_CONNECT_TIMEOUT, DB_STATEMENT_TIMEOUT_MS,
+    DB_CIRCUIT_FAILURES, DB_CIRCUIT_RESET_SECONDS
+)
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.pool import ConnectionPool
+from utils.prepared import PreparedStatementRegistry
+from utils.query_stats import QueryStats
+from utils.storage import SIGNUP_CREATED, SIGNUP_FAILED, StorageBackend, create_backend, signup_outcome
+from utils.models import Bill, Order, OrderStats, User
+from utils.passwords import password_hasher
 
 
-class DatabaseManager:
+class DatabaseManager(StorageBackend):
     """Database manager for PostgreSQL operations."""
     
-    def __init__(self):
+    def __init__(self, connection_params: Optional[Dict] = None, replica_hosts: Optional[List] = None,
+                 query_stats: Optional[QueryStats] = None, name: str = 'Database'):
+        """Manage one PostgreSQL primary (and its read replicas).
+
+        Defaults to the ``DB_*`` settings; ``utils.sharding`` passes each
+        shard's ``connection_params`` and a ``query_stats`` shared by all
+        shards.
+        """
         self.connection_params = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'port': os.getenv('DB_PORT', '5432'),
-            'database': os.getenv('DB_NAME', 'quickdeliver'),
-            'user': os.getenv('DB_USER', 'postgres'),
-            'password': os.getenv('DB_PASSWORD', 'Dharani@05')
+            **(connection_params or {
+                'host': os.getenv('DB_HOST', 'localhost'),
+                'port': os.getenv('DB_PORT', '5432'),
+                'database': os.getenv('DB_NAME', 'quickdeliver'),
+                'user': os.getenv('DB_USER', 'postgres'),
+                'password': os.getenv('DB_PASSWORD', 'Dharani@05'),
+            }),
+            # Fail fast instead of hanging when the server is unreachable or overloaded
+            'connect_timeout': DB_CONNECT_TIMEOUT,
+            'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}',
         }
-        # Initialize database tables on first use
-        self._ensure_tables_exist()
-    
-    def _ensure_tables_exist(self):
-        """Ensure database tables exist, create them if they don't."""
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Check if users table exists
-                    cursor.execute("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_name = 'users'
-                        );
-                    """)
-                    
-                    if not cursor.fetchone()[0]:
-                        print("Creating database tables...")
-                        self._create_tables(cursor)
-                        conn.commit()
-                        print("✅ Database tables created successfully!")
-        except Exception as e:
-            print(f"Warning: Could not check/create tables: {e}")
-    
-    def _create_tables(self, cursor):
-        """Create all necessary database tables."""
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
-                username text UNIQUE NOT NULL,
-                email text UNIQUE NOT NULL,
-                name text NOT NULL,
-                password_hash text NOT NULL,
-                subscription text DEFAULT 'Basic',
-                created_at timestamptz DEFAULT now(),
-                updated_at timestamptz DEFAULT now()
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
-            CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-        """)
-        
-        # Create orders table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                order_number text UNIQUE NOT NULL,
-                restaurant text NOT NULL,
-                items jsonb NOT NULL DEFAULT '[]',
-                total decimal(10,2) NOT NULL DEFAULT 0.00,
-                status text NOT NULL DEFAULT 'Pending',
-                created_at timestamptz DEFAULT now(),
-                updated_at timestamptz DEFAULT now()
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
-            CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number);
-            CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
-            CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
-        """)
-        
-        # Create bills table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bills (
-                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                month text NOT NULL,
-                amount decimal(10,2) NOT NULL DEFAULT 0.00,
-                status text NOT NULL DEFAULT 'Pending',
-                due_date date NOT NULL,
-                created_at timestamptz DEFAULT now(),
-                updated_at timestamptz DEFAULT now()
-            );
-            
-            CREATE INDEX IF NOT EXISTS idx_bills_user_id ON bills(user_id);
-            CREATE INDEX IF NOT EXISTS idx_bills_status ON bills(status);
-            CREATE INDEX IF NOT EXISTS idx_bills_due_date ON bills(due_date);
-        """)
-        
-        # Create trigger function and triggers
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = now();
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-            
-            DROP TRIGGER IF EXISTS update_users_updated_at ON users;
-            CREATE TRIGGER update_users_updated_at 
-                BEFORE UPDATE ON users 
-                FOR EACH ROW 
-                EXECUTE FUNCTION update_updated_at_column();
-                
-            DROP TRIGGER IF EXISTS update_orders_updated_at ON orders;
-            CREATE TRIGGER update_orders_updated_at 
-                BEFORE UPDATE ON orders 
-                FOR EACH ROW 
-                EXECUTE FUNCTION update_updated_at_column();
-                
-            DROP TRIGGER IF EXISTS update_bills_updated_at ON bills;
-            CREATE TRIGGER update_bills_updated_at 
-                BEFORE UPDATE ON bills 
-                FOR EACH ROW 
-                EXECUTE FUNCTION update_updated_at_column();
-        """)
+        self.name = name
+        # Shared by every session: while the primary keeps failing, calls are
+        # rejected immediately with CircuitOpenError instead of waiting on timeouts
+        self.breaker = CircuitBreaker(name, DB_CIRCUIT_FAILURES, DB_CIRCUIT_RESET_SECONDS)
+        # One pool per process, shared by every Streamlit session thread
+        self.pool = ConnectionPool(self.connection_params, **DB_POOL_CONFIG)
+        # Read-only queries are spread round-robin over the replicas, if any
+        self.replica_pools = [
+            ConnectionPool({**self.connection_params, 'host': host, 'port': port}, **DB_POOL_CONFIG)
+            for host, port in (DB_REPLICA_HOSTS if replica_hosts is None else replica_hosts)
+        ]
+        self._replica_cycle = itertools.cycle(self.replica_pools)
+        self._replica_down_until = {}
+        self._local = threading.local()
+        # Hot queries are PREPAREd once per pooled connection and then run by name
+        self.statements = PreparedStatementRegistry(enabled=DB_PREPARED_STATEMENTS)
+        # Latency per query, connection acquire times and the slow-query log
+        self.query_stats = query_stats or QueryStats(DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE)
+        # Nothing here touches the database: the schema is applied at deploy
+        # time by `python migrate.py` and connections are opened on first use
     
     @contextmanager
-    def get_connection(self):
-        """Get database connection with context manager."""
-        conn = None
+    def get_connection(self, read_only: bool = False):
+        """Check out a pooled database connection with context manager.
+
+        ``read_only`` connections come from a replica when one is configured
+        and healthy, unless the session recently wrote and is pinned to the
+        primary.
+        """
+        started = time.perf_counter()
+        pool, conn = self._checkout(read_only)
+        self.query_stats.record_acquire(self._pool_label(pool), time.perf_counter() - started)
+        broken = timed_out = False
         try:
-            conn = psycopg2.connect(**self.connection_params)
             yield conn
         except psycopg2.Error as e:
-            if conn:
-                conn.rollback()
+            timed_out = isinstance(e, psycopg2.errors.QueryCanceled)
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not timed_out
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
             st.error(f"Database error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            pool.putconn(conn, discard=broken or conn.closed)
+            if pool is self.pool:
+                # Lost connections and statement timeouts count against the breaker
+                if broken or timed_out:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+    def _pool_label(self, pool: ConnectionPool) -> str:
+        """Name of a pool in the acquire-time statistics."""
+        if pool is not self.pool:
+            return pool.connection_params['host']
+        # Shards share one QueryStats, so their primaries are told apart by name
+        return 'primary' if self.name == 'Database' else self.name
+
+    def _checkout(self, read_only: bool):
+        """Pick the pool for a query and check a connection out of it."""
+        if read_only and self.replica_pools and not self._pinned_to_primary():
+            for _ in range(len(self.replica_pools)):
+                pool = next(self._replica_cycle)
+                if self._replica_down_until.get(id(pool), 0) > time.monotonic():
+                    continue
+                try:
+                    return pool, pool.getconn()
+                except (psycopg2.OperationalError, PoolError) as e:
+                    print(f"Warning: Read replica {pool.connection_params['host']} unavailable: {e}")
+                    self._replica_down_until[id(pool)] = time.monotonic() + REPLICA_RETRY_SECONDS
+        self.breaker.before_call()
+        try:
+            return self.pool, self.pool.getconn()
+        except psycopg2.OperationalError:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # e.g. pool exhausted: says nothing about the server's health
+            self.breaker.release()
+            raise
+
+    def _pin_store(self):
+        """Where the read-your-writes pin lives: the Streamlit session, else the current thread."""
+        if get_script_run_ctx(suppress_warning=True) is not None:
+            return st.session_state
+        return self._local.__dict__
+
+    def _pin_to_primary(self) -> None:
+        """Route this session's reads to the primary for the read-your-writes window."""
+        if self.replica_pools:
+            self._pin_store()['_db_primary_until'] = time.time() + READ_YOUR_WRITES_SECONDS
+
+    def _pinned_to_primary(self) -> bool:
+        return self._pin_store().get('_db_primary_until', 0) > time.time()
+
+    @property
+    def nodes(self) -> List[Dict]:
+        """Connection parameters of every primary holding user data (one, unless sharded)."""
+        return [self.connection_params]
+
+    def pool_stats(self) -> Dict:
+        """Get connection pool utilisation counters for the primary and each replica."""
+        return {
+            'primary': {**self.pool.stats(), 'circuit': self.breaker.stats()},
+            'replicas': [
+                {'host': pool.connection_params['host'], **pool.stats()}
+                for pool in self.replica_pools
+            ],
+        }
     
-    def execute_query(self, query: str, params: tuple = None, fetch: bool = False) -> Optional[List[Dict]]:
-        """Execute a database query."""
+    def execute_query(self, query: str, params: tuple = None, fetch: bool = False,
+                      prepared: Optional[str] = None, read_only: bool = False,
+                      tuples: bool = False) -> Optional[List]:
+        """Execute a database query.
+
+        Fetched rows are dicts, or plain tuples with ``tuples=True`` (used to
+        build the compact records in ``utils.models``). Passing ``prepared``
+        runs the query as a server-side prepared statement of that name,
+        falling back to plain execution where that isn't possible.
+        ``read_only`` queries may be served by a read replica; any other
+        query is committed, even when it fetches rows. Errors are reported
+        and return ``None``, except ``CircuitOpenError``, which is raised
+        immediately while the database is known to be down.
+        """
         try:
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    cursor.execute(query, params)
-                    
-                    if fetch:
-                        result = cursor.fetchall()
-                        return [dict(row) for row in result]
-                    else:
-                        conn.commit()
-                        return None
+            with self.get_connection(read_only=read_only) as conn:
+                with conn.cursor(cursor_factory=None if tuples else RealDictCursor) as cursor:
+                    started = time.perf_counter()
+                    try:
+                        if prepared:
+                            self.statements.execute(cursor, prepared, query, params)
+                        else:
+                            cursor.execute(query, params)
+
+                        if fetch:
+                            result = cursor.fetchall()
+                            if not read_only:
+                                # Writes that return rows (RETURNING, functions) must still commit
+                                conn.commit()
+                        else:
+                            result = None
+                            conn.commit()
+                    except psycopg2.Error:
+                        self.query_stats.record_query(query, time.perf_counter() - started,
+                                                      name=prepared, error=True)
+                        raise
+                    self.query_stats.record_query(
+                        query, time.perf_counter() - started,
+                        rows=len(result) if fetch else cursor.rowcount, name=prepared
+                    )
+                    # Rows are returned as the cursor built them, without copying
+                    return result
+        except CircuitOpenError:
+            # Let callers fall back (e.g. to demo data) without waiting or showing errors
+            raise
         except Exception as e:
             st.error(f"Query execution error: {e}")
             return None
-    
-    def create_user(self, username: str, email: str, password: str, name: str) -> bool:
-        """Create a new user in the database."""
-        try:
-            # Hash the password
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            
-            query = """
-                INSERT INTO users (username, email, name, password_hash, subscription)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            params = (username, email, name, password_hash, 'Basic')
-            
-            self.execute_query(query, params)
-            return True
-            
-        except psycopg2.IntegrityError:
-            # Username or email already exists
-            return False
-        except Exception as e:
-            st.error(f"Error creating user: {e}")
-            return False
-    
-    def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
+
+    def _query(self, query: str, params: tuple = None, fetch: bool = False,
+               prepared: Optional[str] = None, read_only: bool = False,
+               tuples: bool = False) -> Optional[List]:
+        """Run a query for the ``StorageBackend`` methods below, as ``execute_query`` does.
+
+        ``utils.async_database.AsyncDatabaseManager`` runs these on asyncpg
+        instead; raw queries from scripts keep using ``execute_query``.
+        """
+        return self.execute_query(query, params, fetch, prepared, read_only, tuples)
+
+    def stream_query(self, query: str, params: tuple = None, itersize: int = 2000,
+                     read_only: bool = True) -> Iterator[tuple]:
+        """Yield the rows of a query one at a time through a named server-side cursor.
+
+        Rows are fetched from the server ``itersize`` at a time, so memory stays
+        flat however large the result is. The connection stays checked out until
+        the generator is exhausted or closed.
+        """
+        with self.get_connection(read_only=read_only) as conn:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = itersize
+                started = time.perf_counter()
+                rows = 0
+                try:
+                    cursor.execute(query, params)
+                    for row in cursor:
+                        rows += 1
+                        yield row
+                finally:
+                    # Includes the time the consumer spent between rows
+                    self.query_stats.record_query(query, time.perf_counter() - started, rows=rows)
+            conn.rollback()
+
+    def stream_user_orders(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's orders, newest first, as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items::text,
+                   o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+            WHERE o.user_id = %s
+            ORDER BY o.created_at DESC, o.id DESC
+        """
+        return self.stream_query(query, (user_id,), itersize)
+
+    def stream_user_bills(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's bills, newest first, as ``utils.export.BILL_COLUMNS`` tuples."""
+        query = """
+            SELECT b.month, u.username, b.amount, b.status, b.due_date
+            FROM bills b
+            JOIN users u ON u.id = b.user_id
+            WHERE b.user_id = %s
+            ORDER BY b.due_date DESC, b.id DESC
+        """
+        return self.stream_query(query, (user_id,), itersize)
+
+    def stream_user_names(self, itersize: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Stream every user's ``(username, email)``, unordered."""
+        return self.stream_query("SELECT username, email FROM users", itersize=itersize)
+
+    def stream_all_orders(self, itersize: int = 10000) -> Iterator[tuple]:
+        """Stream every order (unordered, to avoid a full sort) as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items::text,
+                   o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+        """
+        return self.stream_query(query, itersize=itersize)
+
+    def get_all_orders(self, limit: int = 100) -> List[tuple]:
+        """Get the newest orders across all users as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items::text,
+                   o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT %s
+        """
+        return self._query(query, (limit,), fetch=True, read_only=True, tuples=True) or []
+
+    def _taken_names(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Which of ``usernames`` and ``emails`` are taken, in one query on the primary."""
+        query = """
+            SELECT username, email
+            FROM users
+            WHERE username = ANY(%s) OR email = ANY(%s)
+        """
+        rows = self._query(query, (usernames, emails), fetch=True, tuples=True) or []
+        return {row[0] for row in rows}, {row[1] for row in rows}
+
+    def _insert_users(self, rows: List[Dict]) -> List[Optional[str]]:
+        """Insert users with one ``INSERT ... ON CONFLICT DO NOTHING`` and report each row's outcome.
+
+        ``user_id`` is generated by the database unless given (the sharding
+        layer picks it, since it decides the user's shard). The EXISTS checks
+        read the snapshot the insert started from, so they name the
+        constraint an existing user took; they can't see the new rows.
+        """
+        query = """
+            WITH input AS MATERIALIZED (
+                SELECT COALESCE(id, gen_random_uuid()) AS id, username, email, name, password_hash, ord
+                FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::text[], %s::text[])
+                     WITH ORDINALITY AS t(id, username, email, name, password_hash, ord)
+            ), inserted AS (
+                INSERT INTO users (id, username, email, name, password_hash, subscription)
+                SELECT id, username, email, name, password_hash, 'Basic' FROM input
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            )
+            SELECT EXISTS (SELECT 1 FROM inserted WHERE inserted.id = i.id),
+                   EXISTS (SELECT 1 FROM users u WHERE u.username = i.username),
+                   EXISTS (SELECT 1 FROM users u WHERE u.email = i.email)
+            FROM input i
+            ORDER BY i.ord
+        """
+        params = tuple([row.get(column) for row in rows]
+                       for column in ('user_id', 'username', 'email', 'name', 'password_hash'))
+
+        # execute_query reports errors and returns None
+        result = self._query(query, params, fetch=True, tuples=True)
+        if result is None:
+            return [SIGNUP_FAILED] * len(rows)
+        outcomes = [signup_outcome(*row) for row in result]
+        if SIGNUP_CREATED in outcomes:
+            self._pin_to_primary()
+        return outcomes
+
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
         """Authenticate user and return user data."""
         query = """
-            SELECT id, username, email, name, password_hash, subscription, created_at
+            SELECT id, username, email, name, subscription, created_at, password_hash
             FROM users 
             WHERE username = %s
         """
         
-        result = self.execute_query(query, (username,), fetch=True)
+        result = self._query(query, (username,), fetch=True, read_only=True,
+                             prepared='user_auth_by_username', tuples=True)
         
         if result and len(result) > 0:
-            user = result[0]
-            stored_hash = user['password_hash']
+            row = result[0]
+            stored_hash = row[6]
             
-            # Verify password
-            if bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8')):
-                # Remove password hash from returned data
-                user.pop('password_hash', None)
-                return user
+            # Verify password (on the bcrypt pool)
+            if password_hasher.verify(password, stored_hash):
+                self._upgrade_password_hash(row[0], password, stored_hash)
+                # The password hash is not part of the returned record
+                return User.from_row(row)
         
         return None
+
+    def _upgrade_password_hash(self, user_id: str, password: str, stored_hash: str) -> None:
+        """Rehash a just-verified password stored with another scheme or a lower bcrypt cost; best effort."""
+        try:
+            if not password_hasher.needs_rehash(stored_hash):
+                return
+            query = """
+                UPDATE users
+                SET password_hash = %s, updated_at = now()
+                WHERE id = %s AND password_hash = %s
+            """
+            # Only if unchanged since it was read, so a concurrent password change wins
+            self._query(query, (password_hasher.hash(password), user_id, stored_hash))
+        except Exception as e:
+            print(f"Warning: Could not rehash password for user {user_id}: {e}")
     
-    def get_user_by_username(self, username: str) -> Optional[Dict]:
+    def get_user_by_username(self, username: str) -> Optional[User]:
         """Get user data by username."""
         query = """
             SELECT id, username, email, name, subscription, created_at
@@ -215,32 +391,193 @@ class DatabaseManager:
             WHERE username = %s
         """
         
-        result = self.execute_query(query, (username,), fetch=True)
-        return result[0] if result else None
+        result = self._query(query, (username,), fetch=True, read_only=True,
+                             prepared='user_by_username', tuples=True)
+        return User.from_row(result[0]) if result else None
+    
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        """Get a user with their recent orders and bills in a single round-trip.
+
+        ``orders_limit``/``bills_limit`` cap the embedded history to the most
+        recent rows (``None`` loads everything); ``order_stats`` always covers
+        the full order history. Orders and bills arrive as JSON arrays in
+        record field order, so no intermediate dicts are built.
+        """
+        query = """
+            SELECT u.id, u.username, u.email, u.name, u.subscription, u.created_at,
+                   COALESCE((
+                       SELECT json_agg(json_build_array(
+                                  o.order_number,
+                                  COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), ''),
+                                  o.restaurant,
+                                  CASE WHEN jsonb_typeof(o.items) = 'array'
+                                       THEN o.items ELSE '[]'::jsonb END,
+                                  COALESCE(o.total, 0)::float8,
+                                  o.status
+                              ) ORDER BY o.created_at DESC, o.id DESC)
+                       FROM (
+                           SELECT * FROM orders
+                           WHERE user_id = u.id
+                           ORDER BY created_at DESC, id DESC
+                           LIMIT %s
+                       ) o
+                   ), '[]'::json) AS orders,
+                   COALESCE((
+                       SELECT json_agg(json_build_array(
+                                  b.month,
+                                  COALESCE(b.amount, 0)::float8,
+                                  b.status,
+                                  COALESCE(to_char(b.due_date, 'YYYY-MM-DD'), '')
+                              ) ORDER BY b.due_date DESC, b.id DESC)
+                       FROM (
+                           SELECT * FROM bills
+                           WHERE user_id = u.id
+                           ORDER BY due_date DESC, id DESC
+                           LIMIT %s
+                       ) b
+                   ), '[]'::json) AS bills,
+                   (
+                       SELECT json_build_array(count(*), COALESCE(sum(total), 0)::float8)
+                       FROM orders
+                       WHERE user_id = u.id
+                   ) AS order_stats
+            FROM users u
+            WHERE u.username = %s
+        """
+
+        result = self._query(query, (orders_limit, bills_limit, username), fetch=True,
+                             read_only=True, prepared='user_profile', tuples=True)
+        if not result:
+            return None
+        row = result[0]
+        return User.from_row(row)._replace(
+            orders=tuple(map(Order.from_row, row[6])),
+            bills=tuple(map(Bill.from_row, row[7])),
+            order_stats=OrderStats(*row[8]),
+        )
     
-    def get_user_orders(self, user_id: str) -> List[Dict]:
+    def get_user_orders_page(self, user_id: str, limit: int = 20,
+                             cursor: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        """Get one page of a user's orders, newest first.
+
+        Pagination is keyset-based on ``(created_at, id)``: pass the returned
+        cursor back in to fetch the next page. The cursor is ``None`` once the
+        history is exhausted.
+        """
+        # The plain created_at bound is redundant but lets Postgres prune partitions
+        keyset = "AND o.created_at <= %s AND (o.created_at, o.id) < (%s, %s)" if cursor else ""
+        query = f"""
+            SELECT o.order_number,
+                   COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), ''),
+                   o.restaurant,
+                   CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]'::jsonb END,
+                   COALESCE(o.total, 0)::float8,
+                   o.status,
+                   o.created_at,
+                   o.id
+            FROM orders o
+            WHERE o.user_id = %s {keyset}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT %s
+        """
+        params = (user_id, *((cursor[0], *cursor) if cursor else ()), limit + 1)
+
+        result = self._query(query, params, fetch=True, read_only=True, tuples=True,
+                             prepared='orders_page_after' if cursor else 'orders_page')
+        return self._split_page(result or [], limit, Order.from_row)
+
+    def get_user_bills_page(self, user_id: str, limit: int = 20,
+                            cursor: Optional[Tuple] = None) -> Tuple[List[Bill], Optional[Tuple]]:
+        """Get one page of a user's bills, latest due date first.
+
+        Pagination is keyset-based on ``(due_date, id)``; see
+        ``get_user_orders_page`` for the cursor contract.
+        """
+        keyset = "AND b.due_date <= %s AND (b.due_date, b.id) < (%s, %s)" if cursor else ""
+        query = f"""
+            SELECT b.month,
+                   COALESCE(b.amount, 0)::float8,
+                   b.status,
+                   COALESCE(to_char(b.due_date, 'YYYY-MM-DD'), ''),
+                   b.due_date,
+                   b.id
+            FROM bills b
+            WHERE b.user_id = %s {keyset}
+            ORDER BY b.due_date DESC, b.id DESC
+            LIMIT %s
+        """
+        params = (user_id, *((cursor[0], *cursor) if cursor else ()), limit + 1)
+
+        result = self._query(query, params, fetch=True, read_only=True, tuples=True,
+                             prepared='bills_page_after' if cursor else 'bills_page')
+        return self._split_page(result or [], limit, Bill.from_row)
+
+    def search_orders(self, user_id: str, text: str, limit: int = 20) -> List[Order]:
+        """Search a user's orders by restaurant name or item, best match first.
+
+        Matches substrings case-insensitively ("butter chick") and, through
+        pg_trgm word similarity, misspellings ("buter chiken"). Both predicates
+        are served by the trigram index on ``order_search_text``.
+        """
+        text = text.strip().lower()
+        if not text:
+            return []
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', text) + '%'
+        # Not prepared: the %% escapes of pg_trgm's <% operator only apply to parameterized execution
+        query = """
+            SELECT o.order_number,
+                   COALESCE(to_char(o.created_at, 'YYYY-MM-DD'), ''),
+                   o.restaurant,
+                   CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]'::jsonb END,
+                   COALESCE(o.total, 0)::float8,
+                   o.status
+            FROM orders o
+            WHERE o.user_id = %s
+              AND (order_search_text(o.restaurant, o.items) LIKE %s
+                   OR %s <%% order_search_text(o.restaurant, o.items))
+            ORDER BY word_similarity(%s, order_search_text(o.restaurant, o.items)) DESC,
+                     o.created_at DESC, o.id DESC
+            LIMIT %s
+        """
+
+        result = self._query(query, (user_id, pattern, text, text, limit), fetch=True,
+                             read_only=True, tuples=True)
+        return [Order.from_row(row) for row in result or []]
+
+    def get_user_orders(self, user_id: str) -> List[Order]:
         """Get user's orders from database."""
         query = """
-            SELECT id, order_number, restaurant, items, total, status, created_at
+            SELECT order_number,
+                   COALESCE(to_char(created_at, 'YYYY-MM-DD'), ''),
+                   restaurant,
+                   CASE WHEN jsonb_typeof(items) = 'array' THEN items ELSE '[]'::jsonb END,
+                   COALESCE(total, 0)::float8,
+                   status
             FROM orders 
             WHERE user_id = %s
             ORDER BY created_at DESC
         """
         
-        result = self.execute_query(query, (user_id,), fetch=True)
-        return result if result else []
+        result = self._query(query, (user_id,), fetch=True, read_only=True,
+                             prepared='orders_by_user', tuples=True)
+        return [Order.from_row(row) for row in result or []]
     
-    def get_user_bills(self, user_id: str) -> List[Dict]:
+    def get_user_bills(self, user_id: str) -> List[Bill]:
         """Get user's bills from database."""
         query = """
-            SELECT id, month, amount, status, due_date, created_at
+            SELECT month,
+                   COALESCE(amount, 0)::float8,
+                   status,
+                   COALESCE(to_char(due_date, 'YYYY-MM-DD'), '')
             FROM bills 
             WHERE user_id = %s
             ORDER BY due_date DESC
         """
         
-        result = self.execute_query(query, (user_id,), fetch=True)
-        return result if result else []
+        result = self._query(query, (user_id,), fetch=True, read_only=True,
+                             prepared='bills_by_user', tuples=True)
+        return [Bill.from_row(row) for row in result or []]
     
     def create_order(self, user_id: str, order_data: Dict) -> bool:
         """Create a new order."""
@@ -248,6 +585,7 @@ class DatabaseManager:
             query = """
                 INSERT INTO orders (user_id, order_number, restaurant, items, total, status)
                 VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id
             """
             params = (
                 user_id,
@@ -258,13 +596,90 @@ class DatabaseManager:
                 order_data.get('status', 'Pending')
             )
             
-            self.execute_query(query, params)
+            # Rejected inserts (e.g. an order_number already in use) are reported and return None
+            if not self._query(query, params, fetch=True):
+                return False
+            self._pin_to_primary()
             return True
             
         except Exception as e:
             st.error(f"Error creating order: {e}")
             return False
     
+    _driver_error = psycopg2.Error
+
+    def create_orders_bulk(self, orders: Iterable[Dict], chunk_size: int = 5000) -> Dict:
+        """Insert many orders through ``COPY FROM STDIN``; see ``StorageBackend.create_orders_bulk``.
+
+        Each chunk is streamed into a temporary staging table and moved into
+        ``orders`` in one transaction.
+        """
+        report = super().create_orders_bulk(orders, chunk_size)
+        if report['inserted']:
+            self._pin_to_primary()
+        return report
+
+    def _insert_orders_chunk(self, chunk) -> Tuple[Set[str], Set[str]]:
+        """COPY one validated chunk into staging and move it into ``orders`` in one transaction.
+
+        Returns the set of inserted order numbers and the set of user ids that
+        do not exist.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for index, record in chunk:
+            writer.writerow((index, *record))
+        buffer.seek(0)
+
+        started = time.perf_counter()
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS orders_staging (
+                        row_index bigint,
+                        user_id uuid,
+                        order_number text,
+                        restaurant text,
+                        items jsonb,
+                        total decimal(10,2),
+                        status text,
+                        created_at timestamptz
+                    ) ON COMMIT DELETE ROWS
+                """)
+                cursor.copy_expert(
+                    "COPY orders_staging FROM STDIN WITH (FORMAT csv)", buffer
+                )
+                # claim_order_number skips (rather than rejects) numbers already in use
+                cursor.execute("SET LOCAL app.skip_duplicate_order_numbers = on")
+                cursor.execute("""
+                    INSERT INTO orders (user_id, order_number, restaurant, items, total, status, created_at)
+                    SELECT s.user_id, s.order_number, s.restaurant, s.items, s.total, s.status,
+                           COALESCE(s.created_at, now())
+                    FROM orders_staging s
+                    JOIN users u ON u.id = s.user_id
+                    ORDER BY s.row_index
+                    ON CONFLICT DO NOTHING
+                    RETURNING order_number
+                """)
+                inserted = {row[0] for row in cursor.fetchall()}
+                cursor.execute("""
+                    SELECT DISTINCT s.user_id::text
+                    FROM orders_staging s
+                    WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.user_id)
+                """)
+                missing_users = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+        self.query_stats.record_query("COPY orders_staging", time.perf_counter() - started,
+                                      rows=len(inserted), name='bulk_order_copy')
+        return inserted, missing_users
+
+    def maintain_partitions(self, months_ahead: int = 3) -> int:
+        """Create upcoming orders/bills partitions; returns how many were created."""
+        result = self._query("SELECT maintain_partitions(%s) AS created", (months_ahead,), fetch=True)
+        if result:
+            self._pin_to_primary()
+        return result[0]['created'] if result else 0
+
     def update_user_subscription(self, user_id: str, subscription: str) -> bool:
         """Update user's subscription plan."""
         try:
@@ -274,25 +689,40 @@ class DatabaseManager:
                 WHERE id = %s
             """
             
-            self.execute_query(query, (subscription, user_id))
+            self._query(query, (subscription, user_id))
+            self._pin_to_primary()
             return True
             
         except Exception as e:
             st.error(f"Error updating subscription: {e}")
             return False
     
+    def get_setting(self, name: str) -> Optional[str]:
+        """The value stored under ``name`` in ``app_settings``, if any."""
+        result = self._query("SELECT value FROM app_settings WHERE name = %s", (name,),
+                             fetch=True, tuples=True)
+        return result[0][0] if result else None
+
+    def claim_setting(self, name: str, value: str) -> Optional[str]:
+        """Store ``value`` under ``name`` unless a value is stored already; returns the stored value."""
+        self._query("INSERT INTO app_settings (name, value) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING",
+                    (name, value))
+        return self.get_setting(name)
+
     def check_username_exists(self, username: str) -> bool:
         """Check if username already exists."""
         query = "SELECT 1 FROM users WHERE username = %s"
-        result = self.execute_query(query, (username,), fetch=True)
+        result = self._query(query, (username,), fetch=True, read_only=True, prepared='username_exists')
         return len(result) > 0 if result else False
     
     def check_email_exists(self, email: str) -> bool:
         """Check if email already exists."""
         query = "SELECT 1 FROM users WHERE email = %s"
-        result = self.execute_query(query, (email,), fetch=True)
+        result = self._query(query, (email,), fetch=True, read_only=True, prepared='email_exists')
         return len(result) > 0 if result else False
 
 
-# Global database manager instance
-db_manager = DatabaseManager()
\ No newline at end of file
+# Global storage backend: SQLite when DB_BACKEND=sqlite, else PostgreSQL (spread over DB_SHARDS when configured)
+db_manager = create_backend()
+# New bcrypt hashes use the cost stored in the database, so every app process and host agrees on it
+password_hasher.settings = db_manager
\ No newline at end of file
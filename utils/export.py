@@ -0,0 +1,100 @@
+"""Streaming CSV and Parquet export of order and bill history."""
+#export.py
+import csv
+import io
+import itertools
+from typing import BinaryIO, Iterable, Iterator, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# Column order of the tuples yielded by DatabaseManager.stream_*_orders / stream_user_bills
+ORDER_COLUMNS = ['order_number', 'username', 'restaurant', 'items', 'total', 'status', 'created_at']
+BILL_COLUMNS = ['month', 'username', 'amount', 'status', 'due_date']
+
+EXPORT_FORMATS = ['CSV', 'Parquet'] if pa is not None else ['CSV']
+
+
+def _schema(columns: List[str]):
+    """Arrow schema for an export, so every batch is typed the same."""
+    types = {
+        'order_number': pa.string(),
+        'username': pa.string(),
+        'restaurant': pa.string(),
+        'items': pa.string(),  # JSON text
+        'total': pa.decimal128(10, 2),
+        'amount': pa.decimal128(10, 2),
+        'status': pa.string(),
+        'created_at': pa.timestamp('us', tz='UTC'),
+        'month': pa.string(),
+        'due_date': pa.date32(),
+    }
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+def batched(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    """Group a row stream into lists of at most ``size`` rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_csv(columns: List[str], rows: Iterable[tuple], batch_size: int = 5000) -> Iterator[str]:
+    """Yield a CSV document in chunks of ``batch_size`` rows, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batched(rows, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_csv(out: BinaryIO, columns: List[str], rows: Iterable[tuple], batch_size: int = 5000) -> int:
+    """Stream rows to a binary file as UTF-8 CSV and return the number of rows written."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    for chunk in iter_csv(columns, counted(), batch_size):
+        out.write(chunk.encode('utf-8'))
+    return count
+
+
+def write_parquet(out: BinaryIO, columns: List[str], rows: Iterable[tuple],
+                  batch_size: int = 10000) -> int:
+    """Stream rows to a binary file as Parquet, one row group per batch.
+
+    Returns the number of rows written. Requires pyarrow.
+    """
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = _schema(columns)
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for batch in batched(rows, batch_size):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export(out: BinaryIO, export_format: str, columns: List[str], rows: Iterable[tuple]) -> int:
+    """Write ``rows`` to the binary file ``out`` in ``export_format`` ('CSV' or 'Parquet')."""
+    if export_format == 'Parquet':
+        return write_parquet(out, columns, rows)
+    return write_csv(out, columns, rows)
@@ -0,0 +1,189 @@
+"""Versioned schema migrations tracked in a ``schema_migrations`` table."""
+#migrations.py
+import hashlib
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import psycopg2
+
+from config import DATABASE_CONFIG
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'supabase', 'migrations'
+)
+
+# Arbitrary constant so concurrent deploys serialize on one advisory lock
+MIGRATION_LOCK_ID = 727_160_010
+
+_FILENAME = re.compile(r'^(\d+)_(.+)\.sql$')
+
+# Idempotent migrations that later ones depend on; baseline runs them instead of only recording
+# them, since a database created before tracking (e.g. on plain PostgreSQL) may lack what they add
+BASELINE_RERUN = {'auth_compat'}
+
+
+class MigrationError(Exception):
+    """Raised when the migration history and the files on disk disagree."""
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    path: str
+    checksum: str
+
+    @property
+    def sql(self) -> str:
+        with open(self.path, encoding='utf-8') as f:
+            return f.read()
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Return the migration files in ``directory`` ordered by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(Migration(match.group(1), match.group(2), path, checksum))
+    return migrations
+
+
+class MigrationRunner:
+    """Apply ``supabase/migrations`` in order, once each.
+
+    Every migration runs in its own transaction together with the row that
+    records it, so a failed migration leaves nothing behind. A session-level
+    advisory lock keeps two deploys from migrating at the same time.
+    """
+
+    def __init__(self, connection_params: Optional[Dict] = None, directory: str = MIGRATIONS_DIR):
+        self.connection_params = connection_params or DATABASE_CONFIG
+        self.directory = directory
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connection_params)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version text PRIMARY KEY,
+                    name text NOT NULL,
+                    checksum text NOT NULL,
+                    applied_at timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+        return conn
+
+    @staticmethod
+    def _applied(cursor) -> Dict[str, str]:
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cursor.fetchall())
+
+    @staticmethod
+    def _has_schema(cursor) -> bool:
+        cursor.execute("SELECT to_regclass('public.users') IS NOT NULL")
+        return cursor.fetchone()[0]
+
+    def status(self) -> List[Dict]:
+        """List every migration with whether it is applied and whether its file changed since."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                applied = self._applied(cursor)
+        finally:
+            conn.close()
+
+        return [
+            {
+                'version': migration.version,
+                'name': migration.name,
+                'applied': migration.version in applied,
+                'modified': migration.version in applied and applied[migration.version] != migration.checksum,
+            }
+            for migration in discover(self.directory)
+        ]
+
+    def migrate(self, dry_run: bool = False) -> List[Migration]:
+        """Apply all pending migrations and return the ones applied (or that would be)."""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+                try:
+                    applied = self._applied(cursor)
+                    if not applied and self._has_schema(cursor):
+                        raise MigrationError(
+                            "Tables already exist but no migrations are recorded. Record the "
+                            "migrations this database already has with --baseline VERSION first."
+                        )
+
+                    pending = [m for m in discover(self.directory) if m.version not in applied]
+                    if dry_run:
+                        return pending
+
+                    for migration in pending:
+                        print(f"⏳ Applying {migration.version}_{migration.name}...")
+                        conn.autocommit = False
+                        try:
+                            cursor.execute(migration.sql)
+                            cursor.execute(
+                                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                                (migration.version, migration.name, migration.checksum)
+                            )
+                            conn.commit()
+                        except psycopg2.Error:
+                            conn.rollback()
+                            raise
+                        finally:
+                            conn.autocommit = True
+                    return pending
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        finally:
+            conn.close()
+
+    def baseline(self, version: str) -> List[Migration]:
+        """Record every migration up to ``version`` as applied without running it.
+
+        For databases whose schema was created before migrations were tracked.
+        Migrations in ``BASELINE_RERUN`` are run as well, in the same transaction.
+        """
+        migrations = [m for m in discover(self.directory) if m.version <= version]
+        if not migrations or migrations[-1].version != version:
+            raise MigrationError(f"No migration with version {version}")
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+                try:
+                    conn.autocommit = False
+                    try:
+                        for migration in migrations:
+                            if migration.name in BASELINE_RERUN:
+                                print(f"⏳ Applying {migration.version}_{migration.name}...")
+                                cursor.execute(migration.sql)
+                        cursor.executemany(
+                            """
+                            INSERT INTO schema_migrations (version, name, checksum)
+                            VALUES (%s, %s, %s)
+                            ON CONFLICT (version) DO NOTHING
+                            """,
+                            [(m.version, m.name, m.checksum) for m in migrations]
+                        )
+                        conn.commit()
+                    except psycopg2.Error:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        finally:
+            conn.close()
+        return migrations
@@ -0,0 +1,87 @@
+"""Compact record types for users, orders and bills.
+
+Records are NamedTuples: no per-instance ``__dict__``, immutable, and built
+straight from tuple cursor rows (or ``json_build_array`` rows) with
+``_make``. Field order therefore matches the SELECT lists in
+``utils/database.py``.
+"""
+#models.py
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Order(NamedTuple):
+    id: str  # order number shown to the user
+    date: str  # YYYY-MM-DD
+    restaurant: str
+    items: Tuple[str, ...]
+    total: float
+    status: str
+
+    @classmethod
+    def from_row(cls, row) -> 'Order':
+        """Build from a ``(id, date, restaurant, items, total, status, ...)`` row."""
+        return cls(row[0], row[1], row[2], tuple(row[3] or ()), row[4], row[5])
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Order':
+        return cls(
+            data.get('id', ''), data.get('date', ''), data.get('restaurant', 'Unknown'),
+            tuple(data.get('items', ())), data.get('total', 0), data.get('status', 'Pending')
+        )
+
+
+class Bill(NamedTuple):
+    month: str
+    amount: float
+    status: str
+    due_date: str  # YYYY-MM-DD
+
+    @classmethod
+    def from_row(cls, row) -> 'Bill':
+        """Build from a ``(month, amount, status, due_date, ...)`` row."""
+        return cls(row[0], row[1], row[2], row[3])
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Bill':
+        return cls(
+            data.get('month', ''), data.get('amount', 0), data.get('status', 'Pending'),
+            data.get('due_date', '')
+        )
+
+
+class OrderStats(NamedTuple):
+    count: int = 0
+    total_spent: float = 0.0
+
+
+class User(NamedTuple):
+    id: Optional[str]  # None for demo (mock) users
+    username: str
+    email: str
+    name: str
+    subscription: str = 'Basic'
+    created_at: Optional[datetime] = None
+    orders: Tuple[Order, ...] = ()  # most recent orders; older pages are loaded on demand
+    bills: Tuple[Bill, ...] = ()
+    order_stats: OrderStats = OrderStats()
+
+    @classmethod
+    def from_row(cls, row) -> 'User':
+        """Build from an ``(id, username, email, name, subscription, created_at, ...)`` row."""
+        return cls(row[0], row[1], row[2], row[3], row[4] or 'Basic', row[5])
+
+    @classmethod
+    def from_dict(cls, username: str, data: Dict) -> 'User':
+        """Build a demo user from a ``MOCK_USERS`` entry."""
+        orders = tuple(Order.from_dict(order) for order in data.get('orders', []))
+        return cls(
+            id=None,
+            username=username,
+            email=data.get('email', ''),
+            name=data.get('name', username),
+            subscription=data.get('subscription', 'Basic'),
+            orders=orders,
+            bills=tuple(Bill.from_dict(bill) for bill in data.get('bills', [])),
+            order_stats=OrderStats(len(orders), sum(order.total for order in orders)),
+        )
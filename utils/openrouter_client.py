@@ -10,7 +10,7 @@ from config import (
     OPENROUTER_SITE_URL, 
     OPENROUTER_APP_NAME
 )
-from utils.auth import get_user_data
+from utils.auth import get_order_stats
 
 
 def call_openrouter_api(prompt: str) -> str:
@@ -22,14 +22,14 @@ def call_openrouter_api(prompt: str) -> str:
         return "⚠️ OpenRouter API key not configured. Please add your API key to config.py"
 
     # Prepare context about the user and service
-    user_data = get_user_data(st.session_state.get('username', ''))
+    user_data = st.session_state.user_data
     context = f"""
     You are a helpful customer service AI for QuickDeliver, a food delivery app. 
 
     User Information:
-    - Name: {user_data.get('name', 'N/A')}
-    - Subscription: {user_data.get('subscription', 'N/A')}
-    - Recent Orders: {len(user_data.get('orders', []))} orders
+    - Name: {user_data.name or 'N/A'}
+    - Subscription: {user_data.subscription or 'N/A'}
+    - Recent Orders: {get_order_stats().count} orders
 
     You can help with:
     - Order tracking and issues
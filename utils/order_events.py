@@ -0,0 +1,214 @@
+"""Push order status changes to open sessions with PostgreSQL LISTEN/NOTIFY."""
+#order_events.py
+import json
+import select
+import threading
+import weakref
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import psycopg2
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from config import ORDER_EVENTS_RECONNECT_SECONDS
+from utils.database import db_manager
+
+# Channel the orders_status_notify trigger publishes on
+ORDER_EVENTS_CHANNEL = 'order_status'
+
+
+class OrderEvent(NamedTuple):
+    user_id: str
+    order_number: Optional[str]  # None: events may have been missed, resync the history
+    status: Optional[str]
+
+
+class Mailbox:
+    """Order events for one session, filled by the listener thread and drained by the session."""
+
+    def __init__(self, user_id: str, wake: Optional[Callable[[], None]] = None):
+        self.user_id = user_id
+        self._wake = wake
+        self._events = deque()
+
+    def put(self, event: OrderEvent) -> None:
+        self._events.append(event)
+        if self._wake is not None:
+            self._wake()
+
+    def drain(self) -> List[OrderEvent]:
+        """Take every event delivered so far, oldest first."""
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+
+# Set once the private Streamlit API used by session_waker was found missing
+_rerun_api_missing = False
+
+
+def session_waker() -> Optional[Callable[[], None]]:
+    """Get a callable that reruns the current Streamlit session from any thread.
+
+    Returns ``None`` outside a Streamlit session, or when this Streamlit
+    version lacks the private session API it relies on (tested with the
+    range pinned in requirements.txt); events are then applied on the
+    session's next rerun instead. The rerun reuses the session's last
+    client state, as Streamlit does when a source file changes.
+    """
+    global _rerun_api_missing
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None or _rerun_api_missing or not Runtime.exists():
+        return None
+    session_id = ctx.session_id
+
+    # Check the private API up front, while this session is known to be active
+    manager = getattr(Runtime.instance(), '_session_mgr', None)
+    info = manager.get_active_session_info(session_id) if hasattr(manager, 'get_active_session_info') else None
+    if info is None or not hasattr(info.session, 'request_rerun') or not hasattr(info.session, '_client_state'):
+        _rerun_api_missing = True
+        print("Warning: This Streamlit version can't rerun sessions from other threads; "
+              "order status updates will show on the next page interaction")
+        return None
+
+    def wake():
+        if not Runtime.exists():
+            return
+        try:
+            info = Runtime.instance()._session_mgr.get_active_session_info(session_id)
+            if info is not None:
+                info.session.request_rerun(info.session._client_state)
+        except Exception as e:
+            # The update is still applied on the session's next rerun
+            print(f"Warning: Could not rerun session {session_id}: {e}")
+
+    return wake
+
+
+class OrderEventListener:
+    """Background threads that LISTEN for order status changes, one per database node.
+
+    There is a single node unless the database is sharded. Each thread holds
+    a dedicated connection (not a pooled one) and blocks in ``select`` until
+    the server sends a notification, then hands the event to the mailboxes
+    subscribed to that order's user. Mailboxes are held weakly, so a session
+    that ends without unsubscribing simply drops out. If a connection is lost
+    its thread reconnects after ``reconnect_seconds`` and sends every mailbox
+    a resync event, since notifications sent meanwhile are lost.
+    ``on_event`` is called with every event, resyncs included, before the
+    mailboxes get it (used to invalidate the profile cache).
+    """
+
+    def __init__(self, nodes: List[Dict], channel: str = ORDER_EVENTS_CHANNEL,
+                 reconnect_seconds: float = 5, on_event: Optional[Callable[[OrderEvent], None]] = None):
+        self.nodes = nodes
+        self.on_event = on_event
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._lock = threading.Lock()
+        self._mailboxes: Dict[str, weakref.WeakSet] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._stats = {'received': 0, 'delivered': 0, 'reconnects': 0}
+
+    def subscribe(self, user_id: str, wake: Optional[Callable[[], None]] = None) -> Mailbox:
+        """Get a mailbox for ``user_id``'s order events, starting the listener if needed."""
+        mailbox = Mailbox(user_id, wake)
+        with self._lock:
+            self._mailboxes.setdefault(user_id, weakref.WeakSet()).add(mailbox)
+            if not any(thread.is_alive() for thread in self._threads):
+                self._stop.clear()
+                self._threads = [
+                    threading.Thread(target=self._run, args=(params,), name=f'order-events-{index}', daemon=True)
+                    for index, params in enumerate(self.nodes)
+                ]
+                for thread in self._threads:
+                    thread.start()
+        return mailbox
+
+    def unsubscribe(self, mailbox: Mailbox) -> None:
+        with self._lock:
+            mailboxes = self._mailboxes.get(mailbox.user_id)
+            if mailboxes is not None:
+                mailboxes.discard(mailbox)
+                if not mailboxes:
+                    del self._mailboxes[mailbox.user_id]
+
+    def stop(self) -> None:
+        """Stop the listener threads (they exit within a second)."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                'running': sum(thread.is_alive() for thread in self._threads),
+                'subscribers': sum(len(mailboxes) for mailboxes in self._mailboxes.values()),
+            }
+
+    def _run(self, connection_params: Dict) -> None:
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**connection_params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                if connected_before:
+                    with self._lock:
+                        self._stats['reconnects'] += 1
+                    self._deliver_to_all()
+                connected_before = True
+                self._listen(conn)
+            except psycopg2.Error as e:
+                print(f"Warning: Order event listener disconnected: {e}")
+                self._stop.wait(self.reconnect_seconds)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen(self, conn) -> None:
+        while not self._stop.is_set():
+            # Wakes on a notification; the timeout only bounds how long stop() waits
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                self._dispatch(conn.notifies.pop(0).payload)
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            event = OrderEvent(str(data['user_id']), data['order_number'], data['status'])
+        except (ValueError, KeyError, TypeError):
+            print(f"Warning: Ignoring malformed order event: {payload[:200]}")
+            return
+        if self.on_event is not None:
+            self.on_event(event)
+        with self._lock:
+            self._stats['received'] += 1
+            mailboxes = list(self._mailboxes.get(event.user_id, ()))
+            self._stats['delivered'] += len(mailboxes)
+        for mailbox in mailboxes:
+            mailbox.put(event)
+
+    def _deliver_to_all(self) -> None:
+        with self._lock:
+            user_ids = list(self._mailboxes)
+            mailboxes = [mailbox for group in self._mailboxes.values() for mailbox in group]
+        if self.on_event is not None:
+            for user_id in user_ids:
+                self.on_event(OrderEvent(user_id, None, None))
+        for mailbox in mailboxes:
+            mailbox.put(OrderEvent(mailbox.user_id, None, None))
+
+
+# Global listener shared by every session in the process; it only starts on first subscribe
+order_events = OrderEventListener(db_manager.nodes,
+                                  reconnect_seconds=ORDER_EVENTS_RECONNECT_SECONDS,
+                                  on_event=getattr(db_manager, 'on_order_event', None))
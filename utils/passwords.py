@@ -0,0 +1,320 @@
+"""Password hashing on a bounded bcrypt worker pool, with login throttling."""
+#passwords.py
+import hashlib
+import hmac
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import bcrypt
+
+from config import (
+    AVAILABILITY_IP_BURST, AVAILABILITY_IP_PER_MINUTE, BCRYPT_MAX_QUEUE, BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS, BCRYPT_ROUNDS, BCRYPT_TARGET_MS,
+    BCRYPT_WAIT_SECONDS, BCRYPT_WORKERS,
+    LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE, LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE
+)
+from utils.circuit_breaker import CircuitOpenError
+from utils.query_stats import LatencyHistogram
+
+_BCRYPT_HASH = re.compile(r'^\$2[aby]\$(\d\d)\$')
+# Unsalted SHA-256 hex digests from before bcrypt; only verified so they can be upgraded
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+# app_settings entry holding the calibrated bcrypt cost shared by every app process
+ROUNDS_SETTING = 'bcrypt_rounds'
+
+
+class LoginRejectedError(Exception):
+    """A sign-in or sign-up was turned away (overload or too many attempts); the message is for the user.
+
+    Not a ``CircuitOpenError``: the database is fine, so fallbacks for an
+    unreachable database don't apply. Callers that handle both catch both.
+    """
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordPoolBusyError(LoginRejectedError):
+    """Raised when the bcrypt workers are saturated and the queue is full (or too slow)."""
+
+
+class LoginThrottledError(LoginRejectedError):
+    """Raised when a client IP or username is out of sign-in attempts."""
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int, max_rounds: int) -> Tuple[int, float]:
+    """The highest bcrypt cost in ``[min_rounds, max_rounds]`` whose hash takes at most ``target_ms`` here.
+
+    Each extra round doubles the work, so one timing at ``min_rounds`` is
+    extrapolated. Returns the cost and its estimated milliseconds per hash.
+    """
+    salt = bcrypt.gensalt(min_rounds)
+    timings = []
+    for _ in range(2):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        timings.append((time.perf_counter() - started) * 1000)
+    rounds, hash_ms = min_rounds, min(timings)
+    while rounds < max_rounds and hash_ms * 2 <= target_ms:
+        rounds += 1
+        hash_ms *= 2
+    return rounds, round(hash_ms, 1)
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a fixed number of worker threads.
+
+    bcrypt releases the GIL, so ``workers`` bounds how many cores hashing
+    can use at once, leaving the rest for rendering pages. At most
+    ``max_queue`` more jobs wait for a worker; beyond that, or when a job
+    has waited ``wait_seconds`` without finishing, callers get a
+    ``PasswordPoolBusyError`` straight away instead of piling up.
+
+    New hashes use ``rounds`` as the bcrypt cost. With ``rounds=0`` the cost
+    is read on first use from ``settings`` (a ``StorageBackend``, set once
+    the app's backend exists); if none is stored yet, the highest cost whose
+    hash fits in ``target_ms`` on this machine is calibrated and stored, so
+    the first process to calibrate decides for every process and host.
+    ``needs_rehash`` tells callers which stored hashes to upgrade after a
+    successful login.
+    """
+
+    def __init__(self, workers: int, max_queue: int, wait_seconds: float,
+                 rounds: int = 0, target_ms: float = 250, min_rounds: int = 10, max_rounds: int = 16):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.wait_seconds = wait_seconds
+        self.target_ms = target_ms
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self._rounds = rounds or None
+        self._hash_ms: Optional[float] = None
+        self.settings = None
+        self._calibration_lock = threading.Lock()
+        self._calibration_started = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        # One slot per running or queued job
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._active = 0
+        self._counters = dict.fromkeys(['completed', 'rejected', 'timed_out'], 0)
+        self._queue_wait = LatencyHistogram()
+        self._run_time = LatencyHistogram()
+
+    @property
+    def rounds(self) -> int:
+        """The bcrypt cost for new hashes: configured, stored in ``settings``, or calibrated on first use."""
+        if self._rounds is None:
+            with self._calibration_lock:
+                if self._rounds is None:
+                    self._rounds, self._hash_ms = self._shared_rounds()
+        return self._rounds
+
+    def _shared_rounds(self) -> Tuple[int, Optional[float]]:
+        stored = self._stored_rounds(lambda settings: settings.get_setting(ROUNDS_SETTING))
+        if stored:
+            return stored, None
+        rounds, hash_ms = self._run(lambda: calibrate_rounds(self.target_ms, self.min_rounds, self.max_rounds))
+        # Another process may have stored its cost meanwhile; the stored one wins
+        stored = self._stored_rounds(lambda settings: settings.claim_setting(ROUNDS_SETTING, str(rounds)))
+        if stored and stored != rounds:
+            return stored, None
+        return rounds, hash_ms
+
+    def _stored_rounds(self, read: Callable) -> Optional[int]:
+        if self.settings is None:
+            return None
+        try:
+            value = read(self.settings)
+        except CircuitOpenError:
+            # Database down: this process uses its own calibration
+            return None
+        return int(value) if value else None
+
+    def calibrate(self) -> None:
+        """Start calibrating the bcrypt cost in the background, so the first sign-up doesn't wait for it."""
+        with self._lock:
+            if self._rounds is not None or self._calibration_started:
+                return
+            self._calibration_started = True
+        threading.Thread(target=self._calibrate_quietly, name='bcrypt-calibration', daemon=True).start()
+
+    def _calibrate_quietly(self) -> None:
+        try:
+            self.rounds
+        except LoginRejectedError:
+            pass  # Busy: the next hash calibrates instead
+
+    def hash(self, password: str) -> str:
+        return self.result(self.start_hash(password))
+
+    def start_hash(self, password: str) -> Future:
+        """Queue a hash and return straight away, so the caller can do other work meanwhile.
+
+        Collect it with ``result``, or ``cancel()`` the future if it is no
+        longer needed (a hash still waiting for a worker is then skipped).
+        """
+        rounds = self.rounds
+        return self._submit(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8'))
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Check a password against a bcrypt (or legacy SHA-256) hash; unknown formats never match."""
+        if _BCRYPT_HASH.match(hashed):
+            return self._run(lambda: bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')))
+        if _LEGACY_SHA256.match(hashed):
+            return hmac.compare_digest(hashed, hashlib.sha256(password.encode('utf-8')).hexdigest())
+        return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Whether a stored hash uses another scheme or a lower cost than new hashes would.
+
+        Higher costs are kept, so a lowered setting never downgrades hashes.
+        """
+        match = _BCRYPT_HASH.match(hashed)
+        return match is None or int(match.group(1)) < self.rounds
+
+    def _run(self, work: Callable):
+        return self.result(self._submit(work))
+
+    def _submit(self, work: Callable) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PasswordPoolBusyError("Sign-in is very busy right now. Please try again in a few seconds.",
+                                        retry_after=self.wait_seconds)
+        with self._lock:
+            self._admitted += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._active += 1
+                self._queue_wait.record((started - submitted) * 1000)
+            try:
+                return work()
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._counters['completed'] += 1
+                    self._run_time.record((time.perf_counter() - started) * 1000)
+
+        def release(_):
+            with self._lock:
+                self._admitted -= 1
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(job)
+        except RuntimeError:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def result(self, future: Future):
+        """Wait for a queued job; ``PasswordPoolBusyError`` if it isn't done within ``wait_seconds``."""
+        try:
+            return future.result(timeout=self.wait_seconds)
+        except FutureTimeoutError:
+            # Still queued: drop it; already running: let it finish, nobody waits for it
+            future.cancel()
+            with self._lock:
+                self._counters['timed_out'] += 1
+            raise PasswordPoolBusyError("Sign-in is very busy right now. Please try again in a few seconds.",
+                                        retry_after=self.wait_seconds) from None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'rounds': self._rounds,
+                'calibrated_hash_ms': self._hash_ms,
+                'target_ms': self.target_ms,
+                'workers': self.workers,
+                'active': self._active,
+                'queued': self._admitted - self._active,
+                'max_queue': self.max_queue,
+                'utilisation': round(self._active / self.workers, 3),
+                **self._counters,
+                'queue_wait': self._queue_wait.summary(),
+                'run_time': self._run_time.summary(),
+            }
+
+
+class TokenBucketThrottle:
+    """Token buckets per key (client IP, username), refilled continuously.
+
+    Each bucket holds up to ``burst`` tokens and regains ``per_minute`` a
+    minute. Idle buckets refill to full, so only the ``max_keys`` most
+    recently used are kept. Limits are per app process.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: 'OrderedDict[Hashable, list]' = OrderedDict()  # key -> [tokens, updated_at]
+        self.throttled = 0
+
+    def acquire(self, limits: Dict[Hashable, tuple]) -> float:
+        """Take a token from every bucket in ``{key: (burst, per_minute)}``, or from none.
+
+        Returns 0 when allowed, else the seconds until every bucket has a token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            retry_after = 0.0
+            for key, (burst, per_minute) in limits.items():
+                tokens, updated = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * per_minute / 60)
+                buckets[key] = tokens
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) * 60 / per_minute)
+            if retry_after:
+                self.throttled += 1
+            for key, tokens in buckets.items():
+                self._buckets[key] = [tokens - (0 if retry_after else 1), now]
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'tracked_keys': len(self._buckets), 'throttled': self.throttled}
+
+
+def check_login_attempt(ip: Optional[str], username: Optional[str] = None) -> None:
+    """Spend a sign-in attempt for the client IP (and username); raise ``LoginThrottledError`` if out."""
+    limits = {}
+    if ip:
+        limits[('ip', ip)] = (LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+    if username:
+        limits[('user', username.lower())] = (LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE)
+    retry_after = login_throttle.acquire(limits) if limits else 0
+    if retry_after:
+        raise LoginThrottledError(f"Too many attempts. Please try again in {math.ceil(retry_after)} seconds.",
+                                  retry_after=retry_after)
+
+
+def check_availability_attempt(ip: Optional[str]) -> None:
+    """Spend a live username/email availability check for the client IP; raise ``LoginThrottledError`` if out."""
+    if not ip:
+        return
+    retry_after = login_throttle.acquire({('availability', ip): (AVAILABILITY_IP_BURST, AVAILABILITY_IP_PER_MINUTE)})
+    if retry_after:
+        raise LoginThrottledError(f"Too many checks. Please try again in {math.ceil(retry_after)} seconds.",
+                                  retry_after=retry_after)
+
+
+# Shared by every session in the process
+password_hasher = PasswordHasher(BCRYPT_WORKERS, BCRYPT_MAX_QUEUE, BCRYPT_WAIT_SECONDS,
+                                 BCRYPT_ROUNDS, BCRYPT_TARGET_MS, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS)
+login_throttle = TokenBucketThrottle()
@@ -0,0 +1,236 @@
+"""Thread-safe PostgreSQL connection pool shared by all Streamlit sessions."""
+#pool.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers pool bookkeeping data."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Names of server-side prepared statements that exist on this connection
+        self.prepared_statements = set()
+
+
+class ConnectionPool:
+    """Bounded connection pool with checkout timeout and health validation.
+
+    Connections are opened lazily up to ``maxconn``. Up to ``minconn`` idle
+    connections are always kept open; idle connections above that are
+    closed once they have not been used for ``max_idle`` seconds. A
+    connection that has been idle for longer than ``validate_after`` seconds
+    is pinged with ``SELECT 1`` before it is handed out again.
+    """
+
+    def __init__(self, connection_params: Dict, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 5.0, validate_after: float = 30.0, max_idle: float = 300.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.connection_params = connection_params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self.max_idle = max_idle
+
+        self._idle: List[PooledConnection] = []
+        self._in_use = set()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._waiting = 0
+        self._stats = {
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'validation_failures': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
+
+    def _connect(self) -> PooledConnection:
+        """Open a new physical connection."""
+        return psycopg2.connect(connection_factory=PooledConnection, **self.connection_params)
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        """Check that an idle connection is still usable."""
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn: PooledConnection) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Check out a connection, waiting up to ``timeout`` seconds for one to free up."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        placeholder = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+
+                if len(self._in_use) < self.maxconn:
+                    # Reserve the slot now, open the connection outside the lock
+                    conn = None
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    self._stats['connections_created'] += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['checkout_timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(pool size {self.maxconn})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use.discard(placeholder)
+                    self._stats['connections_created'] -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._in_use.discard(placeholder)
+                self._in_use.add(conn)
+        elif not self._is_healthy(conn):
+            with self._cond:
+                self._stats['validation_failures'] += 1
+            self._discard(conn)
+            return self.getconn(max(0.0, deadline - time.monotonic()))
+
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['total_wait_ms'] += waited_ms
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], waited_ms)
+        return conn
+
+    def putconn(self, conn: PooledConnection, discard: bool = False) -> None:
+        """Return a connection to the pool, resetting any open transaction."""
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        to_close = []
+        with self._cond:
+            self._in_use.discard(conn)
+            if self._closed:
+                to_close.append(conn)
+            else:
+                self._idle.append(conn)
+                to_close = self._prune_idle()
+            self._cond.notify()
+        for stale in to_close:
+            self._close_quietly(stale)
+
+    def _prune_idle(self) -> List[PooledConnection]:
+        """Drop idle connections above ``minconn`` that sat unused too long (lock held)."""
+        now = time.monotonic()
+        keep, stale = [], []
+        for conn in self._idle:
+            if len(keep) >= self.minconn and now - conn.last_used > self.max_idle:
+                stale.append(conn)
+            else:
+                keep.append(conn)
+        self._idle = keep
+        self._stats['connections_discarded'] += len(stale)
+        return stale
+
+    def _discard(self, conn: PooledConnection) -> None:
+        with self._cond:
+            self._in_use.discard(conn)
+            self._stats['connections_discarded'] += 1
+            self._cond.notify()
+        self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken or conn.closed)
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict:
+        """Return a snapshot of pool utilisation counters."""
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': len(self._idle) + len(self._in_use),
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'avg_wait_ms': self._stats['total_wait_ms'] / checkouts if checkouts else 0.0,
+                **self._stats,
+            }
@@ -0,0 +1,97 @@
+"""Registry of server-side prepared statements for hot queries."""
+#prepared.py
+import re
+from typing import Dict, Optional
+
+from psycopg2 import errors, extensions
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+class PreparedStatementRegistry:
+    """Named statements that are PREPAREd lazily, once per connection, and run with EXECUTE.
+
+    Statements are written with psycopg2 ``%s`` placeholders and converted to
+    ``$n`` parameters for PREPARE. Connections remember which statements they
+    have prepared (``prepared_statements`` on pooled connections); any
+    connection without that bookkeeping, a disabled registry, or a failure to
+    prepare falls back to plain ``cursor.execute`` of the same SQL.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._statements: Dict[str, str] = {}
+        self._prepare_sql: Dict[str, str] = {}
+        self._execute_sql: Dict[str, str] = {}
+
+    def register(self, name: str, query: str) -> None:
+        """Register a query under ``name`` (re-registering the same query is a no-op)."""
+        existing = self._statements.get(name)
+        if existing is not None:
+            if existing != query:
+                raise ValueError(f"Prepared statement {name!r} is already registered with different SQL")
+            return
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', name):
+            raise ValueError(f"Invalid prepared statement name: {name!r}")
+
+        param_count = query.count('%s')
+        counter = iter(range(1, param_count + 1))
+        self._statements[name] = query
+        self._prepare_sql[name] = f"PREPARE {name} AS " + _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+        args = ", ".join(["%s"] * param_count)
+        self._execute_sql[name] = f"EXECUTE {name} ({args})" if param_count else f"EXECUTE {name}"
+
+    def query(self, name: str) -> str:
+        """Get the plain SQL registered under ``name``."""
+        return self._statements[name]
+
+    def names(self):
+        """Get all registered statement names."""
+        return list(self._statements)
+
+    def execute(self, cursor, name: str, query: str, params: Optional[tuple] = None) -> None:
+        """Run ``query`` on ``cursor`` as prepared statement ``name``, preparing it on first use per connection."""
+        self.register(name, query)
+        conn = cursor.connection
+        prepared = getattr(conn, 'prepared_statements', None)
+
+        # PREPARE/EXECUTE failures abort the transaction, so only take the
+        # prepared path when nothing else is pending on this connection.
+        usable = (
+            self.enabled
+            and prepared is not None
+            and conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+        )
+        if not usable:
+            cursor.execute(self._statements[name], params)
+            return
+
+        try:
+            if name not in prepared:
+                cursor.execute(self._prepare_sql[name])
+                prepared.add(name)
+            cursor.execute(self._execute_sql[name], params)
+        except errors.InvalidSqlStatementName:
+            # The server dropped it (e.g. DISCARD ALL); re-prepare next time
+            conn.rollback()
+            prepared.discard(name)
+            cursor.execute(self._statements[name], params)
+        except errors.DuplicatePreparedStatement:
+            # Prepared outside this registry's bookkeeping; adopt it
+            conn.rollback()
+            prepared.add(name)
+            cursor.execute(self._execute_sql[name], params)
+        except (errors.FeatureNotSupported, errors.SyntaxError):
+            # e.g. a transaction-mode pooler in front of Postgres
+            conn.rollback()
+            cursor.execute(self._statements[name], params)
+
+    @staticmethod
+    def deallocate_all(conn) -> None:
+        """Drop every prepared statement on ``conn`` and reset its bookkeeping."""
+        with conn.cursor() as cursor:
+            cursor.execute("DEALLOCATE ALL")
+        conn.commit()
+        prepared = getattr(conn, 'prepared_statements', None)
+        if prepared is not None:
+            prepared.clear()
@@ -0,0 +1,156 @@
+"""Per-query latency histograms, connection acquire times and a slow-query log."""
+#query_stats.py
+import bisect
+import json
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Optional
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKETS_MS = [
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+]
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%s|%\(\w+\)s|\$\d+')
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query: str) -> str:
+    """Normalize a query so executions that differ only in literals share a key."""
+    text = _COMMENTS.sub(' ', query)
+    text = _STRINGS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _IN_LISTS.sub('(?)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the ``p``-th percentile (capped at the max seen)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + [self.max_ms], self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+class QueryStats:
+    """Thread-safe query and connection-acquire statistics for one process.
+
+    Queries are keyed by their prepared statement name when they have one,
+    otherwise by their fingerprint. Queries slower than ``slow_query_ms`` are
+    printed and kept in a bounded log.
+    """
+
+    def __init__(self, slow_query_ms: float = 200, slow_log_size: int = 100):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._slow_log = deque(maxlen=slow_log_size)
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._queries = {}
+            self._acquire = {}
+            self._slow_log.clear()
+            self._started = time.time()
+
+    def record_query(self, query: str, seconds: float, rows: Optional[int] = None,
+                     name: Optional[str] = None, error: bool = False) -> None:
+        """Record one execution of ``query``."""
+        ms = seconds * 1000
+        key = name or fingerprint(query)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = {
+                    'fingerprint': fingerprint(query) if name else key,
+                    'latency': LatencyHistogram(),
+                    'rows': 0,
+                    'errors': 0,
+                }
+            entry['latency'].record(ms)
+            entry['rows'] += rows or 0
+            entry['errors'] += error
+            slow = ms >= self.slow_query_ms
+            if slow:
+                self._slow_log.append({
+                    'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'query': key,
+                    'ms': round(ms, 3),
+                    'rows': rows,
+                })
+        if slow:
+            print(f"Warning: Slow query ({ms:.1f} ms, {rows} rows): {key[:200]}")
+
+    def record_acquire(self, pool: str, seconds: float) -> None:
+        """Record how long checking a connection out of ``pool`` took."""
+        with self._lock:
+            self._acquire.setdefault(pool, LatencyHistogram()).record(seconds * 1000)
+
+    def snapshot(self) -> Dict:
+        """Current statistics, queries sorted by p99 latency (slowest first)."""
+        with self._lock:
+            queries = [
+                {
+                    'query': key,
+                    'fingerprint': entry['fingerprint'],
+                    **entry['latency'].summary(),
+                    'total_ms': round(entry['latency'].total_ms, 3),
+                    'rows': entry['rows'],
+                    'errors': entry['errors'],
+                }
+                for key, entry in self._queries.items()
+            ]
+            acquire = {pool: histogram.summary() for pool, histogram in self._acquire.items()}
+            slow = list(self._slow_log)
+            since = self._started
+
+        queries.sort(key=lambda q: (q['p99_ms'], q['total_ms']), reverse=True)
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(since)),
+            'slow_query_ms': self.slow_query_ms,
+            'queries': queries,
+            'acquire': acquire,
+            'slow_queries': slow,
+        }
+
+    def to_json(self, indent: int = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
@@ -0,0 +1,163 @@
+"""Signed session tokens backed by a server-side session store."""
+#sessions.py
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from config import DB_BACKEND, SESSION_PERSIST, SESSION_SECRET, SESSION_TIMEOUT
+from utils.circuit_breaker import CircuitOpenError
+from utils.database import db_manager
+from utils.models import User
+
+# Browser cookie carrying the token, so refreshed pages and new tabs resume the session
+SESSION_COOKIE = 'qd_session'
+
+# Expired rows are deleted from app_sessions at most this often
+_PURGE_INTERVAL_SECONDS = 300
+
+# With app_sessions, a session held in memory is re-checked against its row this often, so a
+# sign-out in another app process takes effect here within this many seconds
+_REVALIDATE_SECONDS = 30
+
+
+class Session(NamedTuple):
+    username: str
+    expires_at: float  # Unix time
+    user: Optional[User] = None  # account to resume with; None when read back from PostgreSQL
+    checked_at: float = 0.0  # Unix time its app_sessions row was last seen
+    persisted: bool = True  # False when its app_sessions row could not be written
+
+
+class SessionStore:
+    """Server-side sessions looked up by signed tokens.
+
+    A token is ``<session id>.<HMAC of the id>``: tokens with a bad signature
+    are turned away without a lookup, and only a SHA-256 of the id is kept.
+    Sessions expire ``timeout`` seconds after sign-in. They are held in
+    process memory with the signed-in user's account, so resuming one needs
+    neither a password check nor a user query. With a ``database`` (a
+    PostgreSQL ``execute_query`` provider) they are also written to
+    ``app_sessions``, so they survive restarts and are shared between app
+    processes; those resume with a user query. Sessions in memory are then
+    re-checked against their row every ``_REVALIDATE_SECONDS``, so one
+    revoked by another process ends here too. A session whose row could not
+    be written (the database was down or the INSERT failed) lives in this
+    process's memory only and is not re-checked, since it has no row to find.
+    """
+
+    def __init__(self, timeout: float, secret: bytes, database=None, max_sessions: int = 100000):
+        self.timeout = timeout
+        self.database = database
+        self.max_sessions = max_sessions
+        self._secret = secret
+        self._lock = threading.Lock()
+        # token hash -> Session, oldest first (sessions all live for the same ``timeout``)
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._last_purge = 0.0
+
+    def create(self, username: str, user: Optional[User] = None) -> str:
+        """Start a session and return its token."""
+        session_id = secrets.token_urlsafe(32)
+        key = _digest(session_id)
+        now = time.time()
+        expires_at = now + self.timeout
+        persisted = True
+        if self.database is not None:
+            persisted = bool(self._query("INSERT INTO app_sessions (token_hash, username, expires_at) "
+                                         "VALUES (%s, %s, to_timestamp(%s)) RETURNING 1",
+                                         (key, username, expires_at), fetch=True))
+            if persisted and now - self._last_purge >= _PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                self._query("DELETE FROM app_sessions WHERE expires_at <= now()")
+
+        with self._lock:
+            while self._sessions and next(iter(self._sessions.values())).expires_at <= now:
+                self._sessions.popitem(last=False)
+            self._sessions[key] = Session(username, expires_at, user, now, persisted)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return f"{session_id}.{self._sign(session_id)}"
+
+    def get(self, token: Optional[str]) -> Optional[Session]:
+        """The live session for ``token``, or ``None`` if it is invalid, revoked or expired."""
+        key = self._key(token)
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(key)
+        if self.database is not None and (
+                session is None or (session.persisted and now - session.checked_at >= _REVALIDATE_SECONDS)):
+            rows = self._query("""
+                SELECT username, extract(epoch FROM expires_at)
+                FROM app_sessions
+                WHERE token_hash = %s AND expires_at > now()
+            """, (key,), fetch=True)
+            if rows:
+                checked = Session(rows[0][0], float(rows[0][1]), session.user if session else None, now)
+                if session is not None:
+                    with self._lock:
+                        if key in self._sessions:
+                            self._sessions[key] = checked
+                session = checked
+            elif rows is not None:
+                # Revoked (or expired) by any app process
+                if session is not None:
+                    with self._lock:
+                        self._sessions.pop(key, None)
+                session = None
+            # rows is None: the database is down, so keep trusting this process's memory
+        if session is None or session.expires_at <= now:
+            return None
+        return session
+
+    def revoke(self, token: Optional[str]) -> None:
+        """End a session (sign-out)."""
+        key = self._key(token)
+        if key is None:
+            return
+        with self._lock:
+            self._sessions.pop(key, None)
+        if self.database is not None:
+            self._query("DELETE FROM app_sessions WHERE token_hash = %s", (key,))
+
+    def _sign(self, session_id: str) -> str:
+        return hmac.new(self._secret, session_id.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _key(self, token: Optional[str]) -> Optional[str]:
+        """The stored key of a correctly signed token."""
+        session_id, _, signature = (token or '').partition('.')
+        if not session_id or not hmac.compare_digest(signature, self._sign(session_id)):
+            return None
+        return _digest(session_id)
+
+    def _query(self, query: str, params: tuple = None, fetch: bool = False):
+        try:
+            return self.database.execute_query(query, params, fetch=fetch, tuples=True)
+        except CircuitOpenError:
+            # Database is down: sessions in this process's memory still work
+            return None
+
+
+def _digest(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()
+
+
+def _session_database():
+    if not SESSION_PERSIST:
+        return None
+    if DB_BACKEND == 'sqlite':
+        print("Warning: SESSION_PERSIST needs PostgreSQL; sessions are kept in memory only")
+        return None
+    if not SESSION_SECRET:
+        print("Warning: SESSION_SECRET is not set; persisted sessions won't survive a restart")
+    return db_manager
+
+
+# Shared by every session in the process
+session_store = SessionStore(SESSION_TIMEOUT, SESSION_SECRET.encode('utf-8') or secrets.token_bytes(32),
+                             _session_database())
@@ -0,0 +1,374 @@
+"""Hash sharding of user data across several PostgreSQL databases."""
+#sharding.py
+import heapq
+import itertools
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from config import DB_SLOW_QUERY_LOG_SIZE, DB_SLOW_QUERY_MS, SHARD_MAP_REFRESH_SECONDS
+from utils.database import DatabaseManager
+from utils.models import Bill, Order, User
+from utils.query_stats import QueryStats
+from utils.storage import SIGNUP_CREATED, SIGNUP_FAILED, StorageBackend, signup_outcome
+
+# Users hash into this many slots; slots (not users) are assigned to shards,
+# so adding a shard moves whole slots. Changing it re-hashes every user.
+SLOT_COUNT = 256
+
+
+def slot_for(user_id) -> int:
+    """Slot of a user id; stable across processes and Python versions."""
+    return zlib.crc32(uuid.UUID(str(user_id)).bytes) % SLOT_COUNT
+
+
+class SlotMovingError(Exception):
+    """Raised for writes to a user (or a new sign-up) whose slot is being moved to another shard.
+
+    Not a ``CircuitOpenError``: every database is up and reads still work, so
+    callers ask the user to retry shortly instead of falling back as for an
+    outage. The message can be shown to the user as is.
+    """
+
+
+class ShardMap:
+    """Slot-to-shard assignment from ``shard_slots`` on the directory shard.
+
+    The map is cached in the process and re-read at most every
+    ``refresh_seconds``; ``rebalance_shards.py`` waits at least that long
+    between marking a slot as moving, switching it, and deleting the old
+    copy, so every process has seen each step before the next one.
+    """
+
+    def __init__(self, directory: DatabaseManager, shard_count: int,
+                 refresh_seconds: float = SHARD_MAP_REFRESH_SECONDS):
+        self.directory = directory
+        self.shard_count = shard_count
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._slots: Optional[List[Tuple[int, bool]]] = None
+        self._loaded_at = 0.0
+
+    def lookup(self, slot: int) -> Tuple[int, bool]:
+        """Get ``(shard, moving)`` for a slot."""
+        if self._slots is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            with self._lock:
+                if self._slots is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                    self._load()
+        return self._slots[slot]
+
+    def _load(self) -> None:
+        rows = self.directory.execute_query(
+            "SELECT slot, shard, moving FROM shard_slots", fetch=True, read_only=True, tuples=True
+        )
+        if rows is None and self._slots is not None:
+            # Directory unreachable: keep routing with the last known map
+            self._loaded_at = time.monotonic()
+            return
+        if not rows or len(rows) != SLOT_COUNT:
+            raise RuntimeError("The shard map is not initialised; run `python rebalance_shards.py --init`")
+
+        slots = [None] * SLOT_COUNT
+        for slot, shard, moving in rows:
+            if shard >= self.shard_count:
+                raise RuntimeError(f"Slot {slot} is assigned to shard {shard}, but only "
+                                   f"{self.shard_count} shards are configured in DB_SHARDS")
+            slots[slot] = (shard, moving)
+        self._slots = slots
+        self._loaded_at = time.monotonic()
+
+
+class ShardedDatabaseManager(StorageBackend):
+    """``DatabaseManager`` interface over several databases, sharded by user id.
+
+    Each shard is a ``DatabaseManager`` with the full schema; a user and all
+    of their orders and bills live on the shard that owns their slot. The
+    first shard also holds ``user_directory`` (username/email to user id,
+    unique across shards) and ``shard_slots``. Per-user calls go to one
+    shard; cross-user calls (``get_all_orders``, ``stream_all_orders``,
+    ``maintain_partitions``) are scattered to every shard in parallel and
+    gathered. Read replicas are not used when sharding. ``order_number`` is
+    unique per shard only: each shard's ``order_numbers`` registry sees just
+    its own orders.
+    """
+
+    def __init__(self, shard_params: List[Dict], refresh_seconds: float = SHARD_MAP_REFRESH_SECONDS,
+                 manager: Type[DatabaseManager] = DatabaseManager):
+        """``manager`` is the class of each shard (``AsyncDatabaseManager`` for asyncpg)."""
+        if not shard_params:
+            raise ValueError("At least one shard is required")
+        self.query_stats = QueryStats(DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE)
+        self.shards = [
+            manager(params, replica_hosts=[], query_stats=self.query_stats, name=f"Shard {index}")
+            for index, params in enumerate(shard_params)
+        ]
+        self.directory = self.shards[0]
+        self.shard_map = ShardMap(self.directory, len(self.shards), refresh_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='shard-scatter')
+
+    # Routing
+
+    def shard_for(self, user_id: str, write: bool = False) -> DatabaseManager:
+        """Get the shard holding ``user_id``; writes are refused while its slot is moving."""
+        shard, moving = self.shard_map.lookup(slot_for(user_id))
+        if write and moving:
+            raise SlotMovingError("Your account is being moved to another database. "
+                                  "Please try again in a moment.")
+        return self.shards[shard]
+
+    def lookup_user_id(self, username: str) -> Optional[str]:
+        """Resolve a username to its user id through the directory."""
+        result = self.directory.execute_query(
+            "SELECT user_id FROM user_directory WHERE username = %s", (username,),
+            fetch=True, read_only=True, prepared='directory_user_id', tuples=True
+        )
+        return str(result[0][0]) if result else None
+
+    def _shard_for_username(self, username: str) -> Optional[DatabaseManager]:
+        user_id = self.lookup_user_id(username)
+        return self.shard_for(user_id) if user_id else None
+
+    def scatter(self, call: Callable[[DatabaseManager], object]) -> List:
+        """Run ``call(shard)`` on every shard in parallel; results are in shard order."""
+        return list(self._executor.map(call, self.shards))
+
+    # Directory-shard passthroughs, for scripts and benchmarks that run raw SQL
+
+    @property
+    def connection_params(self) -> Dict:
+        return self.directory.connection_params
+
+    @property
+    def statements(self):
+        return self.directory.statements
+
+    @property
+    def nodes(self) -> List[Dict]:
+        return [shard.connection_params for shard in self.shards]
+
+    def get_connection(self, read_only: bool = False):
+        return self.directory.get_connection(read_only=read_only)
+
+    def execute_query(self, *args, **kwargs) -> Optional[List]:
+        return self.directory.execute_query(*args, **kwargs)
+
+    def stream_query(self, *args, **kwargs) -> Iterator[tuple]:
+        return self.directory.stream_query(*args, **kwargs)
+
+    def pool_stats(self) -> Dict:
+        return {'shards': [{'shard': index, **shard.pool_stats()} for index, shard in enumerate(self.shards)]}
+
+    # Settings (on the directory shard)
+
+    def get_setting(self, name: str) -> Optional[str]:
+        return self.directory.get_setting(name)
+
+    def claim_setting(self, name: str, value: str) -> Optional[str]:
+        return self.directory.claim_setting(name, value)
+
+    # Users
+
+    def _new_user_id(self) -> str:
+        """A fresh user id whose slot isn't being moved."""
+        for _ in range(SLOT_COUNT):
+            user_id = str(uuid.uuid4())
+            if not self.shard_map.lookup(slot_for(user_id))[1]:
+                return user_id
+        raise SlotMovingError("Sign-up is paused while accounts are moved between databases. "
+                              "Please try again in a moment.")
+
+    def _taken_names(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        rows = self.directory.execute_query("""
+            SELECT username, email
+            FROM user_directory
+            WHERE username = ANY(%s) OR email = ANY(%s)
+        """, (usernames, emails), fetch=True, tuples=True) or []
+        return {row[0] for row in rows}, {row[1] for row in rows}
+
+    def _insert_users(self, rows: List[Dict]) -> List[Optional[str]]:
+        """Claim the usernames and emails in the directory in one statement, then create the users on their shards.
+
+        The directory's unique constraints make concurrent sign-ups for the
+        same name safe; claims whose user isn't created are released.
+        """
+        rows = [{**row, 'user_id': self._new_user_id()} for row in rows]
+        claims = self.directory.execute_query("""
+            WITH input AS MATERIALIZED (
+                SELECT * FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::int[])
+                     WITH ORDINALITY AS t(user_id, username, email, slot, ord)
+            ), claimed AS (
+                INSERT INTO user_directory (user_id, username, email, slot)
+                SELECT user_id, username, email, slot FROM input
+                ON CONFLICT DO NOTHING
+                RETURNING user_id
+            )
+            SELECT EXISTS (SELECT 1 FROM claimed WHERE claimed.user_id = i.user_id),
+                   EXISTS (SELECT 1 FROM user_directory d WHERE d.username = i.username),
+                   EXISTS (SELECT 1 FROM user_directory d WHERE d.email = i.email)
+            FROM input i
+            ORDER BY i.ord
+        """, ([row['user_id'] for row in rows], [row['username'] for row in rows],
+              [row['email'] for row in rows], [slot_for(row['user_id']) for row in rows]), fetch=True, tuples=True)
+        if claims is None:
+            return [SIGNUP_FAILED] * len(rows)
+        outcomes = [signup_outcome(*claim) for claim in claims]
+
+        by_shard: Dict[DatabaseManager, List[int]] = {}
+        for index, outcome in enumerate(outcomes):
+            if outcome == SIGNUP_CREATED:
+                by_shard.setdefault(self.shard_for(rows[index]['user_id']), []).append(index)
+        created = set()
+        try:
+            for shard, indexes in by_shard.items():
+                for index, outcome in zip(indexes, shard._insert_users([rows[index] for index in indexes])):
+                    if outcome == SIGNUP_CREATED:
+                        created.add(index)
+                    else:
+                        outcomes[index] = SIGNUP_FAILED
+            return outcomes
+        finally:
+            # Also when a shard is down
+            released = [rows[index]['user_id'] for indexes in by_shard.values() for index in indexes
+                        if index not in created]
+            if released:
+                self.directory.execute_query("DELETE FROM user_directory WHERE user_id = ANY(%s::uuid[])",
+                                             (released,))
+
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        shard = self._shard_for_username(username)
+        return shard.authenticate_user(username, password) if shard else None
+
+    def get_user_by_username(self, username: str) -> Optional[User]:
+        shard = self._shard_for_username(username)
+        return shard.get_user_by_username(username) if shard else None
+
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        shard = self._shard_for_username(username)
+        return shard.get_user_profile(username, orders_limit, bills_limit) if shard else None
+
+    def update_user_subscription(self, user_id: str, subscription: str) -> bool:
+        return self.shard_for(user_id, write=True).update_user_subscription(user_id, subscription)
+
+    def check_username_exists(self, username: str) -> bool:
+        result = self.directory.execute_query(
+            "SELECT 1 FROM user_directory WHERE username = %s", (username,),
+            fetch=True, read_only=True, prepared='directory_username_exists'
+        )
+        return bool(result)
+
+    def check_email_exists(self, email: str) -> bool:
+        result = self.directory.execute_query(
+            "SELECT 1 FROM user_directory WHERE email = %s", (email,),
+            fetch=True, read_only=True, prepared='directory_email_exists'
+        )
+        return bool(result)
+
+    # Per-user history
+
+    def get_user_orders_page(self, user_id: str, limit: int = 20,
+                             cursor: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        return self.shard_for(user_id).get_user_orders_page(user_id, limit, cursor)
+
+    def get_user_bills_page(self, user_id: str, limit: int = 20,
+                            cursor: Optional[Tuple] = None) -> Tuple[List[Bill], Optional[Tuple]]:
+        return self.shard_for(user_id).get_user_bills_page(user_id, limit, cursor)
+
+    def search_orders(self, user_id: str, text: str, limit: int = 20) -> List[Order]:
+        return self.shard_for(user_id).search_orders(user_id, text, limit)
+
+    def get_user_orders(self, user_id: str) -> List[Order]:
+        return self.shard_for(user_id).get_user_orders(user_id)
+
+    def get_user_bills(self, user_id: str) -> List[Bill]:
+        return self.shard_for(user_id).get_user_bills(user_id)
+
+    def stream_user_orders(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        return self.shard_for(user_id).stream_user_orders(user_id, itersize)
+
+    def stream_user_bills(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        return self.shard_for(user_id).stream_user_bills(user_id, itersize)
+
+    def create_order(self, user_id: str, order_data: Dict) -> bool:
+        return self.shard_for(user_id, write=True).create_order(user_id, order_data)
+
+    def create_orders_bulk(self, orders: Iterable[Dict], chunk_size: int = 5000) -> Dict:
+        """Route bulk orders to their users' shards, ``chunk_size`` rows per shard at a time.
+
+        Same report as ``DatabaseManager.create_orders_bulk``, with indexes
+        into the original ``orders``.
+        """
+        report = {'inserted': 0, 'rejected': [], 'chunks': 0}
+        buckets: Dict[int, List[Tuple[int, Dict]]] = {}
+
+        def flush(shard_index):
+            bucket = buckets.pop(shard_index)
+            shard_report = self.shards[shard_index].create_orders_bulk(
+                (order for _, order in bucket), chunk_size
+            )
+            report['inserted'] += shard_report['inserted']
+            report['chunks'] += shard_report['chunks']
+            for rejected in shard_report['rejected']:
+                report['rejected'].append({**rejected, 'index': bucket[rejected['index']][0]})
+
+        for index, order in enumerate(orders):
+            try:
+                shard, moving = self.shard_map.lookup(slot_for(order.get('user_id')))
+            except (ValueError, TypeError, AttributeError):
+                report['rejected'].append(
+                    {'index': index, 'order_number': order.get('order_number'), 'reason': 'invalid user_id'}
+                )
+                continue
+            if moving:
+                report['rejected'].append({'index': index, 'order_number': order.get('order_number'),
+                                           'reason': 'user is being moved between shards; retry later'})
+                continue
+            buckets.setdefault(shard, []).append((index, order))
+            if len(buckets[shard]) >= chunk_size:
+                flush(shard)
+
+        for shard_index in list(buckets):
+            flush(shard_index)
+        report['rejected'].sort(key=lambda rejected: rejected['index'])
+        return report
+
+    def _insert_orders_chunk(self, chunk) -> Tuple[Set[str], Set[str]]:
+        """Insert a validated chunk on its users' shards, one transaction per shard.
+
+        ``create_orders_bulk`` routes rows itself and rejects those in moving
+        slots; here they raise ``SlotMovingError``.
+        """
+        parts: Dict[DatabaseManager, List] = {}
+        for index, record in chunk:
+            parts.setdefault(self.shard_for(record[0], write=True), []).append((index, record))
+        inserted, missing_users = set(), set()
+        for shard, part in parts.items():
+            shard_inserted, shard_missing_users = shard._insert_orders_chunk(part)
+            inserted |= shard_inserted
+            missing_users |= shard_missing_users
+        return inserted, missing_users
+
+    # Cross-user (scatter-gather)
+
+    def get_all_orders(self, limit: int = 100) -> List[tuple]:
+        """Newest orders across every shard: each shard's top ``limit``, merged."""
+        per_shard = self.scatter(lambda shard: shard.get_all_orders(limit))
+        newest_first = heapq.merge(*per_shard, key=lambda row: row[6], reverse=True)
+        return list(itertools.islice(newest_first, limit))
+
+    def stream_user_names(self, itersize: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Stream every user's ``(username, email)`` from the directory."""
+        return self.directory.stream_query("SELECT username, email FROM user_directory", itersize=itersize)
+
+    def stream_all_orders(self, itersize: int = 10000) -> Iterator[tuple]:
+        """Stream every order, one shard after another."""
+        return itertools.chain.from_iterable(
+            shard.stream_all_orders(itersize) for shard in self.shards
+        )
+
+    def maintain_partitions(self, months_ahead: int = 3) -> int:
+        return sum(self.scatter(lambda shard: shard.maintain_partitions(months_ahead)))
+
@@ -0,0 +1,636 @@
+"""Embedded SQLite storage backend (WAL mode) with the PostgreSQL backend's schema and methods."""
+#sqlite_database.py
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from config import DB_POOL_CONFIG, DB_SLOW_QUERY_LOG_SIZE, DB_SLOW_QUERY_MS, SQLITE_BUSY_TIMEOUT_MS
+from utils.models import Bill, Order, OrderStats, User
+from utils.passwords import password_hasher
+from utils.query_stats import QueryStats
+from utils.storage import SIGNUP_CREATED, SIGNUP_FAILED, StorageBackend, signup_outcome
+
+# The users, orders and bills tables of supabase/migrations in SQLite types: ids are
+# uuid text, items is JSON text, money is REAL, dates are 'YYYY-MM-DD' text and
+# timestamps are UTC 'YYYY-MM-DD HH:MM:SS.ffffff' text, which sorts chronologically
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id text PRIMARY KEY,
+  username text UNIQUE NOT NULL,
+  email text UNIQUE NOT NULL,
+  name text NOT NULL,
+  password_hash text NOT NULL,
+  subscription text DEFAULT 'Basic',
+  created_at text NOT NULL,
+  updated_at text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+  id text PRIMARY KEY,
+  user_id text NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  order_number text UNIQUE NOT NULL,
+  restaurant text NOT NULL,
+  items text NOT NULL DEFAULT '[]',
+  total real NOT NULL DEFAULT 0,
+  status text NOT NULL DEFAULT 'Pending',
+  created_at text NOT NULL,
+  updated_at text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS bills (
+  id text PRIMARY KEY,
+  user_id text NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  month text NOT NULL,
+  amount real NOT NULL DEFAULT 0,
+  status text NOT NULL DEFAULT 'Pending',
+  due_date text NOT NULL,
+  created_at text NOT NULL,
+  updated_at text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS app_settings (
+  name text PRIMARY KEY,
+  value text NOT NULL,
+  updated_at text
+);
+
+-- Same composite history indexes as 20261018100000_composite_history_indexes.sql
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_bills_user_due ON bills (user_id, due_date DESC, id DESC);
+"""
+
+ORDER_FIELDS = """order_number, substr(created_at, 1, 10), restaurant, items, total, status"""
+
+
+def _timestamp(value: Optional[datetime] = None) -> str:
+    """Stored form of a timestamp (now by default); naive datetimes are taken as UTC."""
+    value = value or datetime.now(timezone.utc)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _datetime(text: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc) if text else None
+
+
+def _items(text: Optional[str]) -> list:
+    try:
+        items = json.loads(text) if text else []
+    except ValueError:
+        return []
+    return items if isinstance(items, list) else []
+
+
+def _order(row) -> Order:
+    """Build an ``Order`` from an ``ORDER_FIELDS`` row."""
+    return Order(row[0], row[1] or '', row[2], tuple(_items(row[3])), row[4] or 0.0, row[5])
+
+
+def _user(row) -> User:
+    return User.from_row((row[0], row[1], row[2], row[3], row[4], _datetime(row[5])))
+
+
+def _order_export_row(row) -> tuple:
+    """Typed ``utils.export.ORDER_COLUMNS`` tuple, as the PostgreSQL backend yields it."""
+    return (row[0], row[1], row[2], row[3], Decimal(f"{row[4]:.2f}"), row[5], _datetime(row[6]))
+
+
+def _bill_export_row(row) -> tuple:
+    return (row[0], row[1], Decimal(f"{row[2]:.2f}"), row[3], date.fromisoformat(row[4]))
+
+
+class SqliteDatabaseManager(StorageBackend):
+    """Storage in a single SQLite file, for single-node deployments and local load tests.
+
+    The database runs in WAL mode, so readers never block the writer or
+    each other; writers take the file's write lock in turn, waiting up to
+    ``SQLITE_BUSY_TIMEOUT_MS``. The schema is created on first open. There
+    is no server: nothing to fail over, no replicas or circuit breaker, and
+    no LISTEN/NOTIFY (``nodes`` is empty, so order events are not pushed).
+    Order search matches substrings only, as there is no ``pg_trgm``.
+    """
+
+    def __init__(self, path: str, query_stats: Optional[QueryStats] = None):
+        if path == ':memory:':
+            raise ValueError("SQLITE_PATH must be a file: each pooled connection would get "
+                             "its own in-memory database")
+        self.path = path
+        self.query_stats = query_stats or QueryStats(DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG_SIZE)
+        # Opening a connection re-reads the schema; idle ones are kept for reuse
+        self._idle = queue.LifoQueue(maxsize=DB_POOL_CONFIG['maxconn'])
+        self._opened = 0
+        self._lock = threading.Lock()
+
+        conn = self._connect()
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode != 'wal':
+            print(f"Warning: SQLite database {path} is in {mode} journal mode; readers will block writers")
+        conn.executescript(SCHEMA)
+        self._idle.put(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit: single statements commit on their own, transactions are explicit
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA foreign_keys = ON")
+        # With WAL a power loss can lose the last commits but never corrupts the file
+        conn.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    @contextmanager
+    def get_connection(self, read_only: bool = False):
+        """Check out a connection; any transaction left open is rolled back on return.
+
+        A connection is used by one thread at a time, but may move between
+        threads (Streamlit runs each rerun on a new one).
+        """
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        self.query_stats.record_acquire('sqlite', time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+                with self._lock:
+                    self._opened -= 1
+
+    @contextmanager
+    def _transaction(self, write: bool = False):
+        """A connection inside one transaction; writes take the write lock up front."""
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    @property
+    def nodes(self) -> List[Dict]:
+        return []
+
+    def pool_stats(self) -> Dict:
+        return {'sqlite': {'path': self.path, 'version': sqlite3.sqlite_version,
+                           'opened': self._opened, 'idle': self._idle.qsize()}}
+
+    def _execute(self, conn: sqlite3.Connection, query: str, params: tuple = (),
+                 name: Optional[str] = None) -> sqlite3.Cursor:
+        """Run a statement on ``conn``, recording it in the query statistics."""
+        started = time.perf_counter()
+        try:
+            cursor = conn.execute(query, params)
+        except sqlite3.Error:
+            self.query_stats.record_query(query, time.perf_counter() - started, name=name, error=True)
+            raise
+        self.query_stats.record_query(query, time.perf_counter() - started,
+                                      rows=max(cursor.rowcount, 0), name=name)
+        return cursor
+
+    def _fetch(self, conn: sqlite3.Connection, query: str, params: tuple = (),
+               name: Optional[str] = None) -> List[tuple]:
+        """Run a query on ``conn`` and fetch its rows, recording it in the query statistics."""
+        started = time.perf_counter()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        except sqlite3.Error:
+            self.query_stats.record_query(query, time.perf_counter() - started, name=name, error=True)
+            raise
+        self.query_stats.record_query(query, time.perf_counter() - started, rows=len(rows), name=name)
+        return rows
+
+    def execute_query(self, query: str, params: tuple = None, fetch: bool = False,
+                      prepared: Optional[str] = None, read_only: bool = False,
+                      tuples: bool = False) -> Optional[List]:
+        """Execute a query; same contract as ``DatabaseManager.execute_query``, with ``?`` placeholders.
+
+        ``prepared`` only names the query in the statistics: sqlite3 keeps
+        every connection's compiled statements cached anyway. Errors are
+        reported and return ``None``.
+        """
+        try:
+            with self.get_connection() as conn:
+                started = time.perf_counter()
+                try:
+                    cursor = conn.execute(query, params or ())
+                    result = cursor.fetchall() if fetch else None
+                except sqlite3.Error:
+                    self.query_stats.record_query(query, time.perf_counter() - started,
+                                                  name=prepared, error=True)
+                    raise
+                self.query_stats.record_query(
+                    query, time.perf_counter() - started,
+                    rows=len(result) if fetch else max(cursor.rowcount, 0), name=prepared
+                )
+                if fetch and not tuples:
+                    columns = [column[0] for column in cursor.description]
+                    result = [dict(zip(columns, row)) for row in result]
+                return result
+        except Exception as e:
+            st.error(f"Query execution error: {e}")
+            return None
+
+    def stream_query(self, query: str, params: tuple = None, itersize: int = 2000,
+                     read_only: bool = True) -> Iterator[tuple]:
+        """Yield the rows of a query, fetched ``itersize`` at a time, from one read snapshot.
+
+        The connection stays checked out until the generator is exhausted or
+        closed.
+        """
+        with self._transaction() as conn:
+            started = time.perf_counter()
+            rows = 0
+            try:
+                cursor = conn.execute(query, params or ())
+                while True:
+                    batch = cursor.fetchmany(itersize)
+                    if not batch:
+                        break
+                    for row in batch:
+                        rows += 1
+                        yield row
+            finally:
+                # Includes the time the consumer spent between rows
+                self.query_stats.record_query(query, time.perf_counter() - started, rows=rows)
+
+    # Users
+
+    def _taken_names(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Which of ``usernames`` and ``emails`` are taken, in one query."""
+        query = """
+            SELECT username, email
+            FROM users
+            WHERE username IN (SELECT value FROM json_each(?)) OR email IN (SELECT value FROM json_each(?))
+        """
+        rows = self.execute_query(query, (json.dumps(usernames), json.dumps(emails)), fetch=True,
+                                  prepared='users_taken', tuples=True) or []
+        return {row[0] for row in rows}, {row[1] for row in rows}
+
+    def _insert_users(self, rows: List[Dict]) -> List[Optional[str]]:
+        """Insert users in one write transaction, each with ``INSERT ... ON CONFLICT DO NOTHING``.
+
+        The transaction holds the write lock, so a row turned away is
+        explained by looking the names up inside it.
+        """
+        now = _timestamp()
+        outcomes = []
+        try:
+            with self._transaction(write=True) as conn:
+                for row in rows:
+                    inserted = self._fetch(conn, """
+                        INSERT INTO users (id, username, email, name, password_hash, subscription,
+                                           created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, 'Basic', ?, ?)
+                        ON CONFLICT DO NOTHING
+                        RETURNING id
+                    """, (row.get('user_id') or str(uuid.uuid4()), row['username'], row['email'], row['name'],
+                          row['password_hash'], now, now), name='user_insert')
+                    if inserted:
+                        outcomes.append(SIGNUP_CREATED)
+                        continue
+                    taken = self._fetch(conn, """
+                        SELECT EXISTS (SELECT 1 FROM users WHERE username = ?),
+                               EXISTS (SELECT 1 FROM users WHERE email = ?)
+                    """, (row['username'], row['email']), name='user_insert_conflict')[0]
+                    outcomes.append(signup_outcome(False, *taken))
+            return outcomes
+        except sqlite3.Error as e:
+            st.error(f"Error creating user: {e}")
+            return [SIGNUP_FAILED] * len(rows)
+
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        """Authenticate user and return user data."""
+        query = """
+            SELECT id, username, email, name, subscription, created_at, password_hash
+            FROM users
+            WHERE username = ?
+        """
+        result = self.execute_query(query, (username,), fetch=True, prepared='user_auth_by_username', tuples=True)
+        if result and password_hasher.verify(password, result[0][6]):
+            self._upgrade_password_hash(result[0][0], password, result[0][6])
+            return _user(result[0])
+        return None
+
+    def _upgrade_password_hash(self, user_id: str, password: str, stored_hash: str) -> None:
+        """Rehash a just-verified password stored with another scheme or a lower bcrypt cost; best effort."""
+        try:
+            if not password_hasher.needs_rehash(stored_hash):
+                return
+            new_hash = password_hasher.hash(password)
+            with self.get_connection() as conn:
+                self._execute(conn, "UPDATE users SET password_hash = ?, updated_at = ? "
+                                    "WHERE id = ? AND password_hash = ?",
+                              (new_hash, _timestamp(), user_id, stored_hash), name='password_rehash')
+        except Exception as e:
+            print(f"Warning: Could not rehash password for user {user_id}: {e}")
+
+    def get_user_by_username(self, username: str) -> Optional[User]:
+        """Get user data by username."""
+        query = """
+            SELECT id, username, email, name, subscription, created_at
+            FROM users
+            WHERE username = ?
+        """
+        result = self.execute_query(query, (username,), fetch=True, prepared='user_by_username', tuples=True)
+        return _user(result[0]) if result else None
+
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        """Get a user with their recent orders and bills, read from one snapshot.
+
+        Same limits as ``DatabaseManager.get_user_profile``; the queries are
+        separate, since an embedded database has no round-trips to save.
+        """
+        try:
+            with self._transaction() as conn:
+                users = self._fetch(conn, """
+                    SELECT id, username, email, name, subscription, created_at
+                    FROM users
+                    WHERE username = ?
+                """, (username,), name='user_by_username')
+                if not users:
+                    return None
+                user_id = users[0][0]
+                # LIMIT -1 is no limit
+                orders = self._fetch(conn, f"""
+                    SELECT {ORDER_FIELDS}
+                    FROM orders
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                """, (user_id, -1 if orders_limit is None else orders_limit), name='profile_orders')
+                bills = self._fetch(conn, """
+                    SELECT month, amount, status, due_date
+                    FROM bills
+                    WHERE user_id = ?
+                    ORDER BY due_date DESC, id DESC
+                    LIMIT ?
+                """, (user_id, -1 if bills_limit is None else bills_limit), name='profile_bills')
+                stats = self._fetch(conn, """
+                    SELECT count(*), COALESCE(sum(total), 0.0)
+                    FROM orders
+                    WHERE user_id = ?
+                """, (user_id,), name='profile_order_stats')
+        except sqlite3.Error as e:
+            st.error(f"Query execution error: {e}")
+            return None
+
+        return _user(users[0])._replace(
+            orders=tuple(map(_order, orders)),
+            bills=tuple(map(Bill.from_row, bills)),
+            order_stats=OrderStats(*stats[0]),
+        )
+
+    def update_user_subscription(self, user_id: str, subscription: str) -> bool:
+        """Update user's subscription plan."""
+        try:
+            with self.get_connection() as conn:
+                self._execute(conn, "UPDATE users SET subscription = ?, updated_at = ? WHERE id = ?",
+                              (subscription, _timestamp(), user_id), name='subscription_update')
+            return True
+        except sqlite3.Error as e:
+            st.error(f"Error updating subscription: {e}")
+            return False
+
+    def get_setting(self, name: str) -> Optional[str]:
+        """The value stored under ``name`` in ``app_settings``, if any."""
+        result = self.execute_query("SELECT value FROM app_settings WHERE name = ?", (name,),
+                                    fetch=True, tuples=True)
+        return result[0][0] if result else None
+
+    def claim_setting(self, name: str, value: str) -> Optional[str]:
+        """Store ``value`` under ``name`` unless a value is stored already; returns the stored value."""
+        self.execute_query("INSERT INTO app_settings (name, value, updated_at) VALUES (?, ?, ?) "
+                           "ON CONFLICT (name) DO NOTHING", (name, value, _timestamp()))
+        return self.get_setting(name)
+
+    def check_username_exists(self, username: str) -> bool:
+        """Check if username already exists."""
+        result = self.execute_query("SELECT 1 FROM users WHERE username = ?", (username,),
+                                    fetch=True, prepared='username_exists', tuples=True)
+        return bool(result)
+
+    def check_email_exists(self, email: str) -> bool:
+        """Check if email already exists."""
+        result = self.execute_query("SELECT 1 FROM users WHERE email = ?", (email,),
+                                    fetch=True, prepared='email_exists', tuples=True)
+        return bool(result)
+
+    # Per-user history
+
+    def get_user_orders_page(self, user_id: str, limit: int = 20,
+                             cursor: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        """Get one page of a user's orders, newest first, keyset-paginated on ``(created_at, id)``."""
+        keyset = "AND (created_at, id) < (?, ?)" if cursor else ""
+        query = f"""
+            SELECT {ORDER_FIELDS}, created_at, id
+            FROM orders
+            WHERE user_id = ? {keyset}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """
+        result = self.execute_query(query, (user_id, *(cursor or ()), limit + 1), fetch=True, tuples=True,
+                                    prepared='orders_page_after' if cursor else 'orders_page')
+        return self._split_page(result or [], limit, _order)
+
+    def get_user_bills_page(self, user_id: str, limit: int = 20,
+                            cursor: Optional[Tuple] = None) -> Tuple[List[Bill], Optional[Tuple]]:
+        """Get one page of a user's bills, latest due date first, keyset-paginated on ``(due_date, id)``."""
+        keyset = "AND (due_date, id) < (?, ?)" if cursor else ""
+        query = f"""
+            SELECT month, amount, status, due_date, due_date, id
+            FROM bills
+            WHERE user_id = ? {keyset}
+            ORDER BY due_date DESC, id DESC
+            LIMIT ?
+        """
+        result = self.execute_query(query, (user_id, *(cursor or ()), limit + 1), fetch=True, tuples=True,
+                                    prepared='bills_page_after' if cursor else 'bills_page')
+        return self._split_page(result or [], limit, Bill.from_row)
+
+    def search_orders(self, user_id: str, text: str, limit: int = 20) -> List[Order]:
+        """Search a user's orders by restaurant name or item, newest first.
+
+        Matches substrings case-insensitively; unlike PostgreSQL there is no
+        trigram index, so misspellings are not matched and the user's orders
+        are scanned.
+        """
+        text = text.strip().lower()
+        if not text:
+            return []
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', text) + '%'
+        query = f"""
+            SELECT {ORDER_FIELDS}
+            FROM orders
+            WHERE user_id = ?
+              AND (lower(restaurant) LIKE ? ESCAPE '\\'
+                   OR EXISTS (SELECT 1 FROM json_each(CASE WHEN json_valid(items) THEN items ELSE '[]' END)
+                              WHERE lower(value) LIKE ? ESCAPE '\\'))
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """
+        result = self.execute_query(query, (user_id, pattern, pattern, limit), fetch=True, tuples=True,
+                                    prepared='order_search')
+        return [_order(row) for row in result or []]
+
+    def get_user_orders(self, user_id: str) -> List[Order]:
+        """Get user's orders from database."""
+        query = f"""
+            SELECT {ORDER_FIELDS}
+            FROM orders
+            WHERE user_id = ?
+            ORDER BY created_at DESC, id DESC
+        """
+        result = self.execute_query(query, (user_id,), fetch=True, prepared='orders_by_user', tuples=True)
+        return [_order(row) for row in result or []]
+
+    def get_user_bills(self, user_id: str) -> List[Bill]:
+        """Get user's bills from database."""
+        query = """
+            SELECT month, amount, status, due_date
+            FROM bills
+            WHERE user_id = ?
+            ORDER BY due_date DESC, id DESC
+        """
+        result = self.execute_query(query, (user_id,), fetch=True, prepared='bills_by_user', tuples=True)
+        return [Bill.from_row(row) for row in result or []]
+
+    def stream_user_orders(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's orders, newest first, as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items, o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+            WHERE o.user_id = ?
+            ORDER BY o.created_at DESC, o.id DESC
+        """
+        return map(_order_export_row, self.stream_query(query, (user_id,), itersize))
+
+    def stream_user_bills(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's bills, newest first, as ``utils.export.BILL_COLUMNS`` tuples."""
+        query = """
+            SELECT b.month, u.username, b.amount, b.status, b.due_date
+            FROM bills b
+            JOIN users u ON u.id = b.user_id
+            WHERE b.user_id = ?
+            ORDER BY b.due_date DESC, b.id DESC
+        """
+        return map(_bill_export_row, self.stream_query(query, (user_id,), itersize))
+
+    def create_order(self, user_id: str, order_data: Dict) -> bool:
+        """Create a new order."""
+        now = _timestamp()
+        query = """
+            INSERT INTO orders (id, user_id, order_number, restaurant, items, total, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        params = (
+            str(uuid.uuid4()),
+            user_id,
+            order_data.get('order_number'),
+            order_data.get('restaurant'),
+            json.dumps(order_data.get('items', [])),
+            order_data.get('total', 0),
+            order_data.get('status', 'Pending'),
+            now,
+            now,
+        )
+        try:
+            with self.get_connection() as conn:
+                self._execute(conn, query, params, name='order_insert')
+            return True
+        except sqlite3.Error as e:
+            st.error(f"Error creating order: {e}")
+            return False
+
+    _driver_error = sqlite3.Error
+
+    def _insert_orders_chunk(self, chunk) -> Tuple[Set[str], Set[str]]:
+        """Insert one validated chunk row by row in a single write transaction.
+
+        SQLite does that about as fast as a ``COPY``. Returns the set of
+        inserted order numbers and the set of user ids that do not exist.
+        """
+        user_ids = {record[0] for _, record in chunk}
+        inserted = set()
+        now = _timestamp()
+        started = time.perf_counter()
+        with self._transaction(write=True) as conn:
+            known = {row[0] for row in conn.execute(
+                "SELECT id FROM users WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(user_ids)),)
+            )}
+            for _, (user_id, order_number, restaurant, items, total, status, created_at) in chunk:
+                if user_id not in known:
+                    continue
+                created_at = _timestamp(datetime.fromisoformat(created_at)) if created_at else now
+                cursor = conn.execute("""
+                    INSERT INTO orders (id, user_id, order_number, restaurant, items, total, status,
+                                        created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (order_number) DO NOTHING
+                """, (str(uuid.uuid4()), user_id, order_number, restaurant, items, float(total), status,
+                      created_at, now))
+                if cursor.rowcount:
+                    inserted.add(order_number)
+        self.query_stats.record_query("INSERT INTO orders (bulk)", time.perf_counter() - started,
+                                      rows=len(inserted), name='bulk_order_insert')
+        return inserted, user_ids - known
+
+    # Cross-user
+
+    def get_all_orders(self, limit: int = 100) -> List[tuple]:
+        """Get the newest orders across all users as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items, o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT ?
+        """
+        result = self.execute_query(query, (limit,), fetch=True, tuples=True)
+        return [_order_export_row(row) for row in result or []]
+
+    def stream_user_names(self, itersize: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Stream every user's ``(username, email)``."""
+        return self.stream_query("SELECT username, email FROM users", itersize=itersize)
+
+    def stream_all_orders(self, itersize: int = 10000) -> Iterator[tuple]:
+        """Stream every order as ``utils.export.ORDER_COLUMNS`` tuples."""
+        query = """
+            SELECT o.order_number, u.username, o.restaurant, o.items, o.total, o.status, o.created_at
+            FROM orders o
+            JOIN users u ON u.id = o.user_id
+        """
+        return map(_order_export_row, self.stream_query(query, itersize=itersize))
+
+    def maintain_partitions(self, months_ahead: int = 3) -> int:
+        """SQLite tables are not partitioned; nothing to create."""
+        return 0
@@ -0,0 +1,536 @@
+"""Storage backend interface shared by the PostgreSQL and SQLite implementations."""
+#storage.py
+import itertools
+import json
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config import DB_BACKEND, DB_SHARDS, PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS, SQLITE_PATH
+from utils.cache import TTLCache
+from utils.models import Bill, Order, User
+from utils.passwords import password_hasher
+from utils.query_stats import QueryStats
+
+# Outcome of each signup passed to StorageBackend.create_users
+SIGNUP_CREATED = 'created'
+SIGNUP_USERNAME_TAKEN = 'username_taken'
+SIGNUP_EMAIL_TAKEN = 'email_taken'
+SIGNUP_FAILED = 'failed'
+
+
+def signup_outcome(created: bool, username_taken: bool, email_taken: bool) -> Optional[str]:
+    """Outcome of one row of an ``INSERT ... ON CONFLICT DO NOTHING``; ``None`` if it lost a race."""
+    if created:
+        return SIGNUP_CREATED
+    if username_taken:
+        return SIGNUP_USERNAME_TAKEN
+    if email_taken:
+        return SIGNUP_EMAIL_TAKEN
+    return None
+
+
+class StorageBackend(ABC):
+    """Everything the app and its scripts ask of the database.
+
+    ``utils.database.DatabaseManager`` (PostgreSQL), ``utils.sharding.
+    ShardedDatabaseManager`` (PostgreSQL shards) and ``utils.sqlite_database.
+    SqliteDatabaseManager`` (embedded SQLite) implement it, as does ``utils.
+    async_database.AsyncDatabaseManager`` (PostgreSQL over asyncpg); ``create_backend``
+    picks one from ``DB_BACKEND``. Records are the ``utils.models`` tuples,
+    stream rows follow ``utils.export.ORDER_COLUMNS``/``BILL_COLUMNS`` and
+    page cursors are opaque: pass back what the previous page returned.
+    Raw SQL (``execute_query``) is backend specific and not part of it.
+    """
+
+    query_stats: QueryStats
+
+    @property
+    @abstractmethod
+    def nodes(self) -> List[Dict]:
+        """PostgreSQL connection parameters to LISTEN on for order events (none for SQLite)."""
+
+    @abstractmethod
+    def pool_stats(self) -> Dict:
+        """Connection counters for the admin page."""
+
+    # Settings
+
+    @abstractmethod
+    def get_setting(self, name: str) -> Optional[str]:
+        """The value stored under ``name`` in ``app_settings``, if any."""
+
+    @abstractmethod
+    def claim_setting(self, name: str, value: str) -> Optional[str]:
+        """Store ``value`` under ``name`` unless a value is stored already; returns the stored value."""
+
+    # Users
+
+    def create_user(self, username: str, email: str, password: str, name: str) -> bool:
+        """Create a user; ``False`` if the username or email is taken or the insert failed."""
+        signup = {'username': username, 'email': email, 'password': password, 'name': name}
+        return self.create_users([signup])[0] == SIGNUP_CREATED
+
+    def create_users(self, signups: List[Dict]) -> List[str]:
+        """Create users from ``{'username', 'email', 'password', 'name'}`` dicts.
+
+        Returns a ``SIGNUP_*`` outcome per signup, in order. The passwords
+        are hashed on the bcrypt pool while taken usernames and emails are
+        looked up; signups found taken skip the wait for their hash. The rest
+        are inserted by one ``ON CONFLICT DO NOTHING`` statement that also
+        reports which unique constraint turned a row away, so concurrent
+        signups for the same name get exactly one winner. Within the batch, a
+        repeated username or email goes to its first signup. Raises
+        ``PasswordPoolBusyError`` when the pool can't queue every hash.
+        """
+        outcomes: List[Optional[str]] = [None] * len(signups)
+        usernames, emails = set(), set()
+        for index, signup in enumerate(signups):
+            if signup['username'] in usernames:
+                outcomes[index] = SIGNUP_USERNAME_TAKEN
+            elif signup['email'] in emails:
+                outcomes[index] = SIGNUP_EMAIL_TAKEN
+            else:
+                usernames.add(signup['username'])
+                emails.add(signup['email'])
+
+        pending = [index for index, outcome in enumerate(outcomes) if outcome is None]
+        hashes = {}
+        try:
+            for index in pending:
+                hashes[index] = password_hasher.start_hash(signups[index]['password'])
+            self._mark_taken(signups, pending, outcomes, hashes)
+            pending = [index for index in pending if outcomes[index] is None]
+            rows = [{
+                'username': signups[index]['username'],
+                'email': signups[index]['email'],
+                'name': signups[index]['name'],
+                'password_hash': password_hasher.result(hashes[index]),
+            } for index in pending]
+        finally:
+            for future in hashes.values():
+                future.cancel()
+
+        if rows:
+            for index, outcome in zip(pending, self._insert_users(rows)):
+                outcomes[index] = outcome
+            # Turned away by a signup that committed after the insert started: look again
+            self._mark_taken(signups, [index for index in pending if outcomes[index] is None], outcomes)
+        return [outcome or SIGNUP_FAILED for outcome in outcomes]
+
+    def _mark_taken(self, signups: List[Dict], indexes: List[int], outcomes: List[Optional[str]],
+                    hashes: Optional[Dict] = None) -> None:
+        """Set the outcome of the signups at ``indexes`` whose username or email is taken."""
+        if not indexes:
+            return
+        taken_usernames, taken_emails = self._taken_names([signups[index]['username'] for index in indexes],
+                                                          [signups[index]['email'] for index in indexes])
+        for index in indexes:
+            outcome = signup_outcome(False, signups[index]['username'] in taken_usernames,
+                                     signups[index]['email'] in taken_emails)
+            if outcome:
+                outcomes[index] = outcome
+                if hashes:
+                    hashes[index].cancel()
+
+    @abstractmethod
+    def _taken_names(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Which of ``usernames`` and ``emails`` belong to existing users (read from the primary)."""
+
+    @abstractmethod
+    def _insert_users(self, rows: List[Dict]) -> List[Optional[str]]:
+        """Insert ``{'username', 'email', 'name', 'password_hash'[, 'user_id']}`` rows in one statement.
+
+        Returns a ``SIGNUP_*`` outcome per row, or ``None`` for rows turned
+        away by a signup the statement could not see.
+        """
+
+    @abstractmethod
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        """Get the user if the password matches."""
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[User]:
+        """Get a user without history."""
+
+    @abstractmethod
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        """Get a user with their most recent orders and bills and full-history ``order_stats``."""
+
+    @abstractmethod
+    def update_user_subscription(self, user_id: str, subscription: str) -> bool:
+        """Change a user's plan."""
+
+    @abstractmethod
+    def check_username_exists(self, username: str) -> bool:
+        """Whether the username is taken."""
+
+    @abstractmethod
+    def check_email_exists(self, email: str) -> bool:
+        """Whether the email is taken."""
+
+    @abstractmethod
+    def stream_user_names(self, itersize: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Stream every user's ``(username, email)``, in no particular order."""
+
+    # Per-user history
+
+    @abstractmethod
+    def get_user_orders_page(self, user_id: str, limit: int = 20,
+                             cursor: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        """One page of orders, newest first, and the cursor of the next page (``None`` at the end)."""
+
+    @abstractmethod
+    def get_user_bills_page(self, user_id: str, limit: int = 20,
+                            cursor: Optional[Tuple] = None) -> Tuple[List[Bill], Optional[Tuple]]:
+        """One page of bills, latest due date first, and the cursor of the next page."""
+
+    @abstractmethod
+    def search_orders(self, user_id: str, text: str, limit: int = 20) -> List[Order]:
+        """A user's orders matching ``text`` in the restaurant or items, best match first."""
+
+    @abstractmethod
+    def get_user_orders(self, user_id: str) -> List[Order]:
+        """All of a user's orders, newest first."""
+
+    @abstractmethod
+    def get_user_bills(self, user_id: str) -> List[Bill]:
+        """All of a user's bills, latest due date first."""
+
+    @abstractmethod
+    def stream_user_orders(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's orders as ``ORDER_COLUMNS`` tuples, newest first."""
+
+    @abstractmethod
+    def stream_user_bills(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        """Stream a user's bills as ``BILL_COLUMNS`` tuples, latest due date first."""
+
+    @abstractmethod
+    def create_order(self, user_id: str, order_data: Dict) -> bool:
+        """Insert one order."""
+
+    def create_orders_bulk(self, orders: Iterable[Dict], chunk_size: int = 5000) -> Dict:
+        """Insert many orders, one transaction per chunk.
+
+        ``orders`` may be any iterable (including a generator) of dicts with
+        ``user_id``, ``order_number``, ``restaurant`` and optionally ``items``,
+        ``total``, ``status`` and ``created_at``. Rows are validated in Python
+        and each chunk is handed to ``_insert_orders_chunk``, which skips
+        taken order numbers. A failing chunk is rolled back on its own;
+        earlier chunks stay committed.
+
+        Returns a report with the ``inserted`` count, number of ``chunks`` and
+        a ``rejected`` list of ``{'index', 'order_number', 'reason'}`` entries
+        in ``index`` order, where ``index`` is the row's position in ``orders``.
+        """
+        report = {'inserted': 0, 'rejected': [], 'chunks': 0}
+        rows = iter(enumerate(orders))
+
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            report['chunks'] += 1
+
+            valid = {}
+            for index, order in chunk:
+                try:
+                    record = self._bulk_order_record(order)
+                except (ValueError, TypeError, InvalidOperation) as e:
+                    report['rejected'].append(
+                        {'index': index, 'order_number': order.get('order_number'), 'reason': str(e)}
+                    )
+                    continue
+                if record[1] in valid:
+                    report['rejected'].append(
+                        {'index': index, 'order_number': record[1], 'reason': 'duplicate order_number in batch'}
+                    )
+                    continue
+                valid[record[1]] = (index, record)
+
+            if not valid:
+                continue
+
+            try:
+                inserted, missing_users = self._insert_orders_chunk(valid.values())
+            except self._driver_error as e:
+                report['rejected'].extend(
+                    {'index': index, 'order_number': order_number, 'reason': f"chunk failed: {e}".strip()}
+                    for order_number, (index, _) in valid.items()
+                )
+                continue
+
+            report['inserted'] += len(inserted)
+            for order_number, (index, record) in valid.items():
+                if order_number not in inserted:
+                    reason = 'unknown user_id' if record[0] in missing_users else 'order_number already exists'
+                    report['rejected'].append({'index': index, 'order_number': order_number, 'reason': reason})
+
+        # Validation, chunk failures and conflicts are found in separate passes
+        report['rejected'].sort(key=lambda rejected: rejected['index'])
+        return report
+
+    # Driver error that fails a single bulk chunk (the rest of the batch goes on)
+    _driver_error = Exception
+
+    @abstractmethod
+    def _insert_orders_chunk(self, chunk) -> Tuple[Set[str], Set[str]]:
+        """Insert one chunk of ``(index, _bulk_order_record)`` pairs in one transaction.
+
+        Returns the set of inserted order numbers and the set of user ids that
+        do not exist.
+        """
+
+    # Cross-user
+
+    @abstractmethod
+    def get_all_orders(self, limit: int = 100) -> List[tuple]:
+        """The newest orders of all users as ``ORDER_COLUMNS`` tuples."""
+
+    @abstractmethod
+    def stream_all_orders(self, itersize: int = 10000) -> Iterator[tuple]:
+        """Stream every order as ``ORDER_COLUMNS`` tuples, in no particular order."""
+
+    @abstractmethod
+    def maintain_partitions(self, months_ahead: int = 3) -> int:
+        """Create upcoming partitions where the backend has them; returns how many were created."""
+
+    @staticmethod
+    def _split_page(rows: List[tuple], limit: int, build: Callable) -> Tuple[List, Optional[Tuple]]:
+        """Build records from a page with ``build``, dropping the look-ahead row.
+
+        Each row ends with its two keyset columns; the last kept row's become
+        the cursor for the next page.
+        """
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = tuple(rows[-1][-2:]) if has_more else None
+        return [build(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _bulk_order_record(order: Dict) -> Tuple:
+        """Validate one bulk order and convert it to a staging row.
+
+        Returns ``(user_id, order_number, restaurant, items_json, total,
+        status, created_at_iso_or_None)``; raises ``ValueError``/``TypeError``/
+        ``InvalidOperation`` for invalid orders.
+        """
+        user_id = str(uuid.UUID(str(order.get('user_id'))))
+        order_number = order.get('order_number')
+        restaurant = order.get('restaurant')
+        if not order_number or not isinstance(order_number, str):
+            raise ValueError("order_number is required")
+        if not restaurant or not isinstance(restaurant, str):
+            raise ValueError("restaurant is required")
+
+        items = order.get('items', [])
+        if isinstance(items, str):
+            items = json.loads(items)
+        if not isinstance(items, list):
+            raise ValueError("items must be a list")
+
+        total = Decimal(str(order.get('total', 0)))
+        if total < 0 or total >= Decimal('1e8'):
+            raise ValueError("total out of range")
+
+        created_at = order.get('created_at')
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+
+        return (
+            user_id,
+            order_number,
+            restaurant,
+            json.dumps(items),
+            f"{total:.2f}",
+            order.get('status') or 'Pending',
+            created_at.isoformat() if created_at else None,
+        )
+
+
+class CachedStorage(StorageBackend):
+    """Read-through cache in front of another backend's user and history reads.
+
+    ``get_user_by_username``, ``get_user_profile``, ``get_user_orders`` and
+    ``get_user_bills`` are served from a process-wide ``TTLCache`` shared by
+    every session. Entries are tagged with the user's id (and username), and
+    ``create_user(s)``, ``create_order(s_bulk)`` and ``update_user_subscription``
+    drop the user's entries once they have written, as do order status
+    events (see ``on_order_event``). Writes made by other processes are seen
+    once the entries expire. Everything else, including backend-specific
+    extras such as ``execute_query`` or ``shards``, goes to ``backend``.
+    """
+
+    def __init__(self, backend: StorageBackend, cache: TTLCache):
+        self.backend = backend
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    @property
+    def query_stats(self) -> QueryStats:
+        return self.backend.query_stats
+
+    @property
+    def nodes(self) -> List[Dict]:
+        return self.backend.nodes
+
+    def pool_stats(self) -> Dict:
+        return self.backend.pool_stats()
+
+    def invalidate_user(self, *users: str) -> int:
+        """Drop the cached reads of users, by user id or username."""
+        return self.cache.invalidate(*(str(user) for user in users))
+
+    def on_order_event(self, event) -> None:
+        """Order status changed (or events were missed) for ``event.user_id``."""
+        self.invalidate_user(event.user_id)
+
+    @staticmethod
+    def _user_tags(user: User) -> Tuple[str, str]:
+        return str(user.id), user.username
+
+    # Cached reads
+
+    def get_user_by_username(self, username: str) -> Optional[User]:
+        return self.cache.get_or_load(('user', username),
+                                      lambda: self.backend.get_user_by_username(username), self._user_tags)
+
+    def get_user_profile(self, username: str, orders_limit: Optional[int] = None,
+                         bills_limit: Optional[int] = None) -> Optional[User]:
+        return self.cache.get_or_load(
+            ('profile', username, orders_limit, bills_limit),
+            lambda: self.backend.get_user_profile(username, orders_limit, bills_limit), self._user_tags
+        )
+
+    def get_user_orders(self, user_id: str) -> List[Order]:
+        # Stored as a tuple, so sessions can't change each other's lists
+        return list(self.cache.get_or_load(('orders', str(user_id)),
+                                           lambda: tuple(self.backend.get_user_orders(user_id)),
+                                           lambda orders: (str(user_id),)))
+
+    def get_user_bills(self, user_id: str) -> List[Bill]:
+        return list(self.cache.get_or_load(('bills', str(user_id)),
+                                           lambda: tuple(self.backend.get_user_bills(user_id)),
+                                           lambda bills: (str(user_id),)))
+
+    # Invalidating writes
+
+    def create_users(self, signups: List[Dict]) -> List[str]:
+        try:
+            return self.backend.create_users(signups)
+        finally:
+            self.invalidate_user(*(signup['username'] for signup in signups))
+
+    def _taken_names(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        return self.backend._taken_names(usernames, emails)
+
+    def _insert_users(self, rows: List[Dict]) -> List[Optional[str]]:
+        return self.backend._insert_users(rows)
+
+    def update_user_subscription(self, user_id: str, subscription: str) -> bool:
+        try:
+            return self.backend.update_user_subscription(user_id, subscription)
+        finally:
+            self.invalidate_user(user_id)
+
+    def create_order(self, user_id: str, order_data: Dict) -> bool:
+        try:
+            return self.backend.create_order(user_id, order_data)
+        finally:
+            self.invalidate_user(user_id)
+
+    def create_orders_bulk(self, orders: Iterable[Dict], chunk_size: int = 5000) -> Dict:
+        user_ids = set()
+
+        def noted():
+            for order in orders:
+                user_ids.add(str(order.get('user_id')))
+                yield order
+
+        try:
+            return self.backend.create_orders_bulk(noted(), chunk_size)
+        finally:
+            self.invalidate_user(*user_ids)
+
+    def _insert_orders_chunk(self, chunk) -> Tuple[Set[str], Set[str]]:
+        return self.backend._insert_orders_chunk(chunk)
+
+    # Uncached
+
+    def get_setting(self, name: str) -> Optional[str]:
+        return self.backend.get_setting(name)
+
+    def claim_setting(self, name: str, value: str) -> Optional[str]:
+        return self.backend.claim_setting(name, value)
+
+    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        return self.backend.authenticate_user(username, password)
+
+    def check_username_exists(self, username: str) -> bool:
+        return self.backend.check_username_exists(username)
+
+    def check_email_exists(self, email: str) -> bool:
+        return self.backend.check_email_exists(email)
+
+    def stream_user_names(self, itersize: int = 10000) -> Iterator[Tuple[str, str]]:
+        return self.backend.stream_user_names(itersize)
+
+    def get_user_orders_page(self, user_id: str, limit: int = 20,
+                             cursor: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        return self.backend.get_user_orders_page(user_id, limit, cursor)
+
+    def get_user_bills_page(self, user_id: str, limit: int = 20,
+                            cursor: Optional[Tuple] = None) -> Tuple[List[Bill], Optional[Tuple]]:
+        return self.backend.get_user_bills_page(user_id, limit, cursor)
+
+    def search_orders(self, user_id: str, text: str, limit: int = 20) -> List[Order]:
+        return self.backend.search_orders(user_id, text, limit)
+
+    def stream_user_orders(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        return self.backend.stream_user_orders(user_id, itersize)
+
+    def stream_user_bills(self, user_id: str, itersize: int = 2000) -> Iterator[tuple]:
+        return self.backend.stream_user_bills(user_id, itersize)
+
+    def get_all_orders(self, limit: int = 100) -> List[tuple]:
+        return self.backend.get_all_orders(limit)
+
+    def stream_all_orders(self, itersize: int = 10000) -> Iterator[tuple]:
+        return self.backend.stream_all_orders(itersize)
+
+    def maintain_partitions(self, months_ahead: int = 3) -> int:
+        return self.backend.maintain_partitions(months_ahead)
+
+
+def create_backend() -> StorageBackend:
+    """Build the backend selected by ``DB_BACKEND`` (and ``DB_SHARDS`` for PostgreSQL).
+
+    ``asyncpg`` is PostgreSQL with the queries run on asyncpg (see
+    ``utils.async_database``).
+
+    Unless ``PROFILE_CACHE_SIZE`` or ``PROFILE_CACHE_TTL_SECONDS`` is 0, it is
+    wrapped in a ``CachedStorage``.
+    """
+    if DB_BACKEND == 'sqlite':
+        from utils.sqlite_database import SqliteDatabaseManager
+        backend = SqliteDatabaseManager(SQLITE_PATH)
+    elif DB_BACKEND not in ('postgres', 'asyncpg'):
+        raise ValueError(f"Unknown DB_BACKEND {DB_BACKEND!r}; expected 'postgres', 'asyncpg' or 'sqlite'")
+    else:
+        if DB_BACKEND == 'asyncpg':
+            from utils.async_database import AsyncDatabaseManager as manager
+        else:
+            from utils.database import DatabaseManager as manager
+        if DB_SHARDS:
+            from utils.sharding import ShardedDatabaseManager
+            backend = ShardedDatabaseManager(DB_SHARDS, manager=manager)
+        else:
+            backend = manager()
+
+    cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS)
+    return CachedStorage(backend, cache) if cache.enabled else backend